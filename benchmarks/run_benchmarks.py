@@ -0,0 +1,306 @@
+"""
+Throughput and overhead benchmarks of the runner.
+
+The benchmarks run ``examples/sleeping.py`` with ``--sleep 0`` and with short sleeps, and
+measure:
+
+- the runs per second at 1, N and 4N workers, with N the number of CPU cores, for every
+  execution mode,
+- the scheduler overhead per run, which is the time a run takes on top of its sleep,
+- the time until the first run starts,
+- the peak memory of the controller process as the sweep size grows.
+
+The results are written as JSON, so they can be tracked across releases. When a baseline
+from a previous release is given, the benchmarks fail if a result got worse by more than
+the tolerance.
+
+Examples
+
+Run the benchmarks and store the results::
+
+    python benchmarks/run_benchmarks.py --output benchmarks.json
+
+Compare with the results of a previous release::
+
+    python benchmarks/run_benchmarks.py --baseline benchmarks-0.1.json --tolerance 0.25
+"""
+
+import argparse
+import json
+import logging
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from parametric_simulator.executor import get_default_max_workers, run_sweep
+from parametric_simulator.sweep import iter_runs
+
+_logger = logging.getLogger(__name__)
+
+SLEEPING = Path(__file__).parents[1] / "examples" / "sleeping.py"
+
+# benchmarks for which a higher value is better, all others should be as low as possible
+HIGHER_IS_BETTER = ("runs_per_second",)
+
+
+def get_rules(number_of_runs, sleep=0.0):
+    """
+    Get the rules of a sweep of the sleeping script.
+
+    Args:
+        number_of_runs (int): Number of runs of the sweep.
+        sleep (float): Sleeping time of every run in seconds.
+
+    Returns:
+        dict: The rules of the sweep.
+    """
+    return {
+        "sleep": {"arguments": ["--sleep ${sleep}"], "iterator": {"values": [sleep]}},
+        "seed": {"iterator": {"key": "seed", "end": number_of_runs}},
+    }
+
+
+def run_sleeping_sweep(number_of_runs, max_workers, execution_mode, sleep=0.0):
+    """
+    Run a sweep of the sleeping script and time it.
+
+    Args:
+        number_of_runs (int): Number of runs of the sweep.
+        max_workers (int): Number of workers.
+        execution_mode (str): ``subprocess``, ``in_process`` or ``asyncio``.
+        sleep (float): Sleeping time of every run in seconds.
+
+    Returns:
+        dict: The total time, the time until the first run started and the sum of the
+        wall times of the runs, all in seconds.
+    """
+    runs = iter_runs(get_rules(number_of_runs, sleep))
+    arguments = dict(max_workers=max_workers)
+    start = time.perf_counter()
+    if execution_mode == "asyncio":
+        from parametric_simulator.async_executor import run_sweep_async
+
+        results = run_sweep_async(SLEEPING, runs, **arguments)
+    else:
+        results = run_sweep(SLEEPING, runs, in_process=execution_mode == "in_process", **arguments)
+
+    first_start = None
+    total_run_time = 0.0
+    for result in results:
+        if not result.success:
+            raise RuntimeError(f"Run {result.index} of the benchmark failed")
+        if first_start is None:
+            first_start = time.perf_counter() - start - result.wall_time
+        total_run_time += result.wall_time
+    return {
+        "total_time": time.perf_counter() - start,
+        "time_to_first_run": first_start,
+        "total_run_time": total_run_time,
+    }
+
+
+def benchmark_throughput(number_of_runs, execution_modes, worker_counts):
+    """
+    Measure the runs per second of sweeps with runs which return immediately.
+
+    Args:
+        number_of_runs (int): Number of runs of every sweep.
+        execution_modes (list): The execution modes to benchmark.
+        worker_counts (list): The numbers of workers to benchmark.
+
+    Returns:
+        dict: The runs per second and the time to the first run per mode and worker count.
+    """
+    results = {}
+    for execution_mode in execution_modes:
+        for max_workers in worker_counts:
+            timing = run_sleeping_sweep(number_of_runs, max_workers, execution_mode)
+            name = f"{execution_mode}.workers_{max_workers}"
+            results[f"runs_per_second.{name}"] = number_of_runs / timing["total_time"]
+            results[f"time_to_first_run.{name}"] = timing["time_to_first_run"]
+            _logger.info(f"{name}: {results[f'runs_per_second.{name}']:.1f} runs/s")
+    return results
+
+
+def benchmark_overhead(number_of_runs, execution_modes, max_workers, sleep):
+    """
+    Measure the time every run takes on top of its sleeping time.
+
+    The overhead is the makespan of the sweep minus the ideal makespan when the runs only
+    sleep, divided by the number of runs per worker.
+
+    Args:
+        number_of_runs (int): Number of runs of every sweep.
+        execution_modes (list): The execution modes to benchmark.
+        max_workers (int): Number of workers.
+        sleep (float): Sleeping time of every run in seconds.
+
+    Returns:
+        dict: The overhead per run in seconds for every execution mode.
+    """
+    results = {}
+    runs_per_worker = -(-number_of_runs // max_workers)
+    for execution_mode in execution_modes:
+        timing = run_sleeping_sweep(number_of_runs, max_workers, execution_mode, sleep=sleep)
+        overhead = (timing["total_time"] - runs_per_worker * sleep) / runs_per_worker
+        results[f"overhead_per_run.{execution_mode}"] = overhead
+        _logger.info(f"{execution_mode}: {overhead * 1000:.1f} ms overhead per run")
+    return results
+
+
+def benchmark_controller_memory(sweep_sizes, max_workers):
+    """
+    Measure the peak memory allocated by the controller while it runs sweeps of growing size.
+
+    The runs are executed in-process and only the allocations of the controller are traced,
+    so the result shows how the memory of the scheduling scales with the sweep size.
+
+    Args:
+        sweep_sizes (list): The numbers of runs of the sweeps.
+        max_workers (int): Number of workers.
+
+    Returns:
+        dict: The peak traced memory in bytes for every sweep size.
+    """
+    results = {}
+    for number_of_runs in sweep_sizes:
+        tracemalloc.start()
+        run_sleeping_sweep(number_of_runs, max_workers, "in_process")
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[f"controller_peak_memory.runs_{number_of_runs}"] = peak
+        _logger.info(f"{number_of_runs} runs: {peak / 1024:.0f} kB peak controller memory")
+    return results
+
+
+def run_benchmarks(number_of_runs=200, sleep=0.05, sweep_sizes=(100, 1000, 10000), quick=False):
+    """
+    Run all the benchmarks.
+
+    Args:
+        number_of_runs (int): Number of runs of the throughput and overhead sweeps.
+        sleep (float): Sleeping time of the runs of the overhead benchmark in seconds.
+        sweep_sizes (list): Sweep sizes of the controller memory benchmark.
+        quick (bool): Only benchmark the default number of workers, for a smoke test.
+
+    Returns:
+        dict: Mapping of benchmark name to the measured value.
+    """
+    cores = get_default_max_workers()
+    worker_counts = [cores] if quick else sorted({1, cores, 4 * cores})
+    execution_modes = ["subprocess", "in_process", "asyncio"]
+
+    results = {}
+    results.update(benchmark_throughput(number_of_runs, execution_modes, worker_counts))
+    results.update(benchmark_overhead(number_of_runs, execution_modes, cores, sleep))
+    results.update(benchmark_controller_memory(sweep_sizes, cores))
+    return results
+
+
+def find_regressions(results, baseline, tolerance):
+    """
+    Compare benchmark results with a baseline.
+
+    Args:
+        results (dict): The current results.
+        baseline (dict): The results of a previous release.
+        tolerance (float): Allowed relative deterioration, e.g. 0.2 for 20%.
+
+    Returns:
+        list: A description of every benchmark which got worse than the tolerance allows.
+    """
+    regressions = []
+    for name, value in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        if name.startswith(HIGHER_IS_BETTER):
+            change = (previous - value) / previous
+        else:
+            change = (value - previous) / previous
+        if change > tolerance:
+            regressions.append(f"{name}: {previous:.6g} -> {value:.6g} ({change:+.0%} worse)")
+    return regressions
+
+
+def parse_the_arguments(argv):
+    """
+    Parse command-line arguments for the benchmarks.
+
+    Args:
+        argv (List[str]): Command-line arguments as a list of strings.
+
+    Returns:
+        argparse.Namespace: Parsed command-line arguments.
+    """
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        description="Benchmark the throughput and overhead of the runner",
+    )
+    parser.add_argument("--runs", type=int, default=200, help="Number of runs per sweep")
+    parser.add_argument("--sleep", type=float, default=0.05, help="Sleep of the overhead runs")
+    parser.add_argument(
+        "--sweep_sizes",
+        type=int,
+        nargs="+",
+        default=[100, 1000, 10000],
+        help="Sweep sizes of the controller memory benchmark",
+    )
+    parser.add_argument("--quick", action="store_true", help="Only run a quick smoke test")
+    parser.add_argument("--output", help="JSON file to which the results are written")
+    parser.add_argument("--baseline", help="JSON file with the results of a previous release")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Allowed relative deterioration with respect to the baseline",
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        dest="loglevel",
+        help="Set loglevel to INFO",
+        action="store_const",
+        const=logging.INFO,
+        default=logging.WARNING,
+    )
+    return parser.parse_args(args=argv)
+
+
+def main(argv):
+    """
+    Run the benchmarks, store the results and compare them with a baseline.
+
+    Args:
+        argv (List[str]): Command-line arguments as a list of strings.
+
+    Returns:
+        int: 1 if a benchmark got worse than the baseline allows, 0 otherwise.
+    """
+    args = parse_the_arguments(argv)
+    logging.basicConfig(level=args.loglevel, stream=sys.stdout, format="%(message)s")
+
+    results = run_benchmarks(
+        number_of_runs=args.runs, sleep=args.sleep, sweep_sizes=args.sweep_sizes, quick=args.quick
+    )
+    for name, value in results.items():
+        print(f"{name:50s} {value:12.6g}")
+
+    if args.output is not None:
+        with open(args.output, "w") as stream:
+            json.dump(results, stream, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as stream:
+            baseline = json.load(stream)
+        regressions = find_regressions(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
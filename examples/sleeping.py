@@ -10,6 +10,9 @@ Sleep for 10 seconds::
 Sleep for 0.1 minute::
 
     python sleeping.py --sleep 0.1 --units m
+
+The simulator can also compute the number of seconds of a whole block of runs at once,
+without sleeping, with the ``vectorized`` execution mode, which calls :func:`main_batch`.
 """
 
 import argparse
@@ -17,6 +20,14 @@ import logging
 import sys
 from time import sleep
 
+try:
+    from parametric_simulator import report
+except ImportError:
+    # the script can also be run without the simulator installed
+    def report(name, value):
+        pass
+
+
 UNITS = {"s": 1, "m": 60, "h": 3600}
 
 _logger = logging.getLogger(__name__)
@@ -156,10 +167,35 @@ def main(argv):
     # Sleep for the calculated number of seconds
     sleep(number_of_seconds_to_wait)
 
+    # Report the result to the simulator
+    report("number_of_seconds", number_of_seconds_to_wait)
+
     # Log the completion of the sleep operation
     _logger.info("Done with sleep")
 
 
+def main_batch(parameters):
+    """
+    Compute the number of seconds of a block of runs at once.
+
+    This is the entry point of the vectorized execution mode of the simulator. It
+    only computes the number of seconds and does not sleep.
+
+    Args:
+        parameters (dict): An array with the values of every parameter of the runs. The
+            'sleep' and 'units' parameters default to the defaults of the arguments.
+
+    Returns:
+        dict: The number of seconds of every run.
+    """
+    import numpy as np
+
+    sleep_time = np.asarray(parameters.get("sleep", 1), dtype=float)
+    units = np.asarray(parameters.get("units", "s"))
+    factors = np.vectorize(UNITS.__getitem__, otypes=[float])(units)
+    return {"number_of_seconds": sleep_time * factors}
+
+
 def run():
     """
     Main entry point for the sleeping script.
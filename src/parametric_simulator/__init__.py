@@ -1,16 +1,21 @@
-import sys
+from parametric_simulator.inputs import load_input  # noqa: F401
+from parametric_simulator.reporting import report  # noqa: F401
 
-if sys.version_info[:2] >= (3, 8):
-    # TODO: Import directly (no need for conditional) when `python_requires = >= 3.8`
-    from importlib.metadata import PackageNotFoundError, version  # pragma: no cover
-else:
-    from importlib_metadata import PackageNotFoundError, version  # pragma: no cover
+# Change here if project is renamed and does not equal the package name
+dist_name = "ParametricSimulator"
 
-try:
-    # Change here if project is renamed and does not equal the package name
-    dist_name = "ParametricSimulator"
-    __version__ = version(dist_name)
-except PackageNotFoundError:  # pragma: no cover
-    __version__ = "unknown"
-finally:
-    del version, PackageNotFoundError
+
+def __getattr__(name):
+    # The version is looked up on first access, since importing importlib.metadata takes
+    # longer than starting the command-line tool itself.
+    if name != "__version__":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        __version__ = version(dist_name)
+    except PackageNotFoundError:  # pragma: no cover
+        __version__ = "unknown"
+    globals()["__version__"] = __version__
+    return __version__
@@ -0,0 +1,183 @@
+"""
+Admission control of runs based on their expected memory use.
+
+With a memory budget, a run is only started while the memory estimates of all running
+runs plus its own estimate fit in the budget, so runs with a small memory footprint run
+many at a time and runs with a large footprint run few at a time. The number of workers
+is then only an upper bound of the number of runs at the same time.
+
+The memory estimate of a run is, in order of preference:
+
+1. learned: the largest peak resident set size of the finished runs with the same values
+   of the ``group_by`` parameters, times a safety ``margin``,
+2. declared: an ``estimate`` expression of the parameters of the run in the settings
+   file, see :mod:`~parametric_simulator.expressions`,
+3. learned: the largest peak resident set size of all finished runs, times the margin,
+4. the ``default`` estimate, which defaults to the budget divided by the number of
+   workers.
+
+In the settings file::
+
+    memory:
+      budget: 16GiB
+      estimate: 200e6 + 8 * mesh_size ** 3
+      group_by: [mesh_size]
+      margin: 1.2
+
+Sizes are given in bytes, or as a number with one of the suffixes of :data:`SIZE_UNITS`.
+"""
+
+import logging
+import re
+
+from parametric_simulator.expressions import compile_expression, evaluate_expression
+
+_logger = logging.getLogger(__name__)
+
+SIZE_UNITS = {
+    "": 1,
+    "B": 1,
+    "K": 1000,
+    "KB": 1000,
+    "KIB": 1024,
+    "M": 1000**2,
+    "MB": 1000**2,
+    "MIB": 1024**2,
+    "G": 1000**3,
+    "GB": 1000**3,
+    "GIB": 1024**3,
+    "T": 1000**4,
+    "TB": 1000**4,
+    "TIB": 1024**4,
+}
+
+
+def parse_size(size):
+    """
+    Convert a size with an optional unit into a number of bytes.
+
+    Args:
+        size (int or float or str): The size, e.g. ``1073741824``, ``"512MiB"`` or
+            ``"1.5 GB"``.
+
+    Returns:
+        int: The size in bytes.
+
+    Raises:
+        ValueError: If the size cannot be parsed.
+    """
+    if isinstance(size, (int, float)):
+        return int(size)
+    match = re.fullmatch(r"\s*([0-9.eE+-]+)\s*([a-zA-Z]*)\s*", str(size))
+    unit = match.group(2).upper() if match is not None else None
+    if unit not in SIZE_UNITS:
+        raise ValueError(f"Invalid size: {size}")
+    try:
+        return int(float(match.group(1)) * SIZE_UNITS[unit])
+    except ValueError as err:
+        raise ValueError(f"Invalid size: {size}") from err
+
+
+class MemoryAdmission:
+    """
+    Admit runs while the sum of their memory estimates fits in a memory budget.
+
+    A run is always admitted when no other run is admitted, so a run with an estimate
+    larger than the budget still runs, on its own.
+
+    Args:
+        budget (int or str): The memory budget of the running runs in bytes.
+        estimate (str, optional): Expression of the parameters of a run giving its memory
+            use in bytes.
+        default (int or str, optional): Estimate of the runs which cannot be estimated
+            otherwise, in bytes. Defaults to the budget divided by ``max_workers``.
+        group_by (list, optional): Names of the parameters which determine the memory use.
+            Runs with the same values of these parameters are assumed to use the same
+            amount of memory.
+        margin (float): Factor applied to the learned peak resident set sizes.
+        max_workers (int, optional): Maximum number of runs at the same time.
+    """
+
+    def __init__(
+        self, budget, estimate=None, default=None, group_by=None, margin=1.2, max_workers=None
+    ):
+        self.budget = parse_size(budget)
+        self.estimate_expression = compile_expression(estimate) if estimate is not None else None
+        if default is not None:
+            self.default = parse_size(default)
+        else:
+            self.default = self.budget // max_workers if max_workers else 0
+        self.group_by = list(group_by or [])
+        self.margin = margin
+        self.admitted = {}
+        self.peak_rss_per_group = {}
+        self.largest_peak_rss = None
+
+    @property
+    def in_use(self):
+        """int: Sum of the estimates of the admitted runs in bytes."""
+        return sum(self.admitted.values())
+
+    def get_group(self, parameters):
+        """Get the key of the runs which are assumed to use as much memory as this run."""
+        return tuple(str(parameters.get(name)) for name in self.group_by)
+
+    def estimate(self, run):
+        """
+        Estimate the memory use of a run.
+
+        Args:
+            run (Run): The run.
+
+        Returns:
+            int: The estimated memory use in bytes.
+        """
+        if self.group_by:
+            peak_rss = self.peak_rss_per_group.get(self.get_group(run.parameters))
+            if peak_rss is not None:
+                return int(peak_rss * self.margin)
+        if self.estimate_expression is not None:
+            try:
+                return int(evaluate_expression(self.estimate_expression, run.parameters))
+            except (ValueError, TypeError, ArithmeticError) as err:
+                _logger.warning(f"Could not estimate the memory of run {run.index}: {err}")
+        if self.largest_peak_rss is not None:
+            return int(self.largest_peak_rss * self.margin)
+        return self.default
+
+    def try_admit(self, run):
+        """
+        Admit a run if its memory estimate fits in the remaining budget.
+
+        Args:
+            run (Run): The run to start.
+
+        Returns:
+            bool: True if the run may start. It then counts against the budget until
+            :meth:`release` is called.
+        """
+        estimate = self.estimate(run)
+        in_use = self.in_use
+        if self.admitted and in_use + estimate > self.budget:
+            return False
+        if estimate > self.budget:
+            _logger.warning(
+                f"Run {run.index} needs an estimated {estimate} bytes, more than the memory "
+                f"budget of {self.budget} bytes, running it on its own"
+            )
+        self.admitted[run.index] = estimate
+        return True
+
+    def release(self, result):
+        """
+        Return the memory of a finished run to the budget and learn from its peak usage.
+
+        Args:
+            result (RunResult): The result of the run.
+        """
+        self.admitted.pop(result.index, None)
+        if result.cached or result.peak_rss is None:
+            return
+        group = self.get_group(result.parameters)
+        self.peak_rss_per_group[group] = max(self.peak_rss_per_group.get(group, 0), result.peak_rss)
+        self.largest_peak_rss = max(self.largest_peak_rss or 0, result.peak_rss)
@@ -0,0 +1,294 @@
+"""
+Execution of the runs of a sweep as subprocesses driven by a single asyncio event loop.
+
+This engine is meant for scripts which are not Python, or cannot run in-process, and in
+particular for sweeps with many I/O-bound runs. Instead of a worker process or thread per
+running subprocess, one event loop starts the subprocesses and waits for all of them. The
+number of running subprocesses is limited with a semaphore, and the output of every
+subprocess is written directly to its own log files, without passing through the
+controller.
+
+On Linux the subprocesses are started with :class:`subprocess.Popen` instead of
+:func:`asyncio.create_subprocess_exec`. The child watcher of asyncio reaps the
+subprocesses it starts with :func:`os.waitpid`, which discards their resource usage, and
+the I/O counters of a subprocess in ``/proc`` are gone once it is reaped. So the exit of
+every subprocess is detected with a process file descriptor watched by the event loop,
+after which the I/O counters are read and the subprocess is reaped with :func:`os.wait4`
+to measure its resource usage. Starting a subprocess with :class:`subprocess.Popen`
+blocks the event loop only for the fork and exec. Elsewhere the subprocesses are started
+with :func:`asyncio.create_subprocess_exec`, and only the wall time of the runs is
+measured.
+"""
+
+import asyncio
+import logging
+import os
+import subprocess
+import time
+from pathlib import Path
+from typing import AsyncIterator, Iterator
+
+from parametric_simulator.checkpoint import mark_started
+from parametric_simulator.executor import (
+    RunResult,
+    build_command,
+    check_run,
+    finish_run,
+    get_check_interval,
+    get_default_max_workers,
+    get_environment,
+    get_log_file_names,
+    open_log_file,
+)
+from parametric_simulator.instrumentation import wait_for_process
+
+_logger = logging.getLogger(__name__)
+
+
+async def wait_for_exit(pid):
+    """
+    Wait until a process exits, without reaping it.
+
+    Args:
+        pid (int): Id of the process.
+    """
+    loop = asyncio.get_running_loop()
+    exited = loop.create_future()
+    pidfd = os.pidfd_open(pid)
+    loop.add_reader(pidfd, lambda: exited.done() or exited.set_result(None))
+    try:
+        await exited
+    finally:
+        loop.remove_reader(pidfd)
+        os.close(pidfd)
+
+
+async def execute_command_async(
+    command,
+    semaphore,
+    cwd=None,
+    stdout=None,
+    stderr=None,
+    report_directory=None,
+    checkpoint_path=None,
+):
+    """
+    Execute a command in a subprocess once the semaphore allows it, and wait for it.
+
+    Where :func:`os.pidfd_open` is available, the subprocess is started with
+    :class:`subprocess.Popen` and reaped with :func:`os.wait4`, to measure its resource
+    usage, see the module documentation.
+
+    Args:
+        command (list): The command to execute.
+        semaphore (asyncio.Semaphore): Limits the number of running subprocesses.
+        cwd (str, optional): Working directory of the subprocess.
+        stdout (str or Path, optional): File to which the standard output is written.
+        stderr (str or Path, optional): File to which the standard error is written.
+        report_directory (str or Path, optional): Directory in which the run reports its
+            results.
+        checkpoint_path (str or Path, optional): The checkpoint of the run.
+
+    Returns:
+        tuple: The exit code of the command and a dict with its resource usage, see
+        :data:`~parametric_simulator.instrumentation.USAGE_FIELDS`.
+    """
+    async with semaphore:
+        start = time.perf_counter()
+        mark_started(report_directory, checkpoint_path)
+        env = get_environment(report_directory, checkpoint_path)
+        try:
+            with open_log_file(stdout) as out, open_log_file(stderr) as err:
+                if hasattr(os, "pidfd_open"):
+                    process = subprocess.Popen(command, cwd=cwd, stdout=out, stderr=err, env=env)
+                else:
+                    process = await asyncio.create_subprocess_exec(
+                        *command, cwd=cwd, stdout=out, stderr=err, env=env
+                    )
+        except OSError as err:
+            _logger.error(f"Could not start {command}: {err}")
+            return 127, {"wall_time": time.perf_counter() - start}
+
+        try:
+            if isinstance(process, subprocess.Popen):
+                await wait_for_exit(process.pid)
+                return wait_for_process(process, start)
+            returncode = await process.wait()
+            return returncode, {"wall_time": time.perf_counter() - start}
+        except asyncio.CancelledError:
+            process.kill()
+            if isinstance(process, subprocess.Popen):
+                process.wait()
+            else:
+                await process.wait()
+            raise
+
+
+async def iter_sweep_async(
+    script,
+    runs,
+    max_workers=None,
+    cwd=None,
+    queue_size=None,
+    cache=None,
+    journal=None,
+    log_directory=None,
+    reports_directory=None,
+    monitor=None,
+    admission=None,
+    pruner=None,
+    stager=None,
+    checkpointer=None,
+) -> AsyncIterator[RunResult]:
+    """
+    Run the script once for every run of the sweep in subprocesses on the current loop.
+
+    Like :func:`~parametric_simulator.executor.run_sweep`, the runs are consumed lazily
+    and at most ``queue_size`` of them are waiting for or running in a subprocess.
+
+    Args:
+        script (str or Path): The script to execute.
+        runs (iterable): The :class:`~parametric_simulator.sweep.Run` objects to execute.
+        max_workers (int, optional): Number of subprocesses running at the same time.
+            Defaults to the number of CPU cores.
+        cwd (str, optional): Working directory of the runs.
+        queue_size (int, optional): Maximum number of started runs which have not yet
+            finished. Defaults to twice the number of workers.
+        cache (ResultCache, optional): The cache of previous results.
+        journal (RunJournal, optional): The journal of the sweep.
+        log_directory (str or Path, optional): Directory to which the standard output and
+            error of every subprocess are written.
+        reports_directory (str or Path, optional): Directory in which every run gets a
+            directory for the results it reports with :func:`~parametric_simulator.report`.
+        monitor (SweepMonitor, optional): Is informed of every submitted and finished run.
+        admission (MemoryAdmission, optional): Only starts a run when its memory estimate
+            fits in the memory budget. Runs are then only started when a worker is free,
+            so ``queue_size`` is ignored.
+        pruner (Pruner, optional): Stops runs whose intermediate results are worse than
+            those of the other runs.
+        stager (Stager, optional): Gives every run its own working directory, which is
+            used instead of ``cwd``.
+        checkpointer (Checkpointer, optional): Gives every run a checkpoint, and resumes
+            the runs which were checkpointed after the other runs.
+
+    Yields:
+        RunResult: The result of every run, in order of completion. Runs which are
+        checkpointed when the sweep is preempted have no result.
+    """
+    max_workers = max_workers or get_default_max_workers()
+    queue_size = max(queue_size or 2 * max_workers, max_workers)
+    if admission is not None:
+        # a run only claims its memory when it starts, so do not queue runs for the workers
+        queue_size = max_workers
+    semaphore = asyncio.Semaphore(max_workers)
+    _logger.info(f"Running {script} with at most {max_workers} subprocesses")
+
+    if log_directory is not None:
+        Path(log_directory).mkdir(parents=True, exist_ok=True)
+
+    runs = iter(runs)
+    pending = {}
+    # a run which does not fit in the memory budget yet
+    waiting = None
+
+    def submit(pending_run):
+        run = pending_run.run
+        command = build_command(script, run.arguments)
+        stdout, stderr = get_log_file_names(log_directory, run.index)
+        task = asyncio.ensure_future(
+            execute_command_async(
+                command,
+                semaphore,
+                cwd=pending_run.working_directory or cwd,
+                stdout=stdout,
+                stderr=stderr,
+                report_directory=pending_run.report_directory,
+                checkpoint_path=pending_run.checkpoint_path,
+            )
+        )
+        pending[task] = pending_run
+        if monitor is not None:
+            monitor.run_submitted(run)
+
+    try:
+        while True:
+            if waiting is not None and admission.try_admit(waiting.run):
+                submit(waiting)
+                waiting = None
+            while waiting is None and len(pending) < queue_size:
+                run = checkpointer.next_run(runs) if checkpointer is not None else next(runs, None)
+                if run is None:
+                    break
+                pending_run = check_run(
+                    script, run, cache, journal, reports_directory, stager, checkpointer
+                )
+                if pending_run is None:
+                    continue
+                if isinstance(pending_run, RunResult):
+                    if monitor is not None:
+                        monitor.run_finished(pending_run)
+                    yield pending_run
+                    continue
+                if admission is not None and not admission.try_admit(run):
+                    waiting = pending_run
+                    break
+                submit(pending_run)
+            if not pending:
+                break
+
+            timeout = get_check_interval(pruner, checkpointer)
+            done, _ = await asyncio.wait(
+                pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+            if pruner is not None:
+                pruner.check(pending.values())
+            if checkpointer is not None:
+                checkpointer.check(pending.values())
+            for task in done:
+                returncode, usage = task.result()
+                pending_run = pending.pop(task)
+                if pruner is not None:
+                    pruner.run_finished(pending_run)
+                result = finish_run(pending_run, returncode, usage, cache, journal, stager=stager)
+                if admission is not None:
+                    admission.release(result)
+                if checkpointer is not None and checkpointer.run_finished(pending_run, result):
+                    if monitor is not None:
+                        monitor.run_checkpointed(pending_run.run)
+                    continue
+                if monitor is not None:
+                    monitor.run_finished(result)
+                yield result
+    finally:
+        # kill the subprocesses which are still running when the sweep is aborted
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+def run_sweep_async(script, runs, **kwargs) -> Iterator[RunResult]:
+    """
+    Run the sweep with the asyncio engine from synchronous code.
+
+    The event loop runs while the caller waits for the next result; the subprocesses keep
+    running while the caller processes a result.
+
+    Args:
+        script (str or Path): The script to execute.
+        runs (iterable): The :class:`~parametric_simulator.sweep.Run` objects to execute.
+        **kwargs: Passed on to :func:`iter_sweep_async`.
+
+    Yields:
+        RunResult: The result of every run, in order of completion.
+    """
+    loop = asyncio.new_event_loop()
+    results = iter_sweep_async(script, runs, **kwargs)
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(results.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        loop.run_until_complete(results.aclose())
+        loop.close()
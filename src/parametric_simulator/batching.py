@@ -0,0 +1,59 @@
+"""
+Adaptive size of the batches of runs which are sent to a worker as a single task.
+
+When a run only takes milliseconds, handing it to a worker process and sending back its
+result takes longer than the run itself. The runs are then sent in batches, which the
+worker executes one after the other. The batch size is tuned from the measured duration
+of the runs, so every batch takes about ``target_duration`` seconds: long enough to make
+the overhead of a task negligible, and short enough to balance the load at the end of the
+sweep.
+"""
+
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+class BatchSizer:
+    """
+    Choose the number of runs per task from the measured duration of the runs.
+
+    The first batch has a single run. After every finished batch, the mean duration of a
+    run is updated with an exponential moving average and the batch size is set so a
+    batch takes about the target duration.
+
+    Args:
+        target_duration (float): Target duration of a batch in seconds.
+        max_batch_size (int): Maximum number of runs in a batch.
+        smoothing (float): Weight of the latest batch in the moving average.
+    """
+
+    def __init__(self, target_duration=1.0, max_batch_size=1000, smoothing=0.3):
+        self.target_duration = target_duration
+        self.max_batch_size = max_batch_size
+        self.smoothing = smoothing
+        self.batch_size = 1
+        self.mean_run_time = None
+
+    def update(self, wall_times):
+        """
+        Update the batch size with the durations of the runs of a finished batch.
+
+        Args:
+            wall_times (list): The wall time of every run of the batch in seconds.
+        """
+        if not wall_times:
+            return
+        run_time = sum(wall_times) / len(wall_times)
+        if self.mean_run_time is None:
+            self.mean_run_time = run_time
+        else:
+            self.mean_run_time += self.smoothing * (run_time - self.mean_run_time)
+
+        batch_size = self.target_duration / max(self.mean_run_time, 1e-9)
+        batch_size = int(min(max(batch_size, 1), self.max_batch_size))
+        if batch_size != self.batch_size:
+            _logger.debug(
+                f"Sending {batch_size} runs per task, runs take {self.mean_run_time:.2g} s"
+            )
+        self.batch_size = batch_size
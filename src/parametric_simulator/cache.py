@@ -0,0 +1,157 @@
+"""
+Persistent cache of the results of successful runs.
+
+The results are stored in a SQLite database and addressed by a hash of the script path,
+the contents of the script and the arguments of the run. When a sweep is submitted again
+after changing a few parameters, only the runs with a new key have to be executed.
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from pathlib import Path
+
+_logger = logging.getLogger(__name__)
+
+CACHE_FILE_NAME = "results.sqlite"
+
+
+def get_file_hash(file_name, block_size=1 << 20):
+    """
+    Get the SHA-256 hash of the contents of a file.
+
+    Args:
+        file_name (str or Path): The file to hash.
+        block_size (int): Number of bytes to read at a time.
+
+    Returns:
+        str: The hexadecimal digest, or an empty string if the file does not exist.
+    """
+    digest = hashlib.sha256()
+    try:
+        with open(file_name, "rb") as stream:
+            for block in iter(lambda: stream.read(block_size), b""):
+                digest.update(block)
+    except FileNotFoundError:
+        _logger.debug(f"Cannot hash {file_name}, the file does not exist")
+        return ""
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    On-disk cache of run results with a size limit and least-recently-used eviction.
+
+    Args:
+        directory (str or Path): Directory in which the cache database is stored.
+        max_size (int): Maximum total size in bytes of the stored results. When it is
+            exceeded, the least recently used results are removed.
+    """
+
+    def __init__(self, directory, max_size=100 * 1024**2):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self.connection = sqlite3.connect(self.directory / CACHE_FILE_NAME, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, result TEXT NOT NULL, "
+            "size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access)"
+        )
+        self.connection.commit()
+        (self.total_size,) = self.connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM results"
+        ).fetchone()
+        self._script_hashes = {}
+
+    def get_key(self, script, arguments):
+        """
+        Get the cache key of a run.
+
+        Args:
+            script (str or Path): The script of the run.
+            arguments (list): The command-line arguments of the run.
+
+        Returns:
+            str: The hexadecimal SHA-256 digest identifying the run.
+        """
+        script_path = str(Path(script).resolve())
+        if script_path not in self._script_hashes:
+            self._script_hashes[script_path] = get_file_hash(script_path)
+        identity = {
+            "script": script_path,
+            "script_hash": self._script_hashes[script_path],
+            "arguments": [str(argument) for argument in arguments],
+        }
+        return hashlib.sha256(json.dumps(identity, sort_keys=True).encode()).hexdigest()
+
+    def get(self, key):
+        """
+        Get a cached result and mark it as recently used.
+
+        Args:
+            key (str): The cache key of the run.
+
+        Returns:
+            dict or None: The stored result, or None if the key is not in the cache.
+        """
+        row = self.connection.execute("SELECT result FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        with self.connection:
+            self.connection.execute(
+                "UPDATE results SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+        return json.loads(row[0])
+
+    def put(self, key, result):
+        """
+        Store a result and evict the least recently used results if the cache is full.
+
+        Args:
+            key (str): The cache key of the run.
+            result (dict): JSON serializable result of the run.
+        """
+        payload = json.dumps(result)
+        with self.connection:
+            row = self.connection.execute(
+                "SELECT size FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                self.total_size -= row[0]
+            self.connection.execute(
+                "INSERT OR REPLACE INTO results (key, result, size, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                (key, payload, len(payload), time.time()),
+            )
+            self.total_size += len(payload)
+            self._evict()
+
+    def _evict(self):
+        """Remove the least recently used results until the cache fits in max_size."""
+        if self.total_size <= self.max_size:
+            return
+        keys = []
+        for key, size in self.connection.execute(
+            "SELECT key, size FROM results ORDER BY last_access"
+        ):
+            keys.append((key,))
+            self.total_size -= size
+            if self.total_size <= self.max_size:
+                break
+        self.connection.executemany("DELETE FROM results WHERE key = ?", keys)
+        _logger.debug(f"Evicted {len(keys)} results from the cache")
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def close(self):
+        """Close the cache database."""
+        self.connection.close()
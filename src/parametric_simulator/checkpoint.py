@@ -0,0 +1,322 @@
+"""
+Checkpointing of long runs, so a run which is preempted is resumed instead of restarted.
+
+A script declares how it saves and restores its state, and calls :func:`poll` regularly,
+e.g. once per time step::
+
+    from parametric_simulator import checkpoint
+
+    def save(path):
+        np.save(path, state)
+
+    def restore(path):
+        return np.load(path)
+
+    state = checkpoint.register(save, restore) or initial_state()
+    for step in range(number_of_steps):
+        ...
+        checkpoint.poll()
+
+:func:`~parametric_simulator.reporting.report` polls as well. The simulator gives every run
+the path of its checkpoint in the environment variable ``PARSIM_CHECKPOINT``, derived from
+the hash of the run in the journal, so a run finds its checkpoint when it is started again,
+on any worker which sees the checkpoint directory. When the run has a checkpoint,
+:func:`register` restores it.
+
+A run is asked to checkpoint by a request file in its report directory, or by ``SIGTERM``
+or ``SIGUSR1``, as sent by batch systems before they preempt a job. At its next poll the
+run saves its state and exits with :data:`CHECKPOINTED_EXIT_CODE`, after which the journal
+records it as checkpointed. In the settings file::
+
+    checkpoint:
+      directory: checkpoints
+      max_duration: 3600
+      interval: 1.0
+
+Runs which take longer than ``max_duration`` seconds are checkpointed on purpose and
+resumed after the other runs of the sweep, so short runs are not held up behind long ones.
+The duration is measured from the moment the run starts, when it creates its report
+directory, so the time a run waits in the queue of a worker does not count.
+Creating the file ``preempt`` in the checkpoint directory, or sending ``SIGTERM`` to the
+simulator, checkpoints all running runs and ends the sweep, to make room for another
+sweep; the checkpointed runs resume when the sweep is started again.
+
+Outside the simulator, when ``PARSIM_CHECKPOINT`` is not set, :func:`register` and
+:func:`poll` do nothing.
+"""
+
+import logging
+import os
+import shutil
+import signal
+import sys
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+from parametric_simulator.reporting import REPORT_DIRECTORY_VARIABLE
+
+_logger = logging.getLogger(__name__)
+
+CHECKPOINT_VARIABLE = "PARSIM_CHECKPOINT"
+REQUEST_FILE_NAME = "checkpoint"
+PREEMPT_FILE_NAME = "preempt"
+
+# exit code of a run which saved a checkpoint and stopped before it finished
+CHECKPOINTED_EXIT_CODE = 76
+
+# signals on which a run saves a checkpoint at its next poll
+CHECKPOINT_SIGNALS = (signal.SIGTERM, signal.SIGUSR1)
+
+# the save hook and checkpoint path of the current run, and whether a signal asked for a
+# checkpoint
+_save = None
+_path = None
+_signalled = False
+_previous_handlers = {}
+
+
+def _handle_signal(signum, frame):
+    global _signalled
+    _signalled = True
+
+
+def register(save, restore=None):
+    """
+    Declare the checkpoint hooks of the current run, and restore its checkpoint.
+
+    Args:
+        save (callable): Called with the path of the checkpoint to save the state of the
+            run. It may write a file or a directory at that path.
+        restore (callable, optional): Called with the path of the checkpoint to restore
+            the state of a run which was checkpointed before.
+
+    Returns:
+        The value returned by ``restore``, or None if the run has no checkpoint.
+    """
+    global _save, _path, _signalled
+    path = os.environ.get(CHECKPOINT_VARIABLE)
+    if path is None:
+        _logger.debug("Not running in the simulator with checkpoints, ignoring the hooks")
+        return None
+    _save = save
+    _path = path
+    _signalled = False
+    if threading.current_thread() is threading.main_thread():
+        for signum in CHECKPOINT_SIGNALS:
+            _previous_handlers.setdefault(signum, signal.signal(signum, _handle_signal))
+    if restore is None or not os.path.exists(path):
+        return None
+    _logger.info(f"Restoring the run from the checkpoint {path}")
+    return restore(path)
+
+
+def reset_hooks():
+    """Forget the checkpoint hooks and restore the signal handlers, after a run."""
+    global _save, _path, _signalled
+    _save = None
+    _path = None
+    _signalled = False
+    while _previous_handlers:
+        signum, handler = _previous_handlers.popitem()
+        signal.signal(signum, handler)
+
+
+def remove_checkpoint(path):
+    """
+    Remove a checkpoint, which is either a file or a directory.
+
+    Args:
+        path (str or Path): The checkpoint.
+    """
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    elif os.path.lexists(path):
+        os.unlink(path)
+
+
+def save_checkpoint():
+    """
+    Save a checkpoint of the current run with its save hook.
+
+    The hook writes to a temporary path, which replaces the previous checkpoint when the
+    hook returns, so a run which is killed while saving keeps its previous checkpoint.
+    """
+    if _save is None:
+        return
+    temporary_path = f"{_path}.tmp"
+    remove_checkpoint(temporary_path)
+    _save(temporary_path)
+    remove_checkpoint(_path)
+    os.replace(temporary_path, _path)
+
+
+def mark_started(report_directory, checkpoint_path):
+    """
+    Create the report directory of a run with a checkpoint when the run starts executing.
+
+    This function runs in the process which executes the run. The :class:`Checkpointer`
+    measures the duration of the run from the moment the directory exists.
+
+    Args:
+        report_directory (str or Path or None): The report directory of the run.
+        checkpoint_path (str or Path or None): The checkpoint of the run.
+    """
+    if report_directory is not None and checkpoint_path is not None:
+        os.makedirs(report_directory, exist_ok=True)
+
+
+def is_checkpoint_requested(directory):
+    """
+    Check if the simulator asked a run to checkpoint.
+
+    Args:
+        directory (str or Path or None): The report directory of the run.
+
+    Returns:
+        bool: True if the request file exists.
+    """
+    return directory is not None and os.path.exists(os.path.join(directory, REQUEST_FILE_NAME))
+
+
+def request_checkpoint(directory):
+    """
+    Ask a run to save a checkpoint and stop at its next poll.
+
+    Args:
+        directory (str or Path): The report directory of the run.
+    """
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    (Path(directory) / REQUEST_FILE_NAME).touch()
+
+
+def poll():
+    """
+    Save a checkpoint and stop the run if a checkpoint was requested.
+
+    Raises:
+        SystemExit: With :data:`CHECKPOINTED_EXIT_CODE` after the checkpoint is saved.
+    """
+    if _save is None:
+        return
+    if not _signalled and not is_checkpoint_requested(os.environ.get(REPORT_DIRECTORY_VARIABLE)):
+        return
+    save_checkpoint()
+    _logger.info(f"Stopping the run after saving the checkpoint {_path}")
+    sys.exit(CHECKPOINTED_EXIT_CODE)
+
+
+class Checkpointer:
+    """
+    Checkpoint long runs on purpose and resume the checkpointed runs.
+
+    Args:
+        directory (str or Path): Directory with the checkpoints of the runs.
+        max_duration (float, optional): Seconds after its start at which a run is asked to
+            checkpoint, so it is resumed after the other runs.
+        interval (float): Seconds between the checks of the running runs.
+    """
+
+    def __init__(self, directory, max_duration=None, interval=1.0):
+        # the runs may execute in their own working directories
+        self.directory = Path(directory).absolute()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_duration = max_duration
+        self.interval = interval
+
+        # the time at which every running run was first seen to have started
+        self.started = {}
+        self.requested = set()
+        # the checkpointed runs, which are resumed when the other runs are submitted
+        self.resumed = deque()
+        self.draining = False
+        self.number_of_checkpoints = 0
+        self.last_check = 0.0
+
+    def get_checkpoint_path(self, run_hash):
+        """Get the checkpoint of a run, from its hash in the journal."""
+        return self.directory / run_hash.hex()
+
+    def preempt(self):
+        """Checkpoint the running runs at the next check, and do not start new runs."""
+        if not self.draining:
+            _logger.info("Preempting the sweep: checkpointing the running runs")
+        self.draining = True
+
+    def next_run(self, runs):
+        """
+        Take the next run to submit.
+
+        Args:
+            runs (iterator): The runs of the sweep.
+
+        Returns:
+            Run or None: The next run of the sweep, or else the next checkpointed run, or
+            None if there are no runs left or the sweep is preempted.
+        """
+        if self.draining:
+            return None
+        run = next(runs, None)
+        if run is None and self.resumed:
+            run = self.resumed.popleft()
+            _logger.info(f"Resuming run {run.index} from its checkpoint")
+        return run
+
+    def check(self, pending_runs, force=False):
+        """
+        Ask the runs to checkpoint which run too long, or all runs if the sweep is preempted.
+
+        Args:
+            pending_runs (iterable): The :class:`~parametric_simulator.executor.PendingRun`
+                objects of the running runs.
+            force (bool): Check even if the interval did not pass since the last check.
+        """
+        now = time.monotonic()
+        if not force and now - self.last_check < self.interval:
+            return
+        self.last_check = now
+        if (self.directory / PREEMPT_FILE_NAME).exists():
+            self.preempt()
+        for pending_run in pending_runs:
+            index = pending_run.run.index
+            if pending_run.report_directory is None or index in self.requested:
+                continue
+            if not self.draining:
+                if self.max_duration is None:
+                    continue
+                started = self.started.get(index)
+                if started is None:
+                    if not os.path.isdir(pending_run.report_directory):
+                        # the run waits in the queue of a worker
+                        continue
+                    started = self.started[index] = now
+                if now - started < self.max_duration:
+                    continue
+            _logger.debug(f"Asking run {index} to checkpoint")
+            request_checkpoint(pending_run.report_directory)
+            self.requested.add(index)
+
+    def run_finished(self, pending_run, result):
+        """
+        Resume a run later if it was checkpointed.
+
+        Args:
+            pending_run (PendingRun): The finished run.
+            result (RunResult): The result of the run.
+
+        Returns:
+            bool: True if the run was checkpointed, so it has no result yet.
+        """
+        index = pending_run.run.index
+        self.started.pop(index, None)
+        self.requested.discard(index)
+        if not result.checkpointed:
+            return False
+        self.number_of_checkpoints += 1
+        if self.draining:
+            _logger.info(f"Run {index} is checkpointed and resumes in the next sweep")
+        else:
+            _logger.info(f"Run {index} is checkpointed and resumes after the other runs")
+            self.resumed.append(pending_run.run)
+        return True
@@ -0,0 +1,9 @@
+"""
+Constants which are needed before the heavy modules are imported.
+
+The command-line tool reads these to build its argument parser, so answering ``--help``
+does not import the execution engines. Keep this module free of imports.
+"""
+
+# the ways in which the runs of a sweep are executed
+EXECUTION_MODES = ("subprocess", "in_process", "auto", "asyncio", "vectorized")
@@ -0,0 +1,213 @@
+"""
+Deduplication of equivalent runs before they are executed.
+
+Different parameter combinations can describe the same computation: sleeping for 60
+seconds and sleeping for 1 minute take equally long, and float axes computed in different
+ways give values which only differ by rounding. The runs of a sweep are therefore reduced
+to a canonical form, and of every group of runs with the same canonical form, only the
+first run is executed. Its result is shared with the other runs of the group, which keep
+their own index and parameters and refer to the executed run with ``duplicate_of``.
+
+The canonical form is given by normalizers, which are expressions of the parameters, see
+:mod:`~parametric_simulator.expressions`, and by a tolerance, to which the floats are
+rounded. Without normalizers, the canonical form is the set of parameters itself. In the
+settings file::
+
+    dedup:
+      normalize:
+        seconds: sleep * UNITS[units]
+      constants:
+        UNITS: {s: 1, m: 60, h: 3600}
+      tolerance: 1.0e-9
+
+The tolerance is an absolute tolerance, either for all floats or as a mapping with a
+tolerance per canonical value. A tolerance of zero only removes exact duplicates.
+
+The index of the canonical forms only holds a short hash for every distinct run, so it
+stays small for sweeps of any size. The result of an executed run is only kept while
+duplicates wait for it. A duplicate which comes after its executed run finished takes
+the result from the result cache, if there is one, or else it is executed itself.
+"""
+
+import dataclasses
+import hashlib
+import logging
+import math
+from collections import deque
+
+from parametric_simulator.executor import RunResult
+from parametric_simulator.expressions import compile_expression, evaluate_expression
+
+_logger = logging.getLogger(__name__)
+
+
+class Deduplicator:
+    """
+    Execute only one run of every group of equivalent runs, and share its result.
+
+    Args:
+        normalize (dict, optional): The canonical values, as a mapping of name to an
+            expression of the parameters. Defaults to the parameters themselves.
+        constants (dict, optional): Extra names which can be used in the expressions.
+        tolerance (float or dict, optional): Absolute tolerance to which the floats of the
+            canonical form are rounded, or a mapping with a tolerance per name.
+        monitor (SweepMonitor, optional): Is informed of the results of the duplicates.
+        script (str or Path, optional): The script of the runs, to find the results of
+            finished runs in the cache.
+        cache (ResultCache, optional): The cache of previous results, in which the
+            duplicates of finished runs are looked up.
+    """
+
+    def __init__(
+        self, normalize=None, constants=None, tolerance=None, monitor=None, script=None, cache=None
+    ):
+        self.normalize = {
+            name: compile_expression(expression) for name, expression in (normalize or {}).items()
+        }
+        self.constants = dict(constants or {})
+        if tolerance is not None and not isinstance(tolerance, dict):
+            tolerance = float(tolerance)
+        self.tolerance = tolerance
+        self.monitor = monitor
+        self.script = script
+        self.cache = cache
+
+        # the index and the cache key of the executed run of every canonical form, and
+        # whether it finished
+        self.primaries = {}
+        # the duplicates of every executed run which has not finished yet
+        self.waiting = {}
+        self.ready = deque()
+        self.number_of_duplicates = 0
+
+    def get_tolerance(self, name):
+        """Get the tolerance of a canonical value, or None to compare it exactly."""
+        if isinstance(self.tolerance, dict):
+            return self.tolerance.get(name)
+        return self.tolerance
+
+    def get_canonical_form(self, parameters):
+        """
+        Get the canonical form of a run.
+
+        Args:
+            parameters (dict): The parameters of the run.
+
+        Returns:
+            list: The sorted ``(name, value)`` pairs of the canonical values.
+        """
+        values = parameters
+        if self.normalize:
+            variables = {**self.constants, **parameters}
+            try:
+                values = {
+                    name: evaluate_expression(expression, variables)
+                    for name, expression in self.normalize.items()
+                }
+            except (ValueError, TypeError, ArithmeticError) as err:
+                # the run cannot be compared, so it is only equal to the same parameters
+                _logger.debug(f"Could not normalize {parameters}: {err}")
+                values = {"": sorted(parameters.items(), key=repr)}
+
+        canonical_form = []
+        for name, value in sorted(values.items()):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                tolerance = self.get_tolerance(name)
+                if tolerance and math.isfinite(value):
+                    value = round(value / tolerance)
+                else:
+                    value = float(value)
+            canonical_form.append((name, value))
+        return canonical_form
+
+    def get_key(self, parameters):
+        """Get a short hash of the canonical form of a run."""
+        return hashlib.blake2b(
+            repr(self.get_canonical_form(parameters)).encode(), digest_size=16
+        ).digest()
+
+    def share_result(self, result, run):
+        """Queue the result of an executed run as the result of a duplicate."""
+        duplicate = dataclasses.replace(
+            result, index=run.index, parameters=run.parameters, duplicate_of=result.index
+        )
+        if self.monitor is not None:
+            self.monitor.run_finished(duplicate)
+        self.ready.append(duplicate)
+
+    def split(self, runs):
+        """
+        Remove the duplicates from the runs of a sweep.
+
+        Args:
+            runs (iterable): The :class:`~parametric_simulator.sweep.Run` objects.
+
+        Yields:
+            Run: The first run of every canonical form.
+        """
+        for run in runs:
+            key = self.get_key(run.parameters)
+            primary = self.primaries.get(key)
+            if primary is None:
+                cache_key = None
+                if self.cache is not None:
+                    cache_key = self.cache.get_key(self.script, run.arguments)
+                self.primaries[key] = (run.index, cache_key, False)
+                yield run
+                continue
+            index, cache_key, finished = primary
+            if not finished:
+                self.number_of_duplicates += 1
+                _logger.debug(f"Run {run.index} is a duplicate of run {index}")
+                self.waiting.setdefault(index, []).append(run)
+                continue
+            cached_result = self.cache.get(cache_key) if cache_key is not None else None
+            if cached_result is None:
+                # the result of the executed run is not kept, so the duplicate is executed
+                _logger.debug(f"Run {run.index} is executed, as run {index} already finished")
+                yield run
+                continue
+            self.number_of_duplicates += 1
+            _logger.debug(f"Run {run.index} is a duplicate of run {index}, found in the cache")
+            self.share_result(RunResult(index=index, cached=True, **cached_result), run)
+
+    def expand(self, results):
+        """
+        Add the results of the duplicates to the results of the executed runs.
+
+        Args:
+            results (iterable): The results of the runs yielded by :meth:`split`.
+
+        Yields:
+            RunResult: The result of every run, including the duplicates.
+        """
+        for result in results:
+            key = self.get_key(result.parameters)
+            index, cache_key, _ = self.primaries[key]
+            if index == result.index:
+                self.primaries[key] = (index, cache_key, True)
+            yield result
+            for run in self.waiting.pop(result.index, []):
+                self.share_result(result, run)
+            while self.ready:
+                yield self.ready.popleft()
+        while self.ready:
+            yield self.ready.popleft()
+        if self.waiting:
+            # the executed runs were skipped, as the journal says they already finished
+            _logger.debug(f"{sum(map(len, self.waiting.values()))} duplicates were skipped")
+            self.waiting.clear()
+
+    def run(self, run_round, runs):
+        """
+        Execute the distinct runs of a sweep.
+
+        Args:
+            run_round (callable): Executes a list of runs and yields their results, e.g.
+                :func:`~parametric_simulator.executor.run_sweep` with its arguments bound.
+            runs (iterable): The runs of the sweep.
+
+        Returns:
+            iterator: The result of every run, including the duplicates.
+        """
+        return self.expand(run_round(self.split(runs)))
@@ -0,0 +1,662 @@
+"""
+Execution of the runs of a sweep on workers on several nodes, coordinated over TCP.
+
+One controller runs the sweep as a coordinator, and any number of workers connect to it
+over TCP, without a broker in between::
+
+    parametric_simulator --settings_file sweep.yml --serve 0.0.0.0:5555
+    parametric_simulator --worker controller-node:5555 --max_workers 32
+
+The work is pulled by the workers: a worker asks for as many runs as it has free slots,
+so fast and idle nodes take more runs than slow and busy ones. The coordinator keeps the
+journal, the cache and the results store, exactly as for local sweeps. Both sides send
+heartbeats; when a worker disconnects or stops sending heartbeats, its unfinished runs
+are handed out to the other workers again, and a worker which loses the coordinator
+stops.
+
+The script, and the log, report and checkpoint directories, must be at the same path on
+all nodes, e.g. on a shared file system, so a checkpointed run can resume on any node. The
+scalars and arrays reported by a run are read by the worker and sent back with its result.
+
+The messages are frames of a one byte type and a four byte length, followed by the
+payload. Runs and results, which are sent for every run, are packed with :mod:`struct`;
+only the greeting at the start of a connection is JSON.
+"""
+
+import json
+import logging
+import math
+import os
+import queue
+import selectors
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Iterator
+
+from parametric_simulator.executor import (
+    RunResult,
+    build_command,
+    check_run,
+    execute_command,
+    execute_in_process,
+    finish_run,
+    get_check_interval,
+    get_default_max_workers,
+    get_log_file_names,
+    get_pool_arguments,
+)
+from parametric_simulator.instrumentation import USAGE_FIELDS
+from parametric_simulator.reporting import read_reports
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 5555
+HEARTBEAT_INTERVAL = 5.0
+HEARTBEAT_TIMEOUT = 30.0
+
+# type and length of the payload of every frame
+FRAME_HEADER = struct.Struct("<BI")
+# index of a run, followed by its report directory, checkpoint and arguments separated by
+# NUL bytes
+RUN_HEADER = struct.Struct("<q")
+# index, exit code and resource usage of a run, followed by its reports as JSON
+RESULT_HEADER = struct.Struct("<qi" + "d" * len(USAGE_FIELDS))
+RUN_COUNT = struct.Struct("<I")
+
+# frame types
+HELLO = 1
+WELCOME = 2
+REQUEST_RUNS = 3
+RUN = 4
+RESULT = 5
+HEARTBEAT = 6
+SHUTDOWN = 7
+# events of a worker which are never sent: a run finished, or the connection was lost
+_FINISHED = 0
+_LOST = -1
+
+INTEGER_USAGE_FIELDS = ("peak_rss", "read_bytes", "write_bytes")
+
+
+def parse_address(address, default_host="0.0.0.0"):
+    """
+    Parse a ``HOST:PORT`` address.
+
+    Args:
+        address (str): The address. The host or the port may be left out, e.g. ``:5555``.
+        default_host (str): Host used when the address has no host.
+
+    Returns:
+        tuple: The host and port.
+
+    Raises:
+        ValueError: If the port is not a number.
+    """
+    host, separator, port = str(address).rpartition(":")
+    if not separator:
+        host, port = port, ""
+    try:
+        port = int(port) if port else DEFAULT_PORT
+    except ValueError as err:
+        raise ValueError(f"Invalid address {address}, expected HOST:PORT") from err
+    return host.strip("[]") or default_host, port
+
+
+def encode_frame(kind, payload=b""):
+    """Pack a frame of the given type."""
+    return FRAME_HEADER.pack(kind, len(payload)) + payload
+
+
+class FrameReader:
+    """Split the bytes received from a connection into frames."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        """
+        Add received bytes.
+
+        Args:
+            data (bytes): The received bytes.
+
+        Returns:
+            list: The ``(type, payload)`` of every frame which is now complete.
+        """
+        self.buffer += data
+        frames = []
+        while len(self.buffer) >= FRAME_HEADER.size:
+            kind, length = FRAME_HEADER.unpack_from(self.buffer)
+            end = FRAME_HEADER.size + length
+            if len(self.buffer) < end:
+                break
+            frames.append((kind, bytes(self.buffer[FRAME_HEADER.size : end])))
+            del self.buffer[:end]
+        return frames
+
+
+def encode_run(index, arguments, report_directory=None, checkpoint_path=None):
+    """Pack a run to send it to a worker."""
+    fields = [str(report_directory or ""), str(checkpoint_path or "")]
+    fields += [str(argument) for argument in arguments]
+    return RUN_HEADER.pack(index) + "\0".join(fields).encode()
+
+
+def decode_run(payload):
+    """
+    Unpack a run received from the coordinator.
+
+    Returns:
+        tuple: The index, the arguments, the report directory and the checkpoint of the
+        run.
+    """
+    (index,) = RUN_HEADER.unpack_from(payload)
+    fields = payload[RUN_HEADER.size :].decode().split("\0")
+    return index, fields[2:], fields[0] or None, fields[1] or None
+
+
+def encode_result(index, returncode, usage, reports):
+    """Pack the result of a run to send it to the coordinator."""
+    values = [usage.get(name) for name in USAGE_FIELDS]
+    header = RESULT_HEADER.pack(
+        index, returncode, *(math.nan if value is None else value for value in values)
+    )
+    outputs, arrays = reports
+    if not outputs and not arrays:
+        return header
+    return header + json.dumps([outputs, arrays]).encode()
+
+
+def decode_result(payload):
+    """
+    Unpack the result of a run received from a worker.
+
+    Returns:
+        tuple: The index, the exit code, the resource usage and the reports of the run.
+    """
+    index, returncode, *values = RESULT_HEADER.unpack_from(payload)
+    usage = {}
+    for name, value in zip(USAGE_FIELDS, values):
+        if math.isnan(value):
+            value = None
+        elif name in INTEGER_USAGE_FIELDS:
+            value = int(value)
+        usage[name] = value
+    reports = ({}, {})
+    if len(payload) > RESULT_HEADER.size:
+        reports = tuple(json.loads(payload[RESULT_HEADER.size :]))
+    return index, returncode, usage, reports
+
+
+class WorkerConnection:
+    """
+    The state of a worker connected to the coordinator.
+
+    Args:
+        connection (socket.socket): The connection with the worker.
+        address (tuple): The address of the worker.
+    """
+
+    def __init__(self, connection, address):
+        self.connection = connection
+        self.name = f"{address[0]}:{address[1]}"
+        self.reader = FrameReader()
+        self.wanted = 0
+        self.in_flight = {}
+        self.last_seen = time.monotonic()
+
+    def send(self, kind, payload=b""):
+        """Send a frame to the worker."""
+        self.connection.sendall(encode_frame(kind, payload))
+
+
+class Coordinator:
+    """
+    Hand out the runs of a sweep to the workers which connect to it.
+
+    The coordinator listens as soon as it is created, so workers can connect before the
+    sweep starts.
+
+    Args:
+        address (tuple): Host and port to listen on. Port 0 picks a free port.
+        heartbeat_interval (float): Seconds between the heartbeats sent to the workers.
+        heartbeat_timeout (float): Seconds after which a silent worker is dropped.
+    """
+
+    def __init__(
+        self,
+        address=("0.0.0.0", DEFAULT_PORT),
+        heartbeat_interval=HEARTBEAT_INTERVAL,
+        heartbeat_timeout=HEARTBEAT_TIMEOUT,
+    ):
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.server = socket.create_server(address)
+        self.address = self.server.getsockname()[:2]
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.server, selectors.EVENT_READ)
+        self.workers = {}
+        _logger.info(f"Waiting for workers on {self.address[0]}:{self.address[1]}")
+
+    def accept(self):
+        """Accept the connection of a new worker."""
+        connection, address = self.server.accept()
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        worker = WorkerConnection(connection, address)
+        self.workers[connection] = worker
+        self.selector.register(connection, selectors.EVENT_READ, worker)
+        _logger.debug(f"Worker {worker.name} connected")
+
+    def drop(self, worker, requeued, reason):
+        """
+        Disconnect a worker and hand out its unfinished runs again.
+
+        Args:
+            worker (WorkerConnection): The worker.
+            requeued (deque): The runs which are handed out first.
+            reason (str): Why the worker is dropped.
+        """
+        if self.workers.pop(worker.connection, None) is None:
+            return
+        self.selector.unregister(worker.connection)
+        worker.connection.close()
+        if worker.in_flight:
+            _logger.warning(
+                f"Worker {worker.name} {reason}, running {len(worker.in_flight)} of its runs "
+                f"on other workers"
+            )
+        else:
+            _logger.info(f"Worker {worker.name} {reason}")
+        for index in sorted(worker.in_flight, reverse=True):
+            requeued.appendleft(worker.in_flight[index])
+        worker.in_flight.clear()
+
+    def send_heartbeats(self, requeued):
+        """Send a heartbeat to every worker and drop the workers which went silent."""
+        now = time.monotonic()
+        for worker in list(self.workers.values()):
+            if now - worker.last_seen > self.heartbeat_timeout:
+                self.drop(worker, requeued, "stopped sending heartbeats")
+                continue
+            try:
+                worker.send(HEARTBEAT)
+            except OSError:
+                self.drop(worker, requeued, "disconnected")
+
+    def run_sweep(
+        self,
+        script,
+        runs,
+        cache=None,
+        journal=None,
+        in_process=False,
+        log_directory=None,
+        reports_directory=None,
+        monitor=None,
+        pruner=None,
+        checkpointer=None,
+    ) -> Iterator[RunResult]:
+        """
+        Run the script once for every run of the sweep on the connected workers.
+
+        Like :func:`~parametric_simulator.executor.run_sweep`, the runs are consumed lazily:
+        a run is only taken from ``runs`` when a worker asks for one.
+
+        Args:
+            script (str or Path): The script to execute, at the same path on all nodes.
+            runs (iterable): The :class:`~parametric_simulator.sweep.Run` objects to execute.
+            cache (ResultCache, optional): The cache of previous results.
+            journal (RunJournal, optional): The journal of the sweep.
+            in_process (bool): Call the ``main(argv)`` function of the script in the
+                workers instead of starting a subprocess per run.
+            log_directory (str or Path, optional): Directory to which the standard output
+                and error of every subprocess are written.
+            reports_directory (str or Path, optional): Directory in which every run gets a
+                directory for the results it reports.
+            monitor (SweepMonitor, optional): Is informed of every submitted and finished
+                run.
+            pruner (Pruner, optional): Stops runs whose intermediate results are worse than
+                those of the other runs.
+            checkpointer (Checkpointer, optional): Gives every run a checkpoint, and
+                resumes the runs which were checkpointed after the other runs, on any
+                worker.
+
+        Yields:
+            RunResult: The result of every run, in order of completion. Runs which are
+            checkpointed when the sweep is preempted have no result.
+        """
+        welcome = json.dumps(
+            {
+                "script": str(Path(script).resolve()),
+                "in_process": in_process,
+                "log_directory": (str(log_directory) if log_directory is not None else None),
+            }
+        ).encode()
+        runs = iter(runs)
+        requeued = deque()
+        exhausted = False
+        next_heartbeat = time.monotonic() + self.heartbeat_interval
+
+        while True:
+            # hand out runs to the workers which asked for them
+            for worker in list(self.workers.values()):
+                while worker.wanted > 0 and worker.connection in self.workers:
+                    pending_run = requeued.popleft() if requeued else None
+                    while pending_run is None and not exhausted:
+                        if checkpointer is not None:
+                            run = checkpointer.next_run(runs)
+                        else:
+                            run = next(runs, None)
+                        if run is None:
+                            exhausted = True
+                            break
+                        pending_run = check_run(
+                            script,
+                            run,
+                            cache,
+                            journal,
+                            reports_directory,
+                            checkpointer=checkpointer,
+                        )
+                        if isinstance(pending_run, RunResult):
+                            if monitor is not None:
+                                monitor.run_finished(pending_run)
+                            yield pending_run
+                            pending_run = None
+                    if pending_run is None:
+                        break
+                    run = pending_run.run
+                    try:
+                        worker.send(
+                            RUN,
+                            encode_run(
+                                run.index,
+                                run.arguments,
+                                pending_run.report_directory,
+                                pending_run.checkpoint_path,
+                            ),
+                        )
+                    except OSError:
+                        requeued.appendleft(pending_run)
+                        self.drop(worker, requeued, "disconnected")
+                        break
+                    worker.wanted -= 1
+                    worker.in_flight[run.index] = pending_run
+                    if monitor is not None:
+                        monitor.run_submitted(run)
+
+            in_flight = any(worker.in_flight for worker in self.workers.values())
+            if exhausted and not requeued and not in_flight:
+                break
+
+            timeout = max(next_heartbeat - time.monotonic(), 0)
+            check_interval = get_check_interval(pruner, checkpointer)
+            if check_interval is not None:
+                timeout = min(timeout, check_interval)
+            for checker in (pruner, checkpointer):
+                if checker is not None:
+                    checker.check(
+                        pending_run
+                        for worker in self.workers.values()
+                        for pending_run in worker.in_flight.values()
+                    )
+            for key, _ in self.selector.select(timeout=timeout):
+                if key.fileobj is self.server:
+                    self.accept()
+                    continue
+                worker = key.data
+                try:
+                    data = worker.connection.recv(1 << 16)
+                except OSError:
+                    data = b""
+                if not data:
+                    self.drop(worker, requeued, "disconnected")
+                    continue
+                worker.last_seen = time.monotonic()
+                for kind, payload in worker.reader.feed(data):
+                    if kind == HELLO:
+                        _logger.info(f"Worker {worker.name} joined: {json.loads(payload)}")
+                        try:
+                            worker.send(WELCOME, welcome)
+                        except OSError:
+                            self.drop(worker, requeued, "disconnected")
+                            break
+                    elif kind == REQUEST_RUNS:
+                        worker.wanted += RUN_COUNT.unpack(payload)[0]
+                    elif kind == RESULT:
+                        index, returncode, usage, reports = decode_result(payload)
+                        pending_run = worker.in_flight.pop(index, None)
+                        if pending_run is None:
+                            continue
+                        if pruner is not None:
+                            pruner.run_finished(pending_run)
+                        result = finish_run(
+                            pending_run,
+                            returncode,
+                            usage,
+                            cache,
+                            journal,
+                            reports=reports,
+                        )
+                        if checkpointer is not None and checkpointer.run_finished(
+                            pending_run, result
+                        ):
+                            if monitor is not None:
+                                monitor.run_checkpointed(pending_run.run)
+                            # the run is resumed after the other runs
+                            exhausted = exhausted and not checkpointer.resumed
+                            continue
+                        if monitor is not None:
+                            monitor.run_finished(result)
+                        yield result
+
+            if time.monotonic() >= next_heartbeat:
+                self.send_heartbeats(requeued)
+                next_heartbeat = time.monotonic() + self.heartbeat_interval
+
+    def close(self):
+        """Tell the workers to stop, and stop listening."""
+        for worker in list(self.workers.values()):
+            try:
+                worker.send(SHUTDOWN)
+            except OSError:
+                pass
+            self.selector.unregister(worker.connection)
+            worker.connection.close()
+        self.workers.clear()
+        self.selector.close()
+        self.server.close()
+
+
+def execute_remote_run(
+    script,
+    index,
+    arguments,
+    in_process,
+    log_directory,
+    report_directory,
+    checkpoint_path=None,
+):
+    """
+    Execute a run received from the coordinator.
+
+    This function runs in the worker processes of the pool of a worker node.
+
+    Returns:
+        tuple: The exit code, the resource usage and the reports of the run.
+    """
+    if in_process:
+        returncode, usage = execute_in_process(arguments, None, report_directory, checkpoint_path)
+    else:
+        command = build_command(script, arguments)
+        stdout, stderr = get_log_file_names(log_directory, index)
+        returncode, usage = execute_command(
+            command, None, stdout, stderr, report_directory, checkpoint_path
+        )
+    return returncode, usage, read_reports(report_directory)
+
+
+def connect(address, timeout):
+    """Connect to the coordinator, retrying until it listens or the timeout expires."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            connection = socket.create_connection(address)
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.5)
+            continue
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return connection
+
+
+def run_worker(
+    address,
+    max_workers=None,
+    queue_size=None,
+    heartbeat_interval=HEARTBEAT_INTERVAL,
+    heartbeat_timeout=HEARTBEAT_TIMEOUT,
+    connect_timeout=60.0,
+):
+    """
+    Execute the runs handed out by a coordinator until it has no more runs.
+
+    Args:
+        address (tuple): Host and port of the coordinator.
+        max_workers (int, optional): Number of runs to execute at the same time. Defaults
+            to the number of CPU cores.
+        queue_size (int, optional): Maximum number of runs which are requested but not yet
+            finished. Defaults to one more than the number of workers, so a new run is
+            waiting when one finishes.
+        heartbeat_interval (float): Seconds between the heartbeats sent to the coordinator.
+        heartbeat_timeout (float): Seconds of silence after which the coordinator is
+            assumed to be gone.
+        connect_timeout (float): Seconds to keep trying to connect to the coordinator.
+
+    Returns:
+        bool: True if the coordinator ended the sweep, False if the connection was lost.
+    """
+    max_workers = max_workers or get_default_max_workers()
+    queue_size = max(queue_size or max_workers + 1, max_workers)
+    connection = connect(address, connect_timeout)
+    events = queue.Queue()
+
+    def read_frames():
+        reader = FrameReader()
+        try:
+            while True:
+                data = connection.recv(1 << 16)
+                if not data:
+                    break
+                for frame in reader.feed(data):
+                    events.put(frame)
+        except OSError:
+            pass
+        events.put((_LOST, b""))
+
+    threading.Thread(target=read_frames, daemon=True).start()
+
+    def send(kind, payload=b""):
+        connection.sendall(encode_frame(kind, payload))
+
+    hello = {
+        "host": socket.gethostname(),
+        "pid": os.getpid(),
+        "max_workers": max_workers,
+    }
+    send(HELLO, json.dumps(hello).encode())
+    kind, payload = events.get()
+    while kind == HEARTBEAT:
+        kind, payload = events.get()
+    if kind != WELCOME:
+        connection.close()
+        return kind == SHUTDOWN
+    settings = json.loads(payload)
+    script = settings["script"]
+    in_process = settings["in_process"]
+    log_directory = settings["log_directory"]
+    if log_directory is not None:
+        Path(log_directory).mkdir(parents=True, exist_ok=True)
+    _logger.info(f"Running {script} for {address[0]}:{address[1]} with {max_workers} workers")
+
+    finished = False
+    running = {}
+    requested = 0
+    last_heard = next_heartbeat = time.monotonic()
+    pool_arguments = get_pool_arguments(script, in_process)
+    executor = ProcessPoolExecutor(max_workers=max_workers, **pool_arguments)
+    try:
+        while True:
+            wanted = queue_size - len(running) - requested
+            if wanted > 0:
+                send(REQUEST_RUNS, RUN_COUNT.pack(wanted))
+                requested += wanted
+
+            try:
+                kind, payload = events.get(timeout=heartbeat_interval)
+            except queue.Empty:
+                kind = None
+            now = time.monotonic()
+            if kind not in (None, _FINISHED, _LOST):
+                last_heard = now
+
+            if kind == RUN:
+                requested -= 1
+                index, arguments, report_directory, checkpoint_path = decode_run(payload)
+                call = (
+                    execute_remote_run,
+                    script,
+                    index,
+                    arguments,
+                    in_process,
+                    log_directory,
+                    report_directory,
+                    checkpoint_path,
+                )
+                try:
+                    future = executor.submit(*call)
+                except BrokenProcessPool:
+                    # a worker process died, e.g. by a crash of an in-process run
+                    _logger.error("A worker process died unexpectedly, starting a new pool")
+                    executor.shutdown(wait=True)
+                    pool_arguments = get_pool_arguments(script, in_process)
+                    executor = ProcessPoolExecutor(max_workers=max_workers, **pool_arguments)
+                    future = executor.submit(*call)
+                running[future] = index
+                future.add_done_callback(lambda future: events.put((_FINISHED, future)))
+            elif kind == _FINISHED:
+                index = running.pop(payload)
+                try:
+                    returncode, usage, reports = payload.result()
+                except Exception as err:
+                    _logger.error(f"Run {index} failed in the worker pool: {err}")
+                    returncode, usage, reports = 1, {"wall_time": 0.0}, ({}, {})
+                send(RESULT, encode_result(index, returncode, usage, reports))
+            elif kind == SHUTDOWN:
+                finished = True
+                break
+            elif kind == _LOST:
+                _logger.error("Lost the connection with the coordinator")
+                break
+
+            if now - last_heard > heartbeat_timeout:
+                _logger.error("The coordinator stopped sending heartbeats")
+                break
+            if now >= next_heartbeat:
+                send(HEARTBEAT)
+                next_heartbeat = now + heartbeat_interval
+    except OSError as err:
+        _logger.error(f"Lost the connection with the coordinator: {err}")
+    finally:
+        connection.close()
+        for future in running:
+            future.cancel()
+        executor.shutdown(wait=True)
+    return finished
@@ -0,0 +1,873 @@
+"""
+Execution of the runs of a sweep on a pool of local worker processes.
+
+Runs are executed either as a subprocess per run, or in-process: Python scripts which
+define a ``main(argv)`` function are imported once per worker, and ``main`` is called with
+the arguments of every run. This avoids the interpreter start-up for every run.
+"""
+
+import contextlib
+import importlib.util
+import logging
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+from parametric_simulator.checkpoint import (
+    CHECKPOINT_VARIABLE,
+    CHECKPOINTED_EXIT_CODE,
+    mark_started,
+    remove_checkpoint,
+    reset_hooks,
+)
+from parametric_simulator.constants import EXECUTION_MODES
+from parametric_simulator.instrumentation import InProcessUsage, wait_for_process
+from parametric_simulator.journal import get_run_hash
+from parametric_simulator.reporting import (
+    PRUNED_EXIT_CODE,
+    REPORT_DIRECTORY_VARIABLE,
+    get_report_directory,
+    is_stop_requested,
+    read_reports,
+)
+from parametric_simulator.sweep import Run
+
+_logger = logging.getLogger(__name__)
+
+# the function of a script which evaluates a block of runs at once, in the vectorized mode
+BATCH_FUNCTION_NAME = "main_batch"
+
+# the prefix of a reported scalar with the name of a parameter or a column of the run
+OUTPUT_PREFIX = "output_"
+
+# the names of the reported scalars which were renamed, to warn only once per name
+_renamed_outputs = set()
+
+# the main function of the script of the in-process workers
+_script_main = None
+
+
+@dataclass
+class RunResult:
+    """
+    The outcome of a single run.
+
+    Attributes:
+        index (int): Sequence number of the run within the sweep.
+        parameters (dict): The parameters of the run.
+        returncode (int): Exit code of the script. Negative values mean the script was
+            killed by a signal, as with :mod:`subprocess`.
+        wall_time (float): Elapsed time of the run in seconds.
+        cached (bool): True if the result was taken from the result cache instead of
+            executing the script.
+        outputs (dict): The scalars reported by the script.
+        arrays (dict): The file names of the arrays reported by the script, which can be
+            loaded with :func:`~parametric_simulator.reporting.load_array`.
+        user_time (float, optional): User CPU time of the run in seconds.
+        system_time (float, optional): System CPU time of the run in seconds.
+        peak_rss (int, optional): Peak resident set size of the run in bytes.
+        read_bytes (int, optional): Number of bytes read by the run.
+        write_bytes (int, optional): Number of bytes written by the run.
+        pruned (bool): True if the run was stopped early because its intermediate results
+            were worse than those of the other runs.
+        duplicate_of (int, optional): The index of the equivalent run of which the result
+            was taken, instead of executing this run.
+        checkpointed (bool): True if the run saved a checkpoint and stopped before it
+            finished, to be resumed later.
+    """
+
+    index: int
+    parameters: Dict[str, object] = field(default_factory=dict)
+    returncode: int = 0
+    wall_time: float = 0.0
+    cached: bool = False
+    outputs: Dict[str, object] = field(default_factory=dict)
+    arrays: Dict[str, str] = field(default_factory=dict)
+    user_time: Optional[float] = None
+    system_time: Optional[float] = None
+    peak_rss: Optional[int] = None
+    read_bytes: Optional[int] = None
+    write_bytes: Optional[int] = None
+    pruned: bool = False
+    duplicate_of: Optional[int] = None
+    checkpointed: bool = False
+
+    @property
+    def success(self):
+        """bool: True if the script exited with a zero exit code."""
+        return self.returncode == 0
+
+    def to_row(self):
+        """
+        Get the result as a row of the results store.
+
+        A reported scalar with the name of a parameter or of one of the columns of the run,
+        such as ``returncode``, gets the prefix :data:`OUTPUT_PREFIX`, so it does not
+        overwrite that column.
+
+        Returns:
+            dict: The parameters and reported scalars of the run together with the run
+            index, exit code, resource usage and whether the result came from the cache.
+        """
+        columns = {
+            "run_index": self.index,
+            "returncode": self.returncode,
+            "wall_time": self.wall_time,
+            "user_time": self.user_time,
+            "system_time": self.system_time,
+            "peak_rss": self.peak_rss,
+            "read_bytes": self.read_bytes,
+            "write_bytes": self.write_bytes,
+            "cached": self.cached,
+            "pruned": self.pruned,
+            "duplicate_of": self.duplicate_of,
+        }
+        outputs = {}
+        for name, value in self.outputs.items():
+            if name in self.parameters or name in columns:
+                if name not in _renamed_outputs:
+                    _renamed_outputs.add(name)
+                    _logger.warning(
+                        f"The reported {name} has the name of a column of the results, "
+                        f"storing it as {OUTPUT_PREFIX}{name}"
+                    )
+                name = f"{OUTPUT_PREFIX}{name}"
+            outputs[name] = value
+        return {**outputs, **self.parameters, **columns}
+
+
+@dataclass
+class PendingRun:
+    """
+    A run which has to be executed, with its keys in the result cache and the journal.
+
+    Attributes:
+        run (Run): The run to execute.
+        cache_key (str, optional): Key of the run in the result cache.
+        run_hash (bytes, optional): Hash of the run in the journal.
+        report_directory (Path, optional): Directory in which the run reports its results.
+        working_directory (Path, optional): The working directory staged for the run.
+        checkpoint_path (Path, optional): The checkpoint of the run.
+    """
+
+    run: Run
+    cache_key: Optional[str] = None
+    run_hash: Optional[bytes] = None
+    report_directory: Optional[Path] = None
+    working_directory: Optional[Path] = None
+    checkpoint_path: Optional[Path] = None
+
+
+def get_default_max_workers():
+    """
+    Get the default number of worker processes, which is the number of CPU cores.
+
+    Returns:
+        int: The number of CPU cores available to this process.
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # pragma: no cover
+        # sched_getaffinity is not available on all platforms
+        return os.cpu_count() or 1
+
+
+def build_command(script, arguments=None):
+    """
+    Build the command line to execute a script.
+
+    Python scripts are started with the interpreter that runs the simulator, all other
+    scripts are executed directly. Python scripts and scripts given with a directory are
+    started by their absolute path, so they are found by runs with their own working
+    directory; a bare command name is still looked up on the ``PATH``.
+
+    Args:
+        script (str or Path): The script to execute.
+        arguments (list, optional): Command-line arguments for the script.
+
+    Returns:
+        list: The command as a list of strings.
+    """
+    is_python = Path(script).suffix == ".py"
+    if is_python or os.sep in str(script):
+        script = os.path.abspath(script)
+    command = [str(script)]
+    if is_python:
+        command.insert(0, sys.executable)
+    return command + [str(argument) for argument in arguments or []]
+
+
+def get_log_file_names(log_directory, index):
+    """
+    Get the files to which the output of a run is written.
+
+    Args:
+        log_directory (str or Path or None): Directory of the log files.
+        index (int): Sequence number of the run.
+
+    Returns:
+        tuple: The stdout and stderr file names, or ``(None, None)`` if no log directory is
+        given, in which case the output is not redirected.
+    """
+    if log_directory is None:
+        return None, None
+    log_directory = Path(log_directory)
+    return log_directory / f"run_{index:06d}.out", log_directory / f"run_{index:06d}.err"
+
+
+def get_run_variables(report_directory=None, checkpoint_path=None):
+    """
+    Get the environment variables which the simulator sets for a run.
+
+    Args:
+        report_directory (str or Path, optional): Directory in which the run reports its
+            results.
+        checkpoint_path (str or Path, optional): The checkpoint of the run.
+
+    Returns:
+        dict: The variables which are given.
+    """
+    variables = {}
+    if report_directory is not None:
+        variables[REPORT_DIRECTORY_VARIABLE] = str(report_directory)
+    if checkpoint_path is not None:
+        variables[CHECKPOINT_VARIABLE] = str(checkpoint_path)
+    return variables
+
+
+def get_environment(report_directory=None, checkpoint_path=None):
+    """
+    Get the environment variables of a run.
+
+    Args:
+        report_directory (str or Path, optional): Directory in which the run reports its
+            results.
+        checkpoint_path (str or Path, optional): The checkpoint of the run.
+
+    Returns:
+        dict or None: The environment of this process extended with the report directory
+        and the checkpoint, or None to inherit the environment unchanged.
+    """
+    variables = get_run_variables(report_directory, checkpoint_path)
+    if not variables:
+        return None
+    return {**os.environ, **variables}
+
+
+def execute_command(
+    command, cwd=None, stdout=None, stderr=None, report_directory=None, checkpoint_path=None
+):
+    """
+    Execute a command in a subprocess and wait for it to finish.
+
+    This function runs in the worker processes of the pool.
+
+    Args:
+        command (list): The command to execute.
+        cwd (str, optional): Working directory of the subprocess.
+        stdout (str or Path, optional): File to which the standard output is written.
+        stderr (str or Path, optional): File to which the standard error is written.
+        report_directory (str or Path, optional): Directory in which the run reports its
+            results.
+        checkpoint_path (str or Path, optional): The checkpoint of the run.
+
+    Returns:
+        tuple: The exit code of the command and a dict with its resource usage, see
+        :data:`~parametric_simulator.instrumentation.USAGE_FIELDS`.
+    """
+    start = time.perf_counter()
+    mark_started(report_directory, checkpoint_path)
+    env = get_environment(report_directory, checkpoint_path)
+    try:
+        with open_log_file(stdout) as out, open_log_file(stderr) as err:
+            process = subprocess.Popen(command, cwd=cwd, stdout=out, stderr=err, env=env)
+    except OSError as err:
+        _logger.error(f"Could not start {command}: {err}")
+        return 127, {"wall_time": time.perf_counter() - start}
+    return wait_for_process(process, start)
+
+
+def open_log_file(file_name):
+    """
+    Open a log file for the output of a run.
+
+    Args:
+        file_name (str or Path or None): The log file.
+
+    Returns:
+        A context manager giving the opened file, or None if no file name is given.
+    """
+    if file_name is None:
+        return contextlib.nullcontext()
+    return open(file_name, "wb")
+
+
+def check_run(
+    script, run, cache=None, journal=None, reports_directory=None, stager=None, checkpointer=None
+):
+    """
+    Check the journal and the result cache before a run is executed.
+
+    Args:
+        script (str or Path): The script of the sweep.
+        run (Run): The run to check.
+        cache (ResultCache, optional): The cache of previous results.
+        journal (RunJournal, optional): The journal of the sweep.
+        reports_directory (str or Path, optional): Directory with the report directories of
+            all runs. The report directory of a run which has to be executed is emptied.
+        stager (Stager, optional): Creates the working directory of a run which has to be
+            executed.
+        checkpointer (Checkpointer, optional): Gives the run the path of its checkpoint.
+
+    Returns:
+        None if the run already finished successfully according to the journal, a
+        :class:`RunResult` if the result is in the cache, or else a :class:`PendingRun`
+        which has to be executed.
+    """
+    run_hash = None
+    if journal is not None:
+        run_hash = get_run_hash(script, run.arguments)
+        if journal.is_done(run_hash):
+            _logger.debug(f"Run {run.index} already done according to the journal")
+            return None
+
+    cache_key = cache.get_key(script, run.arguments) if cache is not None else None
+    cached_result = cache.get(cache_key) if cache_key is not None else None
+    if cached_result is not None:
+        _logger.debug(f"Run {run.index} found in the cache")
+        if run_hash is not None:
+            journal.record(run_hash, cached_result["returncode"], cached_result["wall_time"])
+        return RunResult(index=run.index, parameters=run.parameters, cached=True, **cached_result)
+
+    report_directory = get_report_directory(reports_directory, run.index)
+    if report_directory is not None:
+        # the run may execute in its own working directory, so it gets an absolute path
+        report_directory = report_directory.absolute()
+        if report_directory.exists():
+            # remove the reports of a previous attempt
+            shutil.rmtree(report_directory)
+    working_directory = stager.stage(run.index) if stager is not None else None
+    checkpoint_path = None
+    if checkpointer is not None:
+        if run_hash is None:
+            run_hash = get_run_hash(script, run.arguments)
+        checkpoint_path = checkpointer.get_checkpoint_path(run_hash)
+        if checkpoint_path.exists():
+            _logger.debug(f"Run {run.index} resumes from {checkpoint_path}")
+    return PendingRun(
+        run=run,
+        cache_key=cache_key,
+        run_hash=run_hash,
+        report_directory=report_directory,
+        working_directory=working_directory,
+        checkpoint_path=checkpoint_path,
+    )
+
+
+def finish_run(pending_run, returncode, usage, cache=None, journal=None, reports=None, stager=None):
+    """
+    Record the outcome of an executed run in the journal and the result cache.
+
+    Args:
+        pending_run (PendingRun): The run, as returned by :func:`check_run`.
+        returncode (int): The exit code of the run.
+        usage (dict): The resource usage of the run, with at least the ``wall_time``.
+        cache (ResultCache, optional): The cache of previous results.
+        journal (RunJournal, optional): The journal of the sweep.
+        reports (tuple, optional): The scalars and arrays reported by the run, if they were
+            already read, e.g. by a remote worker. Else they are read from the report
+            directory of the run.
+        stager (Stager, optional): Cleans up the working directory of the run.
+
+    Returns:
+        RunResult: The result of the run.
+    """
+    run = pending_run.run
+    wall_time = usage["wall_time"]
+    pruned = returncode == PRUNED_EXIT_CODE and is_stop_requested(pending_run.report_directory)
+    checkpoint_path = pending_run.checkpoint_path
+    checkpointed = (
+        returncode == CHECKPOINTED_EXIT_CODE
+        and checkpoint_path is not None
+        and checkpoint_path.exists()
+    )
+    if journal is not None and pending_run.run_hash is not None:
+        # pruned runs are not executed again when the sweep is resumed
+        journal.record(
+            pending_run.run_hash, 0 if pruned else returncode, wall_time, checkpointed=checkpointed
+        )
+    if reports is None:
+        reports = read_reports(pending_run.report_directory)
+    outputs, arrays = reports
+    result = RunResult(
+        index=run.index,
+        parameters=run.parameters,
+        returncode=returncode,
+        outputs=outputs,
+        arrays=arrays,
+        pruned=pruned,
+        checkpointed=checkpointed,
+        **usage,
+    )
+    if checkpointed:
+        _logger.debug(f"Run {run.index} saved the checkpoint {checkpoint_path}")
+    elif pruned:
+        _logger.info(f"Run {run.index} with {run.parameters} was pruned")
+    elif result.success:
+        _logger.debug(f"Run {run.index} finished in {wall_time:.3f} s")
+        if pending_run.cache_key is not None:
+            cache.put(
+                pending_run.cache_key,
+                {"returncode": returncode, "wall_time": wall_time, "outputs": outputs},
+            )
+    else:
+        _logger.warning(f"Run {run.index} with {run.parameters} failed: {returncode}")
+    if (result.success or pruned) and checkpoint_path is not None:
+        # a failed run keeps its checkpoint, so it is resumed when it is executed again
+        remove_checkpoint(checkpoint_path)
+    if stager is not None and pending_run.working_directory is not None:
+        stager.release(run.index, result.success or pruned or checkpointed)
+    return result
+
+
+def load_script(script):
+    """
+    Import a Python script as a module.
+
+    The script is imported under its own name and not as ``__main__``, so the code
+    guarded by ``if __name__ == "__main__"`` is not executed.
+
+    Args:
+        script (str or Path): The Python script to import.
+
+    Returns:
+        module: The imported script.
+    """
+    script = Path(script).resolve()
+    module_name = script.stem
+    module = sys.modules.get(module_name)
+    if module is not None and getattr(module, "__file__", None) == str(script):
+        return module
+    spec = importlib.util.spec_from_file_location(module_name, script)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def get_script_main(script, name="main"):
+    """
+    Get the ``main(argv)`` function of a script, if it can be run in-process.
+
+    Args:
+        script (str or Path): The script to inspect.
+        name (str): The name of the function, e.g. :data:`BATCH_FUNCTION_NAME` for the
+            vectorized mode.
+
+    Returns:
+        callable or None: The main function, or None if the script is not a Python script
+        or does not define a main function.
+    """
+    if Path(script).suffix != ".py":
+        return None
+    try:
+        main = getattr(load_script(script), name, None)
+    except Exception as err:
+        _logger.warning(f"Could not import {script}: {err}")
+        return None
+    return main if callable(main) else None
+
+
+def initialize_worker(script):
+    """
+    Prepare a worker process for in-process execution of the script.
+
+    When the worker is forked from a parent which already imported the script, the import
+    is reused.
+
+    Args:
+        script (str or Path): The Python script with a ``main(argv)`` function.
+    """
+    global _script_main
+    _script_main = get_script_main(script)
+
+
+def execute_in_process(arguments, cwd=None, report_directory=None, checkpoint_path=None):
+    """
+    Call the main function of the script in the current worker process.
+
+    A :class:`SystemExit` raised by the script gives the exit code of the run, and any
+    other exception is logged and results in exit code 1.
+
+    Args:
+        arguments (list): The command-line arguments passed to ``main``.
+        cwd (str, optional): Working directory during the call.
+        report_directory (str or Path, optional): Directory in which the run reports its
+            results.
+        checkpoint_path (str or Path, optional): The checkpoint of the run.
+
+    Returns:
+        tuple: The exit code of the call and a dict with its resource usage, see
+        :data:`~parametric_simulator.instrumentation.USAGE_FIELDS`.
+    """
+    previous_cwd = os.getcwd() if cwd is not None else None
+    mark_started(report_directory, checkpoint_path)
+    variables = get_run_variables(report_directory, checkpoint_path)
+    os.environ.update(variables)
+    with InProcessUsage() as measurement:
+        try:
+            if cwd is not None:
+                os.chdir(cwd)
+            _script_main([str(argument) for argument in arguments])
+            returncode = 0
+        except SystemExit as err:
+            if err.code is None or isinstance(err.code, int):
+                returncode = err.code or 0
+            else:
+                returncode = 1
+        except Exception:
+            _logger.error(f"Run with arguments {arguments} failed:\n{traceback.format_exc()}")
+            returncode = 1
+        finally:
+            for name in variables:
+                os.environ.pop(name, None)
+            # the checkpoint hooks and signal handlers of the run are not kept by the worker
+            reset_hooks()
+            if previous_cwd is not None:
+                os.chdir(previous_cwd)
+    return returncode, measurement.usage
+
+
+def get_fork_context():
+    """
+    Get the context in which the worker processes of a pool are started.
+
+    The workers are forked, so they start with the modules which this process already
+    imported, such as the script. A fork copies the locks held by the other threads of the
+    process, e.g. of the progress endpoint, which then stay locked in the workers. Once such
+    threads run, the workers are therefore forked from a fork server instead, and import the
+    script themselves.
+
+    Returns:
+        multiprocessing.context.BaseContext or None: The context, or None if the platform
+        cannot fork.
+    """
+    if "fork" not in multiprocessing.get_all_start_methods():
+        return None
+    if threading.active_count() > 1:
+        _logger.debug("Threads are running, so the worker processes use a fork server")
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("fork")
+
+
+def get_pool_arguments(script, in_process):
+    """
+    Get the arguments of the worker pool which executes the runs.
+
+    Get them again for every new pool, as the context depends on the running threads, see
+    :func:`get_fork_context`.
+
+    Args:
+        script (str or Path): The script of the sweep.
+        in_process (bool): Whether the runs are executed in-process.
+
+    Returns:
+        dict: Keyword arguments for :class:`~concurrent.futures.ProcessPoolExecutor`.
+    """
+    pool_arguments = {"mp_context": get_fork_context()}
+    if in_process:
+        # import the script once in the parent, so forked workers start warmed up
+        get_script_main(script)
+        pool_arguments["initializer"] = initialize_worker
+        pool_arguments["initargs"] = (str(script),)
+    return pool_arguments
+
+
+def execute_batch(function, calls):
+    """
+    Execute a batch of runs one after the other in the current worker process.
+
+    Args:
+        function (callable): :func:`execute_command` or :func:`execute_in_process`.
+        calls (list): The positional arguments of every call.
+
+    Returns:
+        list: The exit code and resource usage of every run.
+    """
+    return [function(*arguments) for arguments in calls]
+
+
+def use_in_process(script, execution_mode):
+    """
+    Decide whether the runs of a script are executed in-process.
+
+    Args:
+        script (str or Path): The script of the sweep.
+        execution_mode (str): One of :data:`EXECUTION_MODES`. With ``auto``, Python
+            scripts with a ``main(argv)`` function are run in-process.
+
+    Returns:
+        bool: True if the runs are executed in-process. The vectorized mode has its own
+        engine, see :mod:`~parametric_simulator.vectorized`.
+
+    Raises:
+        ValueError: If the mode is unknown, or ``in_process`` or ``vectorized`` is
+            requested for a script without the function it needs.
+    """
+    if execution_mode not in EXECUTION_MODES:
+        raise ValueError(f"Execution mode must be one of {EXECUTION_MODES}: {execution_mode}")
+    if execution_mode in ("subprocess", "asyncio"):
+        return False
+    if execution_mode == "vectorized":
+        if get_script_main(script, BATCH_FUNCTION_NAME) is None:
+            raise ValueError(
+                f"Script {script} has no {BATCH_FUNCTION_NAME}(parameters) function to run "
+                "vectorized"
+            )
+        return False
+    has_main = get_script_main(script) is not None
+    if execution_mode == "in_process" and not has_main:
+        raise ValueError(f"Script {script} has no main(argv) function to run in-process")
+    return has_main
+
+
+def get_check_interval(*checkers):
+    """
+    Get the time between the checks of the running runs.
+
+    Args:
+        *checkers: The objects which check the running runs, such as the
+            :class:`~parametric_simulator.pruning.Pruner`, or None.
+
+    Returns:
+        float or None: The shortest interval of the checkers, or None if there are none.
+    """
+    intervals = [checker.interval for checker in checkers if checker is not None]
+    return min(intervals) if intervals else None
+
+
+def run_sweep(
+    script,
+    runs,
+    max_workers=None,
+    cwd=None,
+    queue_size=None,
+    cache=None,
+    journal=None,
+    in_process=False,
+    log_directory=None,
+    reports_directory=None,
+    monitor=None,
+    admission=None,
+    batch_sizer=None,
+    pruner=None,
+    stager=None,
+    checkpointer=None,
+) -> Iterator[RunResult]:
+    """
+    Run the script once for every run of the sweep on a pool of worker processes.
+
+    The runs are consumed lazily: only ``queue_size`` runs are submitted to the pool at any
+    time, and a new run is taken from ``runs`` as soon as one finishes. This keeps the
+    memory use flat for sweeps of any size and lets the first run start immediately.
+
+    If a result cache is given, runs with a successful result in the cache are not
+    executed again, and the results of new successful runs are added to the cache.
+
+    If a run journal is given, runs which already finished successfully according to the
+    journal are skipped without yielding a result, and every finished run is recorded.
+
+    If a worker process dies, e.g. when an in-process run crashes or calls ``os._exit``,
+    the runs in the pool fail, and the sweep continues in a new pool.
+
+    Args:
+        script (str or Path): The script to execute.
+        runs (iterable): The :class:`~parametric_simulator.sweep.Run` objects to execute.
+        max_workers (int, optional): Number of runs to execute at the same time. Defaults
+            to the number of CPU cores.
+        cwd (str, optional): Working directory of the runs.
+        queue_size (int, optional): Maximum number of submitted runs which have not yet
+            finished. Defaults to twice the number of workers.
+        cache (ResultCache, optional): The cache of previous results.
+        journal (RunJournal, optional): The journal of the sweep.
+        in_process (bool): Call the ``main(argv)`` function of the script in long-lived
+            worker processes instead of starting a subprocess per run. Where possible,
+            the workers are forked from this process after importing the script.
+        log_directory (str or Path, optional): Directory to which the standard output and
+            error of every subprocess are written. Not used for in-process runs.
+        reports_directory (str or Path, optional): Directory in which every run gets a
+            directory for the results it reports with :func:`~parametric_simulator.report`.
+        monitor (SweepMonitor, optional): Is informed of every submitted and finished run.
+        admission (MemoryAdmission, optional): Only starts a run when its memory estimate
+            fits in the memory budget. Runs are then only started when a worker is free,
+            so ``queue_size`` is ignored.
+        batch_sizer (BatchSizer, optional): Send the runs to the workers in batches of the
+            size it chooses, for runs which are too short to be sent one at a time. The
+            ``queue_size`` then counts batches. Not used together with ``admission``.
+        pruner (Pruner, optional): Stops runs whose intermediate results are worse than
+            those of the other runs.
+        stager (Stager, optional): Gives every run its own working directory, which is
+            used instead of ``cwd``.
+        checkpointer (Checkpointer, optional): Gives every run a checkpoint, and resumes
+            the runs which were checkpointed after the other runs.
+
+    Yields:
+        RunResult: The result of every run, in order of completion. Runs which are
+        checkpointed when the sweep is preempted have no result.
+    """
+    max_workers = max_workers or get_default_max_workers()
+    queue_size = max(queue_size or 2 * max_workers, max_workers)
+    if admission is not None:
+        # a run only claims its memory when it starts, so do not queue runs for the workers
+        queue_size = max_workers
+        batch_sizer = None
+    _logger.info(f"Running {script} with {max_workers} workers")
+
+    pool_arguments = get_pool_arguments(script, in_process)
+
+    if log_directory is not None:
+        Path(log_directory).mkdir(parents=True, exist_ok=True)
+
+    runs = iter(runs)
+    pending = {}
+    # the time at which every batch was submitted, for the runs lost with a broken pool
+    submitted = {}
+    # a run which does not fit in the memory budget yet
+    waiting = None
+    executor = ProcessPoolExecutor(max_workers=max_workers, **pool_arguments)
+    try:
+
+        def get_call(pending_run):
+            run = pending_run.run
+            report_directory = pending_run.report_directory
+            run_cwd = pending_run.working_directory or cwd
+            checkpoint_path = pending_run.checkpoint_path
+            if in_process:
+                return execute_in_process, (
+                    run.arguments,
+                    run_cwd,
+                    report_directory,
+                    checkpoint_path,
+                )
+            command = build_command(script, run.arguments)
+            stdout, stderr = get_log_file_names(log_directory, run.index)
+            return execute_command, (
+                command,
+                run_cwd,
+                stdout,
+                stderr,
+                report_directory,
+                checkpoint_path,
+            )
+
+        def submit(batch):
+            calls = [get_call(pending_run) for pending_run in batch]
+            if batch_sizer is None:
+                function, arguments = calls[0]
+                future = executor.submit(function, *arguments)
+            else:
+                function = calls[0][0]
+                future = executor.submit(execute_batch, function, [call[1] for call in calls])
+            pending[future] = batch
+            submitted[future] = time.perf_counter()
+            if monitor is not None:
+                for pending_run in batch:
+                    monitor.run_submitted(pending_run.run)
+
+        # finish the runs of a future, and return whether the pool is broken
+        def collect(future):
+            batch = pending.pop(future)
+            start = submitted.pop(future)
+            broken = False
+            try:
+                if batch_sizer is None:
+                    outcomes = [future.result()]
+                else:
+                    outcomes = future.result()
+                    batch_sizer.update([usage["wall_time"] for _, usage in outcomes])
+            except BrokenProcessPool:
+                # a worker died, e.g. by a crash of an in-process run, and took its runs
+                broken = True
+                usage = {"wall_time": time.perf_counter() - start}
+                outcomes = [(1, usage)] * len(batch)
+                for pending_run in batch:
+                    _logger.error(f"Run {pending_run.run.index} was lost with a worker process")
+            for pending_run, (returncode, usage) in zip(batch, outcomes):
+                if pruner is not None:
+                    pruner.run_finished(pending_run)
+                result = finish_run(pending_run, returncode, usage, cache, journal, stager=stager)
+                if admission is not None:
+                    admission.release(result)
+                if checkpointer is not None and checkpointer.run_finished(pending_run, result):
+                    if monitor is not None:
+                        monitor.run_checkpointed(pending_run.run)
+                    continue
+                if monitor is not None:
+                    monitor.run_finished(result)
+                yield result
+            return broken
+
+        while True:
+            if waiting is not None and admission.try_admit(waiting.run):
+                submit([waiting])
+                waiting = None
+            batch = []
+            batch_size = batch_sizer.batch_size if batch_sizer is not None else 1
+            while waiting is None and len(pending) < queue_size:
+                run = checkpointer.next_run(runs) if checkpointer is not None else next(runs, None)
+                if run is None:
+                    break
+                pending_run = check_run(
+                    script, run, cache, journal, reports_directory, stager, checkpointer
+                )
+                if pending_run is None:
+                    continue
+                if isinstance(pending_run, RunResult):
+                    if monitor is not None:
+                        monitor.run_finished(pending_run)
+                    yield pending_run
+                    continue
+                if admission is not None and not admission.try_admit(run):
+                    waiting = pending_run
+                    break
+                batch.append(pending_run)
+                if len(batch) >= batch_size:
+                    submit(batch)
+                    batch = []
+            if batch:
+                submit(batch)
+            if not pending:
+                break
+
+            timeout = get_check_interval(pruner, checkpointer)
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if pruner is not None:
+                pruner.check(pending_run for batch in pending.values() for pending_run in batch)
+            if checkpointer is not None:
+                checkpointer.check(
+                    pending_run for batch in pending.values() for pending_run in batch
+                )
+            broken = False
+            for future in done:
+                broken = (yield from collect(future)) or broken
+            if broken:
+                # all runs in the pool are lost with it; start a new pool for the other runs
+                done, _ = wait(pending)
+                for future in done:
+                    yield from collect(future)
+                executor.shutdown(wait=True)
+                _logger.error("A worker process died unexpectedly, starting a new pool")
+                pool_arguments = get_pool_arguments(script, in_process)
+                executor = ProcessPoolExecutor(max_workers=max_workers, **pool_arguments)
+    finally:
+        executor.shutdown(wait=True)
@@ -0,0 +1,140 @@
+"""
+Evaluation of arithmetic expressions of the parameters of a run in the settings file.
+
+Settings such as the memory estimate of a run are given as an expression of the
+parameters of the run, e.g.::
+
+    memory:
+      estimate: 200e6 + 8 * mesh_size ** 3
+
+Only numbers, strings, the parameters, the arithmetic and comparison operators,
+conditional expressions, dict literals, subscripts and the functions in :data:`FUNCTIONS`
+are allowed, so an expression cannot execute arbitrary code.
+"""
+
+import ast
+import math
+import operator
+import sys
+
+BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+
+UNARY_OPERATORS = {ast.UAdd: operator.pos, ast.USub: operator.neg, ast.Not: operator.not_}
+
+COMPARISON_OPERATORS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+}
+
+FUNCTIONS = {
+    "abs": abs,
+    "min": min,
+    "max": max,
+    "ceil": math.ceil,
+    "floor": math.floor,
+    "sqrt": math.sqrt,
+    "exp": math.exp,
+    "log": math.log,
+    "log2": math.log2,
+    "log10": math.log10,
+}
+
+
+def compile_expression(expression):
+    """
+    Parse an expression once, so it can be evaluated for many runs.
+
+    Args:
+        expression (str): The expression.
+
+    Returns:
+        ast.AST: The parsed expression.
+
+    Raises:
+        ValueError: If the expression is not valid Python syntax.
+    """
+    try:
+        return ast.parse(str(expression), mode="eval").body
+    except SyntaxError as err:
+        raise ValueError(f"Invalid expression {expression!r}: {err}") from err
+
+
+def evaluate_expression(expression, variables):
+    """
+    Evaluate an expression of the parameters of a run.
+
+    Args:
+        expression (str or ast.AST): The expression, or the result of
+            :func:`compile_expression`.
+        variables (dict): Mapping of parameter name to value.
+
+    Returns:
+        The value of the expression.
+
+    Raises:
+        ValueError: If the expression uses an unknown name or a construct which is not
+            allowed.
+    """
+    node = expression
+    if not isinstance(node, ast.AST):
+        node = compile_expression(expression)
+
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, str)):
+        return node.value
+    if isinstance(node, ast.Name):
+        if node.id in variables:
+            return variables[node.id]
+        raise ValueError(f"Unknown name in expression: {node.id}")
+    if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+        left = evaluate_expression(node.left, variables)
+        right = evaluate_expression(node.right, variables)
+        return BINARY_OPERATORS[type(node.op)](left, right)
+    if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS:
+        return UNARY_OPERATORS[type(node.op)](evaluate_expression(node.operand, variables))
+    if isinstance(node, ast.Compare) and all(type(op) in COMPARISON_OPERATORS for op in node.ops):
+        left = evaluate_expression(node.left, variables)
+        for op, comparator in zip(node.ops, node.comparators):
+            right = evaluate_expression(comparator, variables)
+            if not COMPARISON_OPERATORS[type(op)](left, right):
+                return False
+            left = right
+        return True
+    if isinstance(node, ast.Dict) and None not in node.keys:
+        return {
+            evaluate_expression(key, variables): evaluate_expression(value, variables)
+            for key, value in zip(node.keys, node.values)
+        }
+    if isinstance(node, ast.Subscript):
+        index = node.slice
+        if sys.version_info < (3, 9):  # pragma: no cover
+            index = index.value
+        container = evaluate_expression(node.value, variables)
+        try:
+            return container[evaluate_expression(index, variables)]
+        except (KeyError, IndexError, TypeError) as err:
+            raise ValueError(f"Invalid subscript in expression: {err}") from err
+    if isinstance(node, ast.IfExp):
+        if evaluate_expression(node.test, variables):
+            return evaluate_expression(node.body, variables)
+        return evaluate_expression(node.orelse, variables)
+    if (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Name)
+        and node.func.id in FUNCTIONS
+        and not node.keywords
+    ):
+        arguments = [evaluate_expression(argument, variables) for argument in node.args]
+        return FUNCTIONS[node.func.id](*arguments)
+    raise ValueError(f"Expression not allowed: {ast.dump(node)}")
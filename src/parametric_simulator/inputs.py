@@ -0,0 +1,181 @@
+"""
+Large read-only input data which is shared by all runs through memory-mapped files.
+
+Inputs such as meshes and lookup tables are declared once in the settings file::
+
+    inputs:
+      mesh: meshes/wing.npy
+      drag:
+        file: tables/drag.csv
+        delimiter: ","
+        skiprows: 1
+
+Before the sweep starts, every input is converted once into a ``.npy`` file: ``.npy``
+files are used as they are, an array of an ``.npz`` file is selected with ``key``, and
+other files are read as text with :func:`numpy.loadtxt`, taking the other settings of the
+input as its arguments. The converted files are kept in ``paths.inputs``, or else in the
+cache directory of the user, and are only converted again when the source file changes.
+
+Every run gets the path of the ``.npy`` file of an input in the environment variable
+``PARSIM_INPUT_<NAME>``, and a script gets a read-only memory-mapped view with::
+
+    from parametric_simulator import load_input
+
+    mesh = load_input("mesh")
+
+The views are kept for the lifetime of the process, so in-process workers map every input
+once, and all the workers share the pages of the file in the page cache instead of each
+holding a copy.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+_logger = logging.getLogger(__name__)
+
+INPUT_VARIABLE_PREFIX = "PARSIM_INPUT_"
+
+# the inputs which are mapped into this process, by name
+_mapped_inputs = {}
+
+
+def get_input_variable(name):
+    """
+    Get the name of the environment variable with the file of an input.
+
+    Args:
+        name (str): Name of the input.
+
+    Returns:
+        str: The name of the variable, e.g. ``PARSIM_INPUT_MESH``.
+    """
+    return INPUT_VARIABLE_PREFIX + name.upper()
+
+
+def get_default_inputs_directory():
+    """
+    Get the directory of the converted inputs if ``paths.inputs`` is not given.
+
+    Returns:
+        Path: ``parametric_simulator/inputs`` in ``$XDG_CACHE_HOME``, which defaults to
+        ``~/.cache``.
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "parametric_simulator" / "inputs"
+
+
+def convert_input(name, settings, directory):
+    """
+    Convert an input into a ``.npy`` file which can be memory-mapped.
+
+    The converted file is named after a hash of the path, size and modification time of
+    the source file and the conversion settings, so it is reused until any of them
+    change.
+
+    Args:
+        name (str): Name of the input.
+        settings (str or dict): The file of the input, or a dict with the ``file`` and the
+            settings of the conversion.
+        directory (str or Path): Directory in which the converted file is stored.
+
+    Returns:
+        Path: The ``.npy`` file of the input.
+
+    Raises:
+        ValueError: If the settings are invalid or the file cannot be converted.
+        OSError: If the file cannot be read or written.
+    """
+    if isinstance(settings, (str, Path)):
+        settings = {"file": settings}
+    options = dict(settings)
+    try:
+        source = Path(options.pop("file")).resolve()
+    except KeyError:
+        raise ValueError(f"Input {name} has no file") from None
+    if source.suffix == ".npy":
+        if options:
+            _logger.warning(f"Input {name} is a .npy file, ignoring {sorted(options)}")
+        return source
+
+    status = source.stat()
+    identity = [str(source), status.st_size, status.st_mtime_ns, options]
+    digest = hashlib.sha256(json.dumps(identity, sort_keys=True).encode()).hexdigest()
+    file_name = Path(directory) / f"{name}-{digest[:16]}.npy"
+    if file_name.exists():
+        _logger.debug(f"Using the converted input {name} in {file_name}")
+        return file_name
+
+    import numpy as np
+
+    _logger.info(f"Converting input {name} from {source} to {file_name}")
+    if source.suffix == ".npz":
+        with np.load(source, allow_pickle=False) as arrays:
+            key = options.get("key")
+            if key is None and len(arrays.files) == 1:
+                key = arrays.files[0]
+            if key not in arrays.files:
+                raise ValueError(f"Input {name} needs the key of one of {arrays.files}")
+            array = arrays[key]
+    else:
+        array = np.loadtxt(source, **options)
+
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    temporary_file_name = file_name.with_name(f"{file_name.stem}.{os.getpid()}.tmp.npy")
+    np.save(temporary_file_name, array, allow_pickle=False)
+    os.replace(temporary_file_name, file_name)
+    return file_name
+
+
+def prepare_inputs(inputs, directory=None):
+    """
+    Convert all the inputs of the settings file.
+
+    Args:
+        inputs (dict): The ``inputs`` section of the settings file.
+        directory (str or Path, optional): Directory of the converted inputs. Defaults to
+            :func:`get_default_inputs_directory`.
+
+    Returns:
+        dict: The environment variables which give the runs the ``.npy`` file of every
+        input.
+
+    Raises:
+        ValueError: If an input is invalid.
+        OSError: If an input cannot be read or written.
+    """
+    # the runs may execute in their own working directories, so they get absolute paths
+    directory = Path(directory or get_default_inputs_directory()).absolute()
+    environment = {}
+    for name, settings in inputs.items():
+        if not name.isidentifier():
+            raise ValueError(f"The name of input {name} must be a valid identifier")
+        environment[get_input_variable(name)] = str(convert_input(name, settings, directory))
+    return environment
+
+
+def load_input(name):
+    """
+    Get a shared input in a script.
+
+    Args:
+        name (str): Name of the input in the settings file.
+
+    Returns:
+        numpy.ndarray: A read-only memory-mapped view of the input.
+
+    Raises:
+        KeyError: If the run has no input with this name.
+    """
+    file_name = os.environ.get(get_input_variable(name))
+    if file_name is None:
+        raise KeyError(f"No input {name}, it is not given in the inputs of the settings")
+    mapped = _mapped_inputs.get(name)
+    if mapped is None or mapped[0] != file_name:
+        import numpy as np
+
+        mapped = (file_name, np.load(file_name, mmap_mode="r", allow_pickle=False))
+        _mapped_inputs[name] = mapped
+    return mapped[1]
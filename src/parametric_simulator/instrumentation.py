@@ -0,0 +1,395 @@
+"""
+Measurement of the resources used by the runs, and a summary of the progress of a sweep.
+
+For every run the wall time, user and system CPU time, peak resident set size and number
+of bytes read and written are measured. Subprocesses are reaped with :func:`os.wait4`,
+which gives their resource usage, after their I/O counters have been read from ``/proc``.
+In-process runs are measured with :func:`resource.getrusage` and ``/proc/self``; their
+peak resident set size is reset before every run on Linux.
+
+Measurements which are not available on the platform are None.
+"""
+
+import logging
+import math
+import os
+import sys
+import time
+
+_logger = logging.getLogger(__name__)
+
+USAGE_FIELDS = ("wall_time", "user_time", "system_time", "peak_rss", "read_bytes", "write_bytes")
+
+# ru_maxrss is in kilobytes on Linux and in bytes on macOS
+MAXRSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+def read_io_counters(pid="self"):
+    """
+    Read the number of bytes read and written by a process from ``/proc``.
+
+    The counters include all reads and writes, also those served from the page cache.
+
+    Args:
+        pid (int or str): Process id, or ``self`` for the current process.
+
+    Returns:
+        tuple: The number of bytes read and written, or ``(None, None)`` if ``/proc`` is
+        not available.
+    """
+    counters = {}
+    try:
+        with open(f"/proc/{pid}/io") as stream:
+            for line in stream:
+                name, _, value = line.partition(":")
+                counters[name] = int(value)
+    except (OSError, ValueError):
+        return None, None
+    return counters.get("rchar"), counters.get("wchar")
+
+
+def read_peak_rss(pid="self"):
+    """
+    Read the peak resident set size of a process from ``/proc``.
+
+    Args:
+        pid (int or str): Process id, or ``self`` for the current process.
+
+    Returns:
+        int or None: The peak resident set size in bytes, or None if it is not available.
+    """
+    try:
+        with open(f"/proc/{pid}/status") as stream:
+            for line in stream:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def reset_peak_rss():
+    """
+    Reset the peak resident set size of the current process to its current size.
+
+    Returns:
+        bool: True if the peak was reset, which is only supported on Linux.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as stream:
+            stream.write("5")
+    except OSError:
+        return False
+    return True
+
+
+def get_exit_code(status):
+    """
+    Convert a wait status into an exit code, as :func:`os.waitstatus_to_exitcode`.
+
+    Args:
+        status (int): The status returned by :func:`os.wait4`.
+
+    Returns:
+        int: The exit code, or minus the signal number if the process was killed.
+    """
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def wait_for_process(process, start):
+    """
+    Wait for a subprocess to exit, reap it and measure its resource usage.
+
+    The process is first waited for without reaping it, so its I/O counters can still be
+    read from ``/proc``, and is then reaped with :func:`os.wait4`.
+
+    Args:
+        process (subprocess.Popen): The subprocess.
+        start (float): The :func:`time.perf_counter` at which the process was started.
+
+    Returns:
+        tuple: The exit code and a dict with the resource usage, see :data:`USAGE_FIELDS`.
+    """
+    read_bytes = write_bytes = None
+    if hasattr(os, "waitid"):
+        os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOWAIT)
+        read_bytes, write_bytes = read_io_counters(process.pid)
+    _, status, rusage = os.wait4(process.pid, 0)
+    wall_time = time.perf_counter() - start
+
+    # tell Popen that the process has been reaped
+    process.returncode = get_exit_code(status)
+    usage = {
+        "wall_time": wall_time,
+        "user_time": rusage.ru_utime,
+        "system_time": rusage.ru_stime,
+        "peak_rss": rusage.ru_maxrss * MAXRSS_UNIT,
+        "read_bytes": read_bytes,
+        "write_bytes": write_bytes,
+    }
+    return process.returncode, usage
+
+
+class InProcessUsage:
+    """
+    Measure the resource usage of a run in the current process.
+
+    Use it as a context manager around the run; the ``usage`` attribute holds the result.
+    """
+
+    def __init__(self):
+        self.usage = None
+
+    def __enter__(self):
+        import resource
+
+        self._resource = resource
+        self._peak_rss_reset = reset_peak_rss()
+        self._rusage = resource.getrusage(resource.RUSAGE_SELF)
+        self._io = read_io_counters()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        wall_time = time.perf_counter() - self._start
+        rusage = self._resource.getrusage(self._resource.RUSAGE_SELF)
+        read_bytes, write_bytes = read_io_counters()
+        self.usage = {
+            "wall_time": wall_time,
+            "user_time": rusage.ru_utime - self._rusage.ru_utime,
+            "system_time": rusage.ru_stime - self._rusage.ru_stime,
+            "peak_rss": read_peak_rss() if self._peak_rss_reset else None,
+            "read_bytes": None if read_bytes is None else read_bytes - self._io[0],
+            "write_bytes": None if write_bytes is None else write_bytes - self._io[1],
+        }
+        return False
+
+
+class DurationHistogram:
+    """
+    Histogram of run durations with logarithmic buckets, for percentiles in fixed memory.
+
+    Args:
+        minimum (float): Upper bound of the first bucket in seconds.
+        ratio (float): Ratio between the bounds of consecutive buckets, which is the
+            maximum relative error of the percentiles.
+    """
+
+    def __init__(self, minimum=1e-4, ratio=1.05):
+        self.minimum = minimum
+        self.log_ratio = math.log(ratio)
+        self.counts = {}
+        self.count = 0
+
+    def add(self, duration):
+        """Add a duration in seconds to the histogram."""
+        bucket = 0
+        if duration > self.minimum:
+            bucket = math.ceil(math.log(duration / self.minimum) / self.log_ratio)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+
+    def percentile(self, percentage):
+        """
+        Get a percentile of the durations.
+
+        Args:
+            percentage (float): The percentile, between 0 and 100.
+
+        Returns:
+            float or None: The upper bound of the bucket holding the percentile, or None if
+            the histogram is empty.
+        """
+        if not self.count:
+            return None
+        rank = max(math.ceil(percentage / 100 * self.count), 1)
+        total = 0
+        for bucket in sorted(self.counts):
+            total += self.counts[bucket]
+            if total >= rank:
+                return self.minimum * math.exp(bucket * self.log_ratio)
+        return None  # pragma: no cover
+
+
+class SweepMonitor:
+    """
+    Summary of the progress of a sweep, updated by the scheduler.
+
+    The counters are only changed by the thread of the scheduler. Other threads, such as
+    the progress endpoint, read them without a lock, so the scheduler is never held up; a
+    summary read while a run finishes may at worst be off by that run.
+
+    Args:
+        max_workers (int): Number of runs executed at the same time.
+        number_of_runs (int, optional): Total number of runs of the sweep.
+    """
+
+    def __init__(self, max_workers, number_of_runs=None):
+        self.max_workers = max_workers
+        self.number_of_runs = number_of_runs
+        self.start = time.monotonic()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.cached = 0
+        self.pruned = 0
+        self.duplicates = 0
+        self.checkpointed = 0
+        self.busy_time = 0.0
+        self.durations = DurationHistogram()
+        # the submission time and parameters of the unfinished runs, by index
+        self.active = {}
+        # the functions to call when the first run is handed to a worker
+        self.start_callbacks = []
+
+    def call_when_started(self, callback):
+        """
+        Call a function once the first run is handed to a worker.
+
+        The engines start their worker processes before they hand out the first run, so a
+        thread started by the callback is not running while the workers are forked.
+
+        Args:
+            callback (callable): Function without arguments.
+        """
+        self.start_callbacks.append(callback)
+
+    def run_submitted(self, run=None):
+        """
+        Count a run which was handed to a worker.
+
+        Args:
+            run (Run, optional): The run, to report it as active until it finishes.
+        """
+        if self.start_callbacks:
+            callbacks, self.start_callbacks = self.start_callbacks, []
+            for callback in callbacks:
+                callback()
+        self.submitted += 1
+        if run is not None:
+            self.active[run.index] = (time.monotonic(), run.parameters)
+
+    def run_checkpointed(self, run):
+        """
+        Count a run which saved a checkpoint and stopped, and is submitted again later.
+
+        Args:
+            run (Run): The run.
+        """
+        self.active.pop(run.index, None)
+        self.submitted -= 1
+        self.checkpointed += 1
+
+    def run_finished(self, result):
+        """
+        Count a finished run.
+
+        Args:
+            result (RunResult): The result of the run.
+        """
+        self.active.pop(result.index, None)
+        self.completed += 1
+        self.failed += not result.success and not result.pruned
+        self.pruned += result.pruned
+        if result.cached:
+            self.cached += 1
+            return
+        if result.duplicate_of is not None:
+            self.duplicates += 1
+            return
+        self.busy_time += result.wall_time
+        self.durations.add(result.wall_time)
+
+    @property
+    def in_flight(self):
+        """int: Number of submitted runs which have not finished."""
+        return self.submitted - (self.completed - self.cached - self.duplicates)
+
+    @property
+    def running(self):
+        """int: Number of runs which are executing."""
+        return min(self.in_flight, self.max_workers)
+
+    @property
+    def queue_depth(self):
+        """int: Number of submitted runs which wait for a free worker."""
+        return self.in_flight - self.running
+
+    def summary(self):
+        """
+        Get the current state of the sweep.
+
+        Returns:
+            dict: The counts of the runs, the throughput, the queue depth, the worker
+            utilization, the 50th, 95th and 99th percentile of the run durations and the
+            expected number of seconds until the sweep is finished, if it is known.
+        """
+        elapsed = max(time.monotonic() - self.start, 1e-9)
+        eta = None
+        if self.number_of_runs is not None and self.completed:
+            eta = max(self.number_of_runs - self.completed, 0) * elapsed / self.completed
+        return {
+            "elapsed": elapsed,
+            "completed": self.completed,
+            "failed": self.failed,
+            "cached": self.cached,
+            "pruned": self.pruned,
+            "duplicates": self.duplicates,
+            "checkpointed": self.checkpointed,
+            "running": self.running,
+            "queue_depth": self.queue_depth,
+            "runs_per_second": self.completed / elapsed,
+            "utilization": self.busy_time / (elapsed * self.max_workers),
+            "p50": self.durations.percentile(50),
+            "p95": self.durations.percentile(95),
+            "p99": self.durations.percentile(99),
+            "eta": eta,
+        }
+
+    def get_active_runs(self):
+        """
+        Get the unfinished runs, as the state of the workers.
+
+        The workers take the runs in the order in which they were submitted, so the
+        ``max_workers`` oldest runs are running and the others are queued.
+
+        Returns:
+            list: A dict with the ``index``, ``parameters``, ``state`` and the ``elapsed``
+            seconds since submission of every unfinished run, oldest first.
+        """
+        now = time.monotonic()
+        # copying the dict is atomic, so it can be read while the scheduler changes it
+        active = sorted(self.active.copy().items(), key=lambda item: item[1][0])
+        return [
+            {
+                "index": index,
+                "parameters": parameters,
+                "state": "running" if position < self.max_workers else "queued",
+                "elapsed": now - submitted,
+            }
+            for position, (index, (submitted, parameters)) in enumerate(active)
+        ]
+
+    def format_summary(self):
+        """
+        Get the current state of the sweep as a single line.
+
+        Returns:
+            str: The summary of the sweep.
+        """
+        summary = self.summary()
+        total = f"/{self.number_of_runs}" if self.number_of_runs is not None else ""
+        percentiles = " ".join(
+            f"{name}={summary[name]:.3g}s"
+            for name in ("p50", "p95", "p99")
+            if summary[name] is not None
+        )
+        return (
+            f"{summary['completed']}{total} runs done ({summary['failed']} failed, "
+            f"{summary['cached']} cached, {summary['pruned']} pruned), "
+            f"{summary['running']} running, "
+            f"{summary['queue_depth']} queued, {summary['runs_per_second']:.2f} runs/s, "
+            f"utilization {summary['utilization']:.0%} {percentiles}"
+        ).rstrip()
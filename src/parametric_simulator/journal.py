@@ -0,0 +1,252 @@
+"""
+Append-only journal of finished runs, used to resume an interrupted sweep.
+
+The journal is a binary file of fixed-size records. Each record holds the hash of the run,
+its status, the exit code, the wall time and the time at which the run finished. Records
+are buffered and written to disk with a single ``fsync`` per batch. A run which saved a
+checkpoint before it finished is recorded as checkpointed; its checkpoint is found from
+the hash of the run, see :mod:`~parametric_simulator.checkpoint`.
+
+When the journal is closed, an index file is written next to it with the sorted hashes of
+all successful runs. Opening a journal therefore only needs to map the index and read the
+records which were appended after the index was written, instead of scanning the whole
+journal. Looking up a run is a binary search in the mapped index.
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+
+_logger = logging.getLogger(__name__)
+
+MAGIC = b"PSJ1"
+INDEX_MAGIC = b"PSI1"
+
+HASH_SIZE = 16
+RECORD = struct.Struct(f"<{HASH_SIZE}sBidd")
+INDEX_HEADER = struct.Struct("<4sQQ")
+
+STATUS_SUCCESS = 1
+STATUS_FAILED = 2
+STATUS_CHECKPOINTED = 3
+
+
+def get_run_hash(script, arguments):
+    """
+    Get the hash identifying a run in the journal.
+
+    Args:
+        script (str or Path): The script of the run.
+        arguments (list): The command-line arguments of the run.
+
+    Returns:
+        bytes: A digest of ``HASH_SIZE`` bytes.
+    """
+    identity = json.dumps([str(script), [str(argument) for argument in arguments]])
+    return hashlib.blake2b(identity.encode(), digest_size=HASH_SIZE).digest()
+
+
+def get_index_file_name(file_name):
+    """
+    Get the name of the index file belonging to a journal.
+
+    Args:
+        file_name (str or Path): The journal file.
+
+    Returns:
+        Path: The index file, which is the journal file with ``.idx`` appended.
+    """
+    file_name = Path(file_name)
+    return file_name.with_name(file_name.name + ".idx")
+
+
+def remove_journal(file_name):
+    """
+    Remove a journal and its index, so a sweep starts from scratch.
+
+    Args:
+        file_name (str or Path): The journal file.
+    """
+    for journal_file_name in (Path(file_name), get_index_file_name(file_name)):
+        if journal_file_name.exists():
+            _logger.info(f"Removing {journal_file_name}")
+            journal_file_name.unlink()
+
+
+class RunJournal:
+    """
+    Journal of the finished runs of a sweep.
+
+    Args:
+        file_name (str or Path): The journal file. It is created if it does not exist.
+        sync_every (int): Number of records after which the buffer is written and synced.
+        sync_interval (float): Maximum time in seconds between two syncs of the buffer.
+    """
+
+    def __init__(self, file_name, sync_every=256, sync_interval=1.0):
+        self.file_name = Path(file_name)
+        self.index_file_name = get_index_file_name(self.file_name)
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+
+        self._index = None
+        self._index_count = 0
+        self._number_of_index_hashes = 0
+        self._recent = {}
+        self._buffer = []
+        self._last_sync = time.monotonic()
+
+        self.number_of_records = self._open_journal()
+        self._load_index()
+        self._read_records(start=self._index_count)
+
+    def _open_journal(self):
+        """Open the journal for appending and return the number of complete records."""
+        self.file_name.parent.mkdir(parents=True, exist_ok=True)
+        self._stream = open(self.file_name, "a+b")
+        self._stream.seek(0, os.SEEK_END)
+        size = self._stream.tell()
+        if size == 0:
+            self._stream.write(MAGIC)
+            self._stream.flush()
+            return 0
+
+        self._stream.seek(0)
+        if self._stream.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{self.file_name} is not a run journal")
+        number_of_records, remainder = divmod(size - len(MAGIC), RECORD.size)
+        if remainder:
+            # the last record was only partly written when the previous sweep was killed
+            _logger.warning(f"Dropping an incomplete record at the end of {self.file_name}")
+            self._stream.truncate(len(MAGIC) + number_of_records * RECORD.size)
+        self._stream.seek(0, os.SEEK_END)
+        return number_of_records
+
+    def _load_index(self):
+        """Map the index file, if it is consistent with the journal."""
+        try:
+            with open(self.index_file_name, "rb") as stream:
+                header = stream.read(INDEX_HEADER.size)
+                magic, count, number_of_hashes = INDEX_HEADER.unpack(header)
+                if magic != INDEX_MAGIC or count > self.number_of_records:
+                    raise ValueError("index does not match the journal")
+                if number_of_hashes:
+                    self._index = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+                self._index_count = count
+                self._number_of_index_hashes = number_of_hashes
+        except (FileNotFoundError, struct.error, ValueError) as err:
+            if self.index_file_name.exists():
+                _logger.warning(f"Ignoring index {self.index_file_name}: {err}")
+            self._index = None
+            self._index_count = 0
+            self._number_of_index_hashes = 0
+
+    def _read_records(self, start):
+        """Read the records from ``start`` onwards which are not covered by the index."""
+        if start >= self.number_of_records:
+            return
+        with open(self.file_name, "rb") as stream:
+            stream.seek(len(MAGIC) + start * RECORD.size)
+            data = stream.read((self.number_of_records - start) * RECORD.size)
+        for run_hash, status, _, _, _ in RECORD.iter_unpack(data):
+            self._recent[run_hash] = status
+        _logger.debug(f"Read {self.number_of_records - start} records from {self.file_name}")
+
+    def _in_index(self, run_hash):
+        """Binary search for a hash in the sorted index of successful runs."""
+        if self._index is None:
+            return False
+        low = 0
+        high = self._number_of_index_hashes
+        while low < high:
+            middle = (low + high) // 2
+            offset = INDEX_HEADER.size + middle * HASH_SIZE
+            value = self._index[offset : offset + HASH_SIZE]
+            if value < run_hash:
+                low = middle + 1
+            elif value > run_hash:
+                high = middle
+            else:
+                return True
+        return False
+
+    def is_done(self, run_hash):
+        """
+        Check if a run has already finished successfully.
+
+        Args:
+            run_hash (bytes): The hash of the run, see :func:`get_run_hash`.
+
+        Returns:
+            bool: True if the last record of the run has a successful status.
+        """
+        status = self._recent.get(run_hash)
+        if status is not None:
+            return status == STATUS_SUCCESS
+        return self._in_index(run_hash)
+
+    def record(self, run_hash, returncode, wall_time, checkpointed=False):
+        """
+        Append the result of a finished run to the journal.
+
+        Args:
+            run_hash (bytes): The hash of the run, see :func:`get_run_hash`.
+            returncode (int): The exit code of the run.
+            wall_time (float): The wall time of the run in seconds.
+            checkpointed (bool): Whether the run saved a checkpoint and stopped before it
+                finished.
+        """
+        if checkpointed:
+            status = STATUS_CHECKPOINTED
+        else:
+            status = STATUS_SUCCESS if returncode == 0 else STATUS_FAILED
+        self._buffer.append(RECORD.pack(run_hash, status, returncode, wall_time, time.time()))
+        self._recent[run_hash] = status
+        self.number_of_records += 1
+        if (
+            len(self._buffer) >= self.sync_every
+            or time.monotonic() - self._last_sync >= self.sync_interval
+        ):
+            self.sync()
+
+    def sync(self):
+        """Write the buffered records to the journal and sync them to disk."""
+        if self._buffer:
+            self._stream.write(b"".join(self._buffer))
+            self._stream.flush()
+            os.fsync(self._stream.fileno())
+            self._buffer = []
+        self._last_sync = time.monotonic()
+
+    def write_index(self):
+        """Write the sorted hashes of all successful runs to the index file."""
+        hashes = {run_hash for run_hash, status in self._recent.items() if status == STATUS_SUCCESS}
+        if self._index is not None:
+            data = self._index[INDEX_HEADER.size :]
+            for offset in range(0, len(data), HASH_SIZE):
+                run_hash = data[offset : offset + HASH_SIZE]
+                if run_hash not in self._recent:
+                    hashes.add(run_hash)
+        hashes = sorted(hashes)
+
+        temporary_file_name = self.index_file_name.with_name(self.index_file_name.name + ".tmp")
+        with open(temporary_file_name, "wb") as stream:
+            stream.write(INDEX_HEADER.pack(INDEX_MAGIC, self.number_of_records, len(hashes)))
+            stream.write(b"".join(hashes))
+            stream.flush()
+            os.fsync(stream.fileno())
+        os.replace(temporary_file_name, self.index_file_name)
+
+    def close(self):
+        """Sync the journal, update the index and close the files."""
+        self.sync()
+        self._stream.close()
+        self.write_index()
+        if self._index is not None:
+            self._index.close()
+            self._index = None
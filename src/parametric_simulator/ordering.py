@@ -0,0 +1,273 @@
+"""
+Ordering of the runs of a sweep by their expected duration, longest first.
+
+When the durations of the runs differ a lot, executing them in the order of the sweep
+often leaves a few long runs at the end, while the other workers are idle. Starting the
+longest runs first and filling the gaps with the short runs shortens the total time of
+the sweep.
+
+The expected duration of a run comes from a ``cost`` expression of its parameters, see
+:mod:`~parametric_simulator.expressions`, or from a model fitted to the wall times of
+the runs in the results store of a previous sweep. The cost only has to be proportional
+to the duration. In the settings file::
+
+    schedule:
+      order: longest_first
+      cost: sleep * UNITS[units]
+      constants:
+        UNITS: {s: 1, m: 60, h: 3600}
+      window: 1000
+
+The runs are still generated lazily: they are sorted within a sliding window of
+``window`` runs, so the memory use stays bounded for sweeps of any size. The first run
+only starts once the window is filled, so the window is small by default:
+:data:`WINDOW_PER_WORKER` runs for every worker. This is enough to start the long runs
+early, as a worker takes a new run whenever one finishes.
+"""
+
+import heapq
+import logging
+import math
+
+from parametric_simulator.expressions import compile_expression, evaluate_expression
+
+_logger = logging.getLogger(__name__)
+
+ORDERS = ("fifo", "longest_first")
+
+# the default number of runs per worker which are sorted at a time
+WINDOW_PER_WORKER = 100
+
+
+class ExpressionCost:
+    """
+    Expected cost of a run given by an expression of its parameters.
+
+    Args:
+        expression (str): The expression.
+        constants (dict, optional): Extra names which can be used in the expression.
+    """
+
+    def __init__(self, expression, constants=None):
+        self.expression = compile_expression(expression)
+        self.constants = dict(constants or {})
+
+    def __call__(self, parameters):
+        """
+        Get the expected cost of a run.
+
+        Args:
+            parameters (dict): The parameters of the run.
+
+        Returns:
+            float or None: The cost, or None if the expression cannot be evaluated.
+        """
+        try:
+            return float(evaluate_expression(self.expression, {**self.constants, **parameters}))
+        except (ValueError, TypeError, ArithmeticError) as err:
+            _logger.debug(f"Could not evaluate the cost of {parameters}: {err}")
+            return None
+
+
+def solve_least_squares(rows, targets, ridge=1e-9):
+    """
+    Solve a small linear least squares problem with the normal equations.
+
+    Args:
+        rows (list): The rows of the design matrix.
+        targets (list): The target of every row.
+        ridge (float): Regularization, relative to the diagonal, which keeps the solution
+            unique when features are collinear.
+
+    Returns:
+        list: The coefficients.
+    """
+    size = len(rows[0])
+    matrix = [[0.0] * (size + 1) for _ in range(size)]
+    for row, target in zip(rows, targets):
+        for i in range(size):
+            for j in range(size):
+                matrix[i][j] += row[i] * row[j]
+            matrix[i][size] += row[i] * target
+    for i in range(size):
+        matrix[i][i] += ridge * (matrix[i][i] or 1.0)
+
+    # Gauss-Jordan elimination with partial pivoting
+    for column in range(size):
+        pivot = max(range(column, size), key=lambda i: abs(matrix[i][column]))
+        matrix[column], matrix[pivot] = matrix[pivot], matrix[column]
+        for i in range(size):
+            if i != column and matrix[column][column]:
+                factor = matrix[i][column] / matrix[column][column]
+                for j in range(column, size + 1):
+                    matrix[i][j] -= factor * matrix[column][j]
+    return [matrix[i][size] / matrix[i][i] if matrix[i][i] else 0.0 for i in range(size)]
+
+
+class DurationModel:
+    """
+    Log-linear model of the duration of a run as a function of its parameters.
+
+    The logarithm of the duration is fitted as a linear function of the logarithm of every
+    positive numeric parameter, every other numeric parameter, and an indicator of every
+    value of the string parameters. This captures durations which scale with a power of
+    the parameters, such as ``n ** 3``.
+
+    Args:
+        parameter_names (list): Names of the parameters of the model.
+    """
+
+    def __init__(self, parameter_names):
+        self.parameter_names = list(parameter_names)
+        self.features = []
+        self.coefficients = []
+
+    def get_features(self, parameters):
+        """
+        Get the feature vector of a run.
+
+        Args:
+            parameters (dict): The parameters of the run.
+
+        Returns:
+            list or None: The features, or None if a numeric parameter is not a number.
+        """
+        features = [1.0]
+        for name, kind, level in self.features:
+            value = parameters.get(name)
+            if kind == "category":
+                features.append(1.0 if str(value) == level else 0.0)
+                continue
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                return None
+            if kind == "log":
+                if value <= 0:
+                    return None
+                value = math.log(value)
+            features.append(value)
+        return features
+
+    def fit(self, parameter_sets, durations):
+        """
+        Fit the model to the durations of finished runs.
+
+        Args:
+            parameter_sets (list): The parameters of every finished run.
+            durations (list): The wall time of every finished run in seconds.
+
+        Returns:
+            bool: True if the model was fitted, False if there are fewer usable runs than
+            coefficients.
+        """
+        self.features = []
+        for name in self.parameter_names:
+            values = [parameters.get(name) for parameters in parameter_sets]
+            if all(isinstance(value, (int, float)) for value in values):
+                kind = "log" if all(value > 0 for value in values) else "linear"
+                self.features.append((name, kind, None))
+            else:
+                levels = sorted({str(value) for value in values})
+                # the first level is part of the constant
+                self.features.extend((name, "category", level) for level in levels[1:])
+
+        rows = []
+        targets = []
+        for parameters, duration in zip(parameter_sets, durations):
+            features = self.get_features(parameters)
+            if features is not None and duration > 0:
+                rows.append(features)
+                targets.append(math.log(duration))
+        if len(rows) < len(self.features) + 1:
+            return False
+        self.coefficients = solve_least_squares(rows, targets)
+        return True
+
+    def __call__(self, parameters):
+        """
+        Predict the duration of a run.
+
+        Args:
+            parameters (dict): The parameters of the run.
+
+        Returns:
+            float or None: The expected duration in seconds, or None if the model is not
+            fitted or the run cannot be predicted.
+        """
+        if not self.coefficients:
+            return None
+        features = self.get_features(parameters)
+        if features is None:
+            return None
+        exponent = sum(c * f for c, f in zip(self.coefficients, features))
+        return math.exp(min(exponent, 700.0))
+
+
+def fit_duration_model(columns, parameter_names):
+    """
+    Fit a duration model to the successful, executed runs of a results store.
+
+    Args:
+        columns (dict): The columns of the store, as returned by
+            :func:`~parametric_simulator.results.load_results`.
+        parameter_names (list): Names of the parameters of the sweep.
+
+    Returns:
+        DurationModel or None: The fitted model, or None if the store does not have the
+        parameters or not enough runs.
+    """
+    names = [name for name in parameter_names if name in columns]
+    if not names or "wall_time" not in columns:
+        return None
+    parameter_sets = []
+    durations = []
+    for row in range(len(columns["wall_time"])):
+        if columns.get("returncode") is not None and columns["returncode"][row] != 0:
+            continue
+        if columns.get("cached") is not None and columns["cached"][row] == 1:
+            continue
+        parameters = {}
+        for name in names:
+            value = columns[name][row]
+            if hasattr(value, "item"):
+                value = value.item()
+            if isinstance(value, float) and math.isnan(value):
+                value = None
+            parameters[name] = value
+        parameter_sets.append(parameters)
+        durations.append(float(columns["wall_time"][row]))
+
+    model = DurationModel(names)
+    if not model.fit(parameter_sets, durations):
+        return None
+    _logger.info(f"Fitted a duration model to {len(durations)} runs of {names}")
+    return model
+
+
+def order_runs(runs, cost, window=WINDOW_PER_WORKER):
+    """
+    Reorder runs so the most expensive runs come first.
+
+    Runs are sorted within a sliding window: the window is filled with the first
+    ``window`` runs, and every time the most expensive run in the window is yielded, the
+    next run of the sweep enters the window. Runs of which the cost is unknown come
+    first, and runs with equal cost keep their order.
+
+    Args:
+        runs (iterable): The :class:`~parametric_simulator.sweep.Run` objects.
+        cost (callable): Gives the expected cost of a run from its parameters, or None.
+        window (int): Maximum number of runs which are held to be sorted.
+
+    Yields:
+        Run: The runs, longest expected first.
+    """
+    heap = []
+    for run in runs:
+        expected = cost(run.parameters)
+        key = -math.inf if expected is None else -expected
+        heapq.heappush(heap, (key, run.index, run))
+        if len(heap) >= window:
+            yield heapq.heappop(heap)[2]
+    while heap:
+        yield heapq.heappop(heap)[2]
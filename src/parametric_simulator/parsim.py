@@ -1,15 +1,19 @@
 """
 A simple Python script to run a script with a set of parameters.
+
+The command-line tool is started thousands of times from shell loops and job arrays, so
+only light modules are imported at module level. The argument parser, the settings
+resolution and the execution engines are imported in the functions which use them.
 """
 
+import functools
 import logging
+import os
 import sys
+import time
 from pathlib import Path
 
-import jsonargparse
-import yaml
-
-from parametric_simulator import __version__
+import parametric_simulator
 
 __author__ = "Eelco van Vliet"
 __copyright__ = "Eelco van Vliet"
@@ -19,24 +23,49 @@ _logger = logging.getLogger(__name__)
 
 CONFDIR = Path(__file__).parent / Path("conf")
 
+# seconds between the progress summaries which are logged during a sweep
+SUMMARY_INTERVAL = 10.0
 
-def parse_args():
+
+def parse_args(argv=None):
     """
     Parse command-line arguments for the ParametricSimulator script.
 
+    Args:
+        argv (List[str], optional): Command-line arguments. Defaults to ``sys.argv[1:]``.
+
     Returns:
         argparse.Namespace: Parsed command-line arguments containing:
             - 'version': Display the current version of ParametricSimulator.
             - 'script': Path to the script to execute, or obtained from settings if not provided.
             - 'settings_file': Path to the settings file with processing information.
+            - 'overrides': Overrides of the settings in the syntax of Hydra.
+            - 'max_workers': Number of runs to execute in parallel, or obtained from settings.
+            - 'execution_mode': Run the script in a subprocess, in-process or vectorized.
+            - 'restart': Ignore the journal of a previous sweep.
+            - 'serve': Address on which the runs are handed out to remote workers.
+            - 'worker': Address of the coordinator for which to execute runs.
+            - 'progress': Show the progress on the terminal.
+            - 'progress_address': Address on which the progress is served over HTTP.
             - 'loglevel': Logging level, set to INFO with '-v' or DEBUG with '-vv', defaults to
             WARN.
     """
+    if argv is None:
+        argv = sys.argv[1:]
+    if "--version" in argv:
+        # answer without importing the argument parser
+        print(f"ParametricSimulator {parametric_simulator.__version__}")
+        sys.exit(0)
+
+    import jsonargparse
+
+    from parametric_simulator.constants import EXECUTION_MODES
+
     parser = jsonargparse.ArgumentParser(description="A simple script to process data.")
     parser.add_argument(
         "--version",
         action="version",
-        version=f"ParametricSimulator {__version__}",
+        version=f"ParametricSimulator {parametric_simulator.__version__}",
     )
     parser.add_argument(
         "--script",
@@ -47,6 +76,59 @@ def parse_args():
         "--settings_file",
         help="The settings file containing with all the processing information",
     )
+    parser.add_argument(
+        "overrides",
+        nargs="*",
+        default=[],
+        help="Overrides of the settings in the syntax of Hydra, e.g. general.max_workers=8. "
+        "An override with sweep syntax, e.g. seed=1,2,3, sets the values of a rule.",
+    )
+    parser.add_argument(
+        "--max_workers",
+        type=int,
+        help="Number of runs to execute in parallel. If not given, the value from the "
+        "settings file is used, which defaults to the number of CPU cores.",
+    )
+    parser.add_argument(
+        "--execution_mode",
+        choices=EXECUTION_MODES,
+        help="How to execute the runs: 'subprocess' starts a new process for every run, "
+        "'in_process' calls the main(argv) function of a Python script in long-lived "
+        "workers, 'auto' uses 'in_process' if the script has a main function, "
+        "'asyncio' starts all subprocesses from a single event loop, and 'vectorized' "
+        "calls the main_batch(parameters) function of a Python script once for every "
+        "block of runs. If not given, the value from the settings file is used, which "
+        "defaults to 'subprocess'.",
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Discard the journal of a previous sweep with the same settings file and "
+        "execute all runs again",
+    )
+    parser.add_argument(
+        "--serve",
+        metavar="HOST:PORT",
+        help="Do not execute the runs locally, but hand them out to the workers which "
+        "connect to this address",
+    )
+    parser.add_argument(
+        "--worker",
+        metavar="HOST:PORT",
+        help="Execute the runs handed out by the coordinator at this address, with "
+        "--max_workers runs at the same time, until the sweep is finished",
+    )
+    parser.add_argument(
+        "--progress",
+        action="store_true",
+        help="Show the progress of the sweep and the running runs on the terminal",
+    )
+    parser.add_argument(
+        "--progress_address",
+        metavar="ADDRESS",
+        help="Serve the progress of the sweep over HTTP on HOST:PORT, or on a Unix socket "
+        "with unix:PATH",
+    )
     parser.add_argument(
         "-v",
         "--verbose",
@@ -63,7 +145,7 @@ def parse_args():
         action="store_const",
         const=logging.DEBUG,
     )
-    parsed_arguments = parser.parse_args()
+    parsed_arguments = parser.parse_args(args=argv)
     parsed_arguments.loglevel = parsed_arguments.loglevel or logging.WARN
     return parsed_arguments
 
@@ -83,24 +165,480 @@ def setup_logging(loglevel):
     )
 
 
-def main():
-    args = parse_args()
+def get_journal_file_name(settings_file, general_settings):
+    """
+    Get the name of the journal file of a sweep.
+
+    Args:
+        settings_file (str): The settings file of the sweep.
+        general_settings (dict): The general section of the settings file.
+
+    Returns:
+        Path: The ``journal_file`` from the general settings, or else the settings file with
+        the suffix replaced by ``.journal``.
+    """
+    journal_file = general_settings.get("journal_file")
+    if journal_file is not None:
+        return Path(journal_file)
+    return Path(settings_file).with_suffix(".journal")
+
+
+def order_sweep(runs, rules, schedule_settings, results_directory=None, max_workers=1):
+    """
+    Apply the ``schedule`` section of the settings file to the runs of the sweep.
+
+    With ``order: longest_first``, the runs are ordered by the ``cost`` expression, or,
+    without an expression, by a duration model fitted to the results of previous runs.
+
+    Args:
+        runs (iterable): The runs of the sweep.
+        rules (dict or None): The ``rules`` section of the settings file.
+        schedule_settings (dict): The ``schedule`` section of the settings file.
+        results_directory (str, optional): The results store of the sweep.
+        max_workers (int): Number of runs executed at the same time, which sets the size
+            of the window in which the runs are sorted, unless the settings give it.
+
+    Returns:
+        iterable: The runs in the order in which they are started.
+
+    Raises:
+        ValueError: If the schedule settings are invalid.
+    """
+    from parametric_simulator.ordering import (
+        ORDERS,
+        WINDOW_PER_WORKER,
+        ExpressionCost,
+        fit_duration_model,
+        order_runs,
+    )
+
+    order = schedule_settings.get("order") or "fifo"
+    if order not in ORDERS:
+        raise ValueError(f"The schedule order must be one of {ORDERS}: {order}")
+    if order == "fifo":
+        return runs
+
+    if schedule_settings.get("cost") is not None:
+        cost = ExpressionCost(schedule_settings["cost"], schedule_settings.get("constants"))
+    else:
+        from parametric_simulator.results import METADATA_FILE_NAME, load_results
+        from parametric_simulator.sweep import get_parameter_names
+
+        cost = None
+        if (
+            results_directory is not None
+            and (Path(results_directory) / METADATA_FILE_NAME).exists()
+        ):
+            cost = fit_duration_model(load_results(results_directory), get_parameter_names(rules))
+        if cost is None:
+            _logger.warning("No cost expression and no previous results, keeping the order")
+            return runs
+    _logger.info("Starting the runs with the longest expected duration first")
+    window = schedule_settings.get("window") or WINDOW_PER_WORKER * max_workers
+    return order_runs(runs, cost, window)
+
+
+def main(argv=None):
+    """
+    Run the parameter sweep described by the settings file.
+
+    The rules of the settings file are expanded lazily into all parameter combinations, and
+    the script is executed once for every combination on a pool of worker processes.
+
+    The finished runs are recorded in a journal next to the settings file. When the same
+    settings file is used again, only the runs which are missing or failed are executed.
+
+    Args:
+        argv (List[str], optional): Command-line arguments. Defaults to ``sys.argv[1:]``.
+    """
+    args = parse_args(argv)
     setup_logging(args.loglevel)
 
-    general_settings = None
+    if args.worker is not None:
+        from parametric_simulator.distributed import parse_address, run_worker
+
+        if not run_worker(parse_address(args.worker, "127.0.0.1"), args.max_workers):
+            sys.exit(1)
+        return
+
+    from parametric_simulator.admission import MemoryAdmission
+    from parametric_simulator.async_executor import run_sweep_async
+    from parametric_simulator.batching import BatchSizer
+    from parametric_simulator.cache import ResultCache
+    from parametric_simulator.checkpoint import Checkpointer
+    from parametric_simulator.dedup import Deduplicator
+    from parametric_simulator.executor import (
+        get_default_max_workers,
+        run_sweep,
+        use_in_process,
+    )
+    from parametric_simulator.inputs import prepare_inputs
+    from parametric_simulator.instrumentation import SweepMonitor
+    from parametric_simulator.journal import RunJournal, remove_journal
+    from parametric_simulator.progress import ProgressServer, TerminalProgress
+    from parametric_simulator.pruning import Pruner
+    from parametric_simulator.reduction import ReductionPipeline
+    from parametric_simulator.results import ResultsStore
+    from parametric_simulator.sampling import AdaptiveSampler, iter_rounds
+    from parametric_simulator.settings import load_settings
+    from parametric_simulator.staging import Stager
+    from parametric_simulator.sweep import count_runs, iter_runs
+    from parametric_simulator.vectorized import run_sweep_vectorized
+
+    settings = {}
+    general_settings = {}
 
+    if args.overrides and args.settings_file is None:
+        _logger.error("Overrides need a settings file. Exiting.")
+        sys.exit(1)
     if args.settings_file is not None:
         _logger.info(f"Reading settings file: {args.settings_file}")
-        with open(args.settings_file) as stream:
-            settings = yaml.safe_load(stream)
         try:
-            general_settings = settings["general"]
+            settings = load_settings(args.settings_file, args.overrides)
+        except ValueError as err:
+            _logger.error(f"{err}. Exiting.")
+            sys.exit(1)
+        try:
+            general_settings = settings["general"] or {}
         except KeyError as err:
             _logger.error(f"KeyError: {err}")
             _logger.error("Could not find 'general' in settings file. Exiting.")
             sys.exit(1)
 
-    print(general_settings)
+    script = args.script or general_settings.get("script_name")
+    if script is None:
+        _logger.error("No script given on the command line or in the settings file. Exiting.")
+        sys.exit(1)
+
+    max_workers = (
+        args.max_workers or general_settings.get("max_workers") or get_default_max_workers()
+    )
+
+    execution_mode = args.execution_mode or general_settings.get("execution_mode") or "subprocess"
+    try:
+        in_process = use_in_process(script, execution_mode)
+    except ValueError as err:
+        _logger.error(f"{err}. Exiting.")
+        sys.exit(1)
+
+    rules = settings.get("rules")
+    sampler = None
+    sampling_settings = settings.get("sampling") or {}
+    if (sampling_settings.get("strategy") or "grid") != "grid":
+        sampling_settings = {
+            name: value for name, value in sampling_settings.items() if value is not None
+        }
+        sampling_settings.setdefault("batch", max_workers)
+        try:
+            sampler = AdaptiveSampler(
+                rules, default_args=general_settings.get("default_args"), **sampling_settings
+            )
+        except (TypeError, ValueError) as err:
+            _logger.error(f"Invalid sampling settings: {err}. Exiting.")
+            sys.exit(1)
+        runs = None
+        total_number_of_runs = sampler.budget
+        _logger.info(f"Starting at most {total_number_of_runs} adaptively sampled runs of {script}")
+    else:
+        runs = iter_runs(rules, general_settings.get("default_args"))
+        total_number_of_runs = count_runs(rules)
+        _logger.info(f"Starting {total_number_of_runs} runs of {script}")
+
+    cache = None
+    cache_settings = settings.get("cache") or {}
+    if cache_settings.get("directory") is not None:
+        _logger.info(f"Using result cache in {cache_settings['directory']}")
+        cache = ResultCache(**cache_settings)
+
+    journal = None
+    if args.settings_file is not None:
+        journal_file_name = get_journal_file_name(args.settings_file, general_settings)
+        if args.restart:
+            remove_journal(journal_file_name)
+        _logger.info(f"Recording finished runs in {journal_file_name}")
+        journal = RunJournal(journal_file_name)
+
+    paths = settings.get("paths") or {}
+    try:
+        if sampler is None:
+            runs = order_sweep(
+                runs, rules, settings.get("schedule") or {}, paths.get("results"), max_workers
+            )
+    except ValueError as err:
+        _logger.error(f"{err}. Exiting.")
+        sys.exit(1)
+
+    inputs = settings.get("inputs") or {}
+    if inputs:
+        _logger.info(f"Preparing the shared inputs {sorted(inputs)}")
+        try:
+            input_environment = prepare_inputs(inputs, paths.get("inputs"))
+        except (OSError, ValueError) as err:
+            _logger.error(f"Invalid input: {err}. Exiting.")
+            sys.exit(1)
+        # the runs and the workers inherit the environment of this process
+        os.environ.update(input_environment)
+        if args.serve is not None:
+            _logger.warning("Remote workers must see the shared inputs at the same paths")
+
+    results_store = None
+    if paths.get("results") is not None:
+        _logger.info(f"Storing the results in {paths['results']}")
+        results_store = ResultsStore(paths["results"])
+
+    admission = None
+    memory_settings = settings.get("memory") or {}
+    if memory_settings.get("budget") is not None:
+        _logger.info(f"Limiting the estimated memory of the runs to {memory_settings['budget']}")
+        try:
+            admission = MemoryAdmission(**memory_settings, max_workers=max_workers)
+        except ValueError as err:
+            _logger.error(f"{err}. Exiting.")
+            sys.exit(1)
+
+    pruner = None
+    pruning_settings = settings.get("pruning") or {}
+    if pruning_settings.get("metric") is not None:
+        if paths.get("reports") is None:
+            _logger.error("Pruning needs a reports directory in the paths section. Exiting.")
+            sys.exit(1)
+        pruning_settings = {
+            name: value for name, value in pruning_settings.items() if value is not None
+        }
+        try:
+            pruner = Pruner(**pruning_settings)
+        except (TypeError, ValueError) as err:
+            _logger.error(f"Invalid pruning settings: {err}. Exiting.")
+            sys.exit(1)
+        _logger.info(f"Pruning runs with the {pruner.rule} rule on {pruner.metric}")
+
+    stager = None
+    staging_settings = settings.get("staging") or {}
+    if staging_settings.get("template") is not None:
+        if args.serve is not None:
+            _logger.error("Run directories cannot be staged for remote workers. Exiting.")
+            sys.exit(1)
+        staging_settings = {
+            name: value for name, value in staging_settings.items() if value is not None
+        }
+        staging_settings.setdefault("directory", "runs")
+        _logger.info(
+            f"Staging the run directories in {staging_settings['directory']} from "
+            f"{staging_settings['template']}"
+        )
+        try:
+            stager = Stager(**staging_settings)
+        except (TypeError, ValueError) as err:
+            _logger.error(f"Invalid staging settings: {err}. Exiting.")
+            sys.exit(1)
+
+    checkpointer = None
+    checkpoint_settings = settings.get("checkpoint") or {}
+    if checkpoint_settings.get("directory") is not None:
+        checkpoint_settings = {
+            name: value for name, value in checkpoint_settings.items() if value is not None
+        }
+        if checkpoint_settings.get("max_duration") is not None and paths.get("reports") is None:
+            _logger.error("Preempting long runs needs a reports directory in the paths. Exiting.")
+            sys.exit(1)
+        _logger.info(f"Keeping the checkpoints of the runs in {checkpoint_settings['directory']}")
+        try:
+            checkpointer = Checkpointer(**checkpoint_settings)
+        except (TypeError, ValueError, OSError) as err:
+            _logger.error(f"Invalid checkpoint settings: {err}. Exiting.")
+            sys.exit(1)
+
+    monitor = SweepMonitor(max_workers, total_number_of_runs)
+    sweep_arguments = dict(
+        max_workers=max_workers,
+        monitor=monitor,
+        admission=admission,
+        pruner=pruner,
+        stager=stager,
+        checkpointer=checkpointer,
+        cache=cache,
+        journal=journal,
+        log_directory=paths.get("logs"),
+        reports_directory=paths.get("reports"),
+    )
+    batch_duration = general_settings.get("batch_duration")
+    coordinator = None
+    if args.serve is not None:
+        from parametric_simulator.distributed import Coordinator, parse_address
+
+        if execution_mode == "vectorized":
+            _logger.error("Vectorized runs cannot be handed out to remote workers. Exiting.")
+            sys.exit(1)
+        if admission is not None or batch_duration is not None:
+            _logger.warning("Memory budgets and batches are not used for remote workers")
+        coordinator = Coordinator(parse_address(args.serve))
+        run_round = functools.partial(
+            coordinator.run_sweep,
+            script,
+            cache=cache,
+            journal=journal,
+            in_process=in_process,
+            log_directory=paths.get("logs"),
+            reports_directory=paths.get("reports"),
+            monitor=monitor,
+            pruner=pruner,
+            checkpointer=checkpointer,
+        )
+    elif execution_mode == "vectorized":
+        unused = [
+            name
+            for name, value in (
+                ("memory budgets", admission),
+                ("batches", batch_duration),
+                ("pruning", pruner),
+                ("staging", stager),
+                ("checkpoints", checkpointer),
+            )
+            if value is not None
+        ]
+        if unused:
+            _logger.warning(f"Not used for vectorized runs: {', '.join(unused)}")
+        run_round = functools.partial(
+            run_sweep_vectorized,
+            script,
+            max_workers=max_workers,
+            block_size=general_settings.get("block_size"),
+            cache=cache,
+            journal=journal,
+            monitor=monitor,
+        )
+    elif execution_mode == "asyncio":
+        if batch_duration is not None:
+            _logger.warning("The asyncio engine does not send runs in batches")
+        run_round = functools.partial(run_sweep_async, script, **sweep_arguments)
+    else:
+        batch_sizer = None
+        if batch_duration is not None:
+            if admission is not None:
+                _logger.warning("Runs are not sent in batches when a memory budget is set")
+            _logger.info(f"Sending runs in batches of about {batch_duration} s")
+            batch_sizer = BatchSizer(target_duration=float(batch_duration))
+        run_round = functools.partial(
+            run_sweep, script, in_process=in_process, batch_sizer=batch_sizer, **sweep_arguments
+        )
+
+    pipeline = None
+    reduce_settings = settings.get("reduce") or {}
+    if reduce_settings.get("reducers"):
+        if stager is not None and stager.cleanup != "keep":
+            _logger.error(
+                "The run directories are cleaned up before they are reduced; set the cleanup "
+                "of the staging to keep and the raw outputs of the reduction instead. Exiting."
+            )
+            sys.exit(1)
+        reduce_settings = {
+            name: value for name, value in reduce_settings.items() if value is not None
+        }
+        _logger.info(f"Reducing the outputs of the runs with {sorted(reduce_settings['reducers'])}")
+        try:
+            pipeline = ReductionPipeline(
+                **reduce_settings,
+                log_directory=paths.get("logs"),
+                reports_directory=paths.get("reports"),
+                stager=stager,
+                script=script,
+                cache=cache,
+                journal=journal,
+            )
+        except (TypeError, ValueError) as err:
+            _logger.error(f"Invalid reduce settings: {err}. Exiting.")
+            sys.exit(1)
+        run_round = functools.partial(pipeline.run, run_round)
+
+    dedup_settings = settings.get("dedup") or {}
+    if dedup_settings.get("normalize") is not None or dedup_settings.get("tolerance") is not None:
+        _logger.info("Executing only one run of every group of equivalent runs")
+        try:
+            deduplicator = Deduplicator(
+                **dedup_settings, monitor=monitor, script=script, cache=cache
+            )
+        except (TypeError, ValueError) as err:
+            _logger.error(f"Invalid dedup settings: {err}. Exiting.")
+            sys.exit(1)
+        run_round = functools.partial(deduplicator.run, run_round)
+
+    progress_server = None
+    progress_view = None
+    progress_settings = settings.get("progress") or {}
+    progress_address = args.progress_address or progress_settings.get("address")
+    if progress_address is not None:
+        try:
+            progress_server = ProgressServer(monitor, str(progress_address))
+        except (OSError, ValueError) as err:
+            _logger.error(f"Cannot serve the progress on {progress_address}: {err}. Exiting.")
+            sys.exit(1)
+        _logger.info(f"Serving the progress on {progress_server.address}")
+    if args.progress or progress_settings.get("terminal"):
+        progress_view = TerminalProgress(monitor, interval=progress_settings.get("interval") or 1.0)
+    # the threads start once the worker processes are forked, so the workers do not copy them
+    for progress in (progress_server, progress_view):
+        if progress is not None:
+            monitor.call_when_started(progress.start)
+
+    previous_sigterm_handler = None
+    if checkpointer is not None:
+        import signal
+
+        # a batch system which preempts the sweep signals the runs too, which checkpoint
+        previous_sigterm_handler = signal.signal(
+            signal.SIGTERM, lambda signum, frame: checkpointer.preempt()
+        )
+
+    if sampler is None:
+        results = run_round(runs)
+    else:
+        results = iter_rounds(sampler, run_round, cache=cache, script=script)
+
+    number_of_runs = 0
+    number_of_failures = 0
+    number_of_cached_runs = 0
+    number_of_duplicates = 0
+    next_summary = time.monotonic() + SUMMARY_INTERVAL
+    try:
+        for result in results:
+            if progress_view is None and time.monotonic() >= next_summary:
+                _logger.info(monitor.format_summary())
+                next_summary = time.monotonic() + SUMMARY_INTERVAL
+            number_of_runs += 1
+            number_of_failures += not result.success and not result.pruned
+            number_of_cached_runs += result.cached
+            number_of_duplicates += result.duplicate_of is not None
+            if results_store is not None:
+                results_store.append(result.to_row())
+    finally:
+        if previous_sigterm_handler is not None:
+            signal.signal(signal.SIGTERM, previous_sigterm_handler)
+        if progress_view is not None:
+            progress_view.close()
+        if progress_server is not None:
+            progress_server.close()
+        if pipeline is not None:
+            pipeline.close()
+        if coordinator is not None:
+            coordinator.close()
+        if stager is not None:
+            stager.close()
+        if results_store is not None:
+            results_store.close()
+        if journal is not None:
+            journal.close()
+        if cache is not None:
+            cache.close()
+
+    _logger.info(monitor.format_summary())
+    _logger.info(
+        f"Finished {number_of_runs} runs, {number_of_cached_runs} from cache, "
+        f"{number_of_duplicates} duplicates, {number_of_failures} failed"
+    )
+    if checkpointer is not None and checkpointer.draining:
+        _logger.warning("The sweep was preempted; run it again to resume the checkpointed runs")
+    if number_of_failures:
+        sys.exit(1)
 
 
 def run():
@@ -0,0 +1,268 @@
+"""
+Live progress of a running sweep, on a local HTTP endpoint and in the terminal.
+
+The progress is read from the :class:`~parametric_simulator.instrumentation.SweepMonitor`
+which the scheduler updates. The endpoint and the terminal view run in their own threads
+and read the counters without a lock, so watching a sweep never holds up the dispatch of
+the runs. In the settings file::
+
+    progress:
+      address: 127.0.0.1:8765
+      terminal: true
+      interval: 1.0
+
+or on the command line with ``--progress`` and ``--progress_address``. The address is
+either ``HOST:PORT`` or ``unix:PATH`` for a Unix socket, which only the user can reach::
+
+    curl http://127.0.0.1:8765/
+    curl --unix-socket /tmp/sweep.sock http://localhost/metrics
+
+``/`` gives the counts of the runs, the throughput, the ETA and the state of every
+unfinished run as JSON, and ``/metrics`` gives the counters in the text format of
+Prometheus. The terminal view is a compact progress bar with a line for every running run,
+redrawn every ``interval`` seconds on the standard error.
+
+The threads are started with ``start()``, once the worker processes of the sweep are
+forked, see :meth:`~parametric_simulator.instrumentation.SweepMonitor.call_when_started`.
+"""
+
+import json
+import logging
+import os
+import socketserver
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_logger = logging.getLogger(__name__)
+
+# the counters of the summary which are exported as metrics, with their Prometheus type
+METRICS = {
+    "completed": "counter",
+    "failed": "counter",
+    "cached": "counter",
+    "pruned": "counter",
+    "duplicates": "counter",
+    "checkpointed": "counter",
+    "running": "gauge",
+    "queue_depth": "gauge",
+    "runs_per_second": "gauge",
+    "utilization": "gauge",
+    "eta": "gauge",
+}
+
+
+def get_progress(monitor):
+    """
+    Get the progress of a sweep.
+
+    Args:
+        monitor (SweepMonitor): The monitor of the sweep.
+
+    Returns:
+        dict: The summary of the monitor, with the total number of runs and the state of
+        the unfinished runs under ``runs``.
+    """
+    return {
+        **monitor.summary(),
+        "total": monitor.number_of_runs,
+        "max_workers": monitor.max_workers,
+        "runs": monitor.get_active_runs(),
+    }
+
+
+def format_metrics(progress):
+    """
+    Format the progress in the text format of Prometheus.
+
+    Args:
+        progress (dict): The progress, as returned by :func:`get_progress`.
+
+    Returns:
+        str: The metrics, named ``parsim_<counter>``.
+    """
+    lines = []
+    for name, kind in METRICS.items():
+        if progress.get(name) is None:
+            continue
+        lines.append(f"# TYPE parsim_{name} {kind}")
+        lines.append(f"parsim_{name} {progress[name]}")
+    return "\n".join(lines) + "\n"
+
+
+def format_duration(seconds):
+    """Format a number of seconds as ``H:MM:SS``."""
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+def format_progress(progress, width=30):
+    """
+    Format the progress as a compact view for the terminal.
+
+    Args:
+        progress (dict): The progress, as returned by :func:`get_progress`.
+        width (int): Number of characters of the progress bar.
+
+    Returns:
+        list: The lines of the view: the progress bar with the counts, and a line for
+        every running run.
+    """
+    total = progress["total"]
+    completed = progress["completed"]
+    if total:
+        fraction = min(completed / total, 1.0)
+        filled = int(fraction * width)
+        header = f"[{'#' * filled}{'.' * (width - filled)}] {fraction:4.0%} {completed}/{total}"
+    else:
+        header = f"{completed}"
+    header += (
+        f" done, {progress['failed']} failed, {progress['cached']} cached | "
+        f"{progress['running']} running, {progress['queue_depth']} queued | "
+        f"{progress['runs_per_second']:.2f} runs/s"
+    )
+    if progress["eta"] is not None:
+        header += f" | ETA {format_duration(progress['eta'])}"
+    lines = [header]
+    for run in progress["runs"]:
+        if run["state"] != "running":
+            break
+        parameters = " ".join(f"{name}={value}" for name, value in run["parameters"].items())
+        lines.append(f"  run {run['index']:>6} {run['elapsed']:8.1f}s {parameters}")
+    return lines
+
+
+class ProgressRequestHandler(BaseHTTPRequestHandler):
+    """Answer the requests for the progress of the sweep of the server."""
+
+    def do_GET(self):
+        progress = get_progress(self.server.monitor)
+        if self.path.rstrip("/") in ("", "/progress"):
+            body = json.dumps(progress, default=str).encode()
+            content_type = "application/json"
+        elif self.path == "/metrics":
+            body = format_metrics(progress).encode()
+            content_type = "text/plain; version=0.0.4"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        _logger.debug(f"{self.address_string()} {format % args}")
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """HTTP server on a Unix socket, which answers every request in its own thread."""
+
+    daemon_threads = True
+
+    def get_request(self):
+        # the client of a Unix socket has no address, which the request handler expects
+        request, _ = super().get_request()
+        return request, ("unix", 0)
+
+
+class ProgressServer:
+    """
+    Serve the progress of a sweep over HTTP in a background thread.
+
+    The address is bound right away, but the requests are only served after :meth:`start`.
+
+    Args:
+        monitor (SweepMonitor): The monitor of the sweep.
+        address (str): ``HOST:PORT``, or ``unix:PATH`` for a Unix socket. Port 0 picks a
+            free port.
+
+    Raises:
+        ValueError: If the address is invalid.
+        OSError: If the address cannot be bound.
+    """
+
+    def __init__(self, monitor, address):
+        self.socket_path = None
+        if address.startswith("unix:"):
+            self.socket_path = address[len("unix:") :]
+            if os.path.exists(self.socket_path):
+                # a socket left behind by a previous sweep
+                os.unlink(self.socket_path)
+            self.server = ThreadingUnixHTTPServer(self.socket_path, ProgressRequestHandler)
+            os.chmod(self.socket_path, 0o600)
+            self.address = address
+        else:
+            host, _, port = address.rpartition(":")
+            try:
+                port = int(port)
+            except ValueError as err:
+                raise ValueError(f"Invalid address {address}, expected HOST:PORT") from err
+            self.server = ThreadingHTTPServer(
+                (host.strip("[]") or "127.0.0.1", port), ProgressRequestHandler
+            )
+            self.server.daemon_threads = True
+            host, port = self.server.server_address[:2]
+            self.address = f"{host}:{port}"
+        self.server.monitor = monitor
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, name="progress-server", daemon=True
+        )
+
+    def start(self):
+        """Start serving the progress in the background thread."""
+        self.thread.start()
+
+    def close(self):
+        """Stop the server."""
+        if self.thread.is_alive():
+            self.server.shutdown()
+        self.server.server_close()
+        if self.socket_path is not None and os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+class TerminalProgress:
+    """
+    Redraw a compact progress view on the terminal in a background thread, after
+    :meth:`start`.
+
+    Args:
+        monitor (SweepMonitor): The monitor of the sweep.
+        stream (file, optional): The terminal. Defaults to the standard error.
+        interval (float): Seconds between the redraws.
+    """
+
+    def __init__(self, monitor, stream=None, interval=1.0):
+        self.monitor = monitor
+        self.stream = stream or sys.stderr
+        self.interval = interval
+        self.number_of_lines = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.loop, name="progress-view", daemon=True)
+
+    def start(self):
+        """Start redrawing the view in the background thread."""
+        self.thread.start()
+
+    def draw(self):
+        """Replace the previous view with the current progress."""
+        lines = format_progress(get_progress(self.monitor))
+        # move to the start of the previous view and clear it
+        prefix = f"\x1b[{self.number_of_lines}F\x1b[J" if self.number_of_lines else ""
+        self.stream.write(prefix + "\n".join(lines) + "\n")
+        self.stream.flush()
+        self.number_of_lines = len(lines)
+
+    def loop(self):
+        while not self.stopped.wait(self.interval):
+            self.draw()
+
+    def close(self):
+        """Stop redrawing, and leave the final progress on the terminal."""
+        self.stopped.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        self.draw()
@@ -0,0 +1,202 @@
+"""
+Early stopping of runs whose intermediate results are worse than those of their peers.
+
+Scripts report an intermediate metric with a step while they run::
+
+    for step in range(number_of_steps):
+        ...
+        report("loss", loss, step=step)
+
+While the runs execute, the simulator reads the new intermediate results from their
+report directories and applies a pruning rule. A run which is stopped gets a stop file in
+its report directory, and ends at its next call of
+:func:`~parametric_simulator.reporting.report`. In the settings file::
+
+    pruning:
+      metric: loss
+      mode: min
+      rule: median
+      warmup_steps: 5
+      min_runs: 5
+
+The rules are:
+
+- ``median``: stop a run when its value at a step is worse than the median of the values
+  of the other runs at the same step.
+- ``successive_halving``: the steps ``min_step * reduction_factor ** k`` are rungs; a run
+  reaching a rung continues only if its value is among the best ``1 / reduction_factor``
+  of the values of all runs which reached that rung before, as in asynchronous
+  successive halving.
+"""
+
+import json
+import logging
+import math
+import statistics
+import time
+
+from parametric_simulator.reporting import SCALARS_FILE_NAME, request_stop
+
+_logger = logging.getLogger(__name__)
+
+RULES = ("median", "successive_halving")
+
+
+class Pruner:
+    """
+    Stop runs early based on their intermediate results.
+
+    Args:
+        metric (str): Name of the intermediate result which is compared.
+        mode (str): ``min`` if lower values are better, ``max`` if higher values are.
+        rule (str): One of :data:`RULES`.
+        warmup_steps (int): Runs are not stopped before this step.
+        min_runs (int): Number of other runs which must have reached a step before the
+            median rule compares against them.
+        reduction_factor (int): Fraction of the runs which continue at every rung of
+            successive halving.
+        min_step (int): First rung of successive halving.
+        interval (float): Seconds between the checks of the intermediate results.
+    """
+
+    def __init__(
+        self,
+        metric,
+        mode="min",
+        rule="median",
+        warmup_steps=0,
+        min_runs=5,
+        reduction_factor=3,
+        min_step=1,
+        interval=1.0,
+    ):
+        if mode not in ("min", "max"):
+            raise ValueError(f"The pruning mode must be 'min' or 'max': {mode}")
+        if rule not in RULES:
+            raise ValueError(f"The pruning rule must be one of {RULES}: {rule}")
+        self.metric = metric
+        self.sign = 1 if mode == "min" else -1
+        self.rule = rule
+        self.warmup_steps = warmup_steps
+        self.min_runs = min_runs
+        self.reduction_factor = reduction_factor
+        self.min_step = min_step
+        self.interval = interval
+
+        self.offsets = {}
+        self.stopped = set()
+        # values of the metric at every step, and at every rung, as lower is better
+        self.values_at_step = {}
+        self.values_at_rung = {}
+        self.rung_of_run = {}
+        self.last_check = 0.0
+
+    def read_new_values(self, pending_run):
+        """
+        Read the intermediate results a run reported since the last call.
+
+        Args:
+            pending_run (PendingRun): The run.
+
+        Returns:
+            list: The new ``(step, value)`` pairs of the metric.
+        """
+        file_name = pending_run.report_directory / SCALARS_FILE_NAME
+        index = pending_run.run.index
+        values = []
+        try:
+            with open(file_name, "rb") as stream:
+                stream.seek(self.offsets.get(index, 0))
+                for line in stream:
+                    if not line.endswith(b"\n"):
+                        # the line is still being written
+                        break
+                    self.offsets[index] = self.offsets.get(index, 0) + len(line)
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if record.get("name") != self.metric or record.get("step") is None:
+                        continue
+                    value = record["value"]
+                    if isinstance(value, (int, float)) and math.isfinite(value):
+                        values.append((record["step"], self.sign * value))
+        except FileNotFoundError:
+            pass
+        return values
+
+    def should_stop(self, index, step, value):
+        """
+        Record an intermediate result of a run and decide whether to stop the run.
+
+        Args:
+            index (int): The index of the run.
+            step (int): The step of the result.
+            value (float): The value of the metric, where lower is better.
+
+        Returns:
+            bool: True if the run should be stopped.
+        """
+        peers = self.values_at_step.setdefault(step, {})
+        peers[index] = value
+        if step < self.warmup_steps:
+            return False
+
+        if self.rule == "median":
+            others = [other for run, other in peers.items() if run != index]
+            return len(others) >= self.min_runs and value > statistics.median(others)
+
+        # successive halving: check every rung the run passed since its last result
+        stop = False
+        rung = self.rung_of_run.get(index, 0)
+        while step >= self.min_step * self.reduction_factor**rung:
+            values = self.values_at_rung.setdefault(rung, [])
+            values.append(value)
+            rung += 1
+            if len(values) >= self.reduction_factor:
+                keep = max(len(values) // self.reduction_factor, 1)
+                stop = stop or value > sorted(values)[keep - 1]
+        self.rung_of_run[index] = rung
+        return stop
+
+    def check(self, pending_runs, force=False):
+        """
+        Read the new intermediate results of the running runs and stop the worst runs.
+
+        Args:
+            pending_runs (iterable): The :class:`~parametric_simulator.executor.PendingRun`
+                objects of the running runs.
+            force (bool): Check even if the interval did not pass since the last check.
+        """
+        now = time.monotonic()
+        if not force and now - self.last_check < self.interval:
+            return
+        self.last_check = now
+        for pending_run in pending_runs:
+            index = pending_run.run.index
+            if pending_run.report_directory is None or index in self.stopped:
+                continue
+            for step, value in self.read_new_values(pending_run):
+                if self.should_stop(index, step, value):
+                    _logger.info(
+                        f"Stopping run {index} at step {step}: {self.metric} = "
+                        f"{self.sign * value:.6g} is worse than that of the other runs"
+                    )
+                    request_stop(pending_run.report_directory)
+                    self.stopped.add(index)
+                    break
+
+    def run_finished(self, pending_run):
+        """
+        Read the last intermediate results of a finished run, for comparison with others.
+
+        Args:
+            pending_run (PendingRun): The finished run.
+        """
+        index = pending_run.run.index
+        if pending_run.report_directory is not None and index not in self.stopped:
+            for step, value in self.read_new_values(pending_run):
+                self.should_stop(index, step, value)
+        self.offsets.pop(index, None)
+        self.rung_of_run.pop(index, None)
+        self.stopped.discard(index)
@@ -0,0 +1,391 @@
+"""
+Reduction of the output files of every run while the sweep continues.
+
+Reducers are callables which parse the output files of a finished run and reduce them to
+a few values, which are added to the outputs of the run in the results store. A reducer is
+given a :class:`RunOutputs` with the files of the run, and returns a scalar, which gets
+the name of the reducer, or a dict of scalars. In the settings file::
+
+    reduce:
+      reducers:
+        max_stress: reducers.py:get_max_stress
+        spectrum: my_package.post:reduce_spectrum
+      workers: 4
+      kind: process
+      queue_size: 16
+      raw: compress
+
+A reducer is given as ``FILE.py:FUNCTION`` or ``MODULE:FUNCTION``. The runs are reduced in
+a pool of ``workers`` threads, or processes for reducers which need the CPU, as soon as they
+finish, while the next runs execute. At most ``queue_size`` runs wait for their reduction;
+when the reducers fall behind, no new runs are started until they catch up.
+
+Once a run is reduced, its raw outputs, which are its log files, its report directory and
+its staged working directory, are kept, deleted, or compressed in the pool, according to
+``raw``. This keeps the disk use bounded for sweeps which would otherwise fill the scratch
+file system. The raw outputs of a run whose reduction failed are always kept.
+
+The reduced values are stored in the result cache together with the outputs reported by
+the run, so a cached run keeps its reduced values after its raw outputs are gone.
+"""
+
+import dataclasses
+import gzip
+import importlib
+import logging
+import os
+import shutil
+import tarfile
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Optional
+
+from parametric_simulator.executor import get_log_file_names, load_script
+from parametric_simulator.journal import get_run_hash
+from parametric_simulator.reporting import get_report_directory
+
+_logger = logging.getLogger(__name__)
+
+KINDS = ("thread", "process")
+RAW_OUTPUTS = ("keep", "delete", "compress")
+
+# the reducers loaded in this process, by their specification
+_loaded_reducers = {}
+
+
+@dataclass
+class RunOutputs:
+    """
+    The outputs of a finished run, as given to the reducers.
+
+    Attributes:
+        index (int): Sequence number of the run within the sweep.
+        parameters (dict): The parameters of the run.
+        outputs (dict): The scalars reported by the run.
+        arrays (dict): The file names of the arrays reported by the run.
+        report_directory (Path, optional): The report directory of the run.
+        working_directory (Path, optional): The working directory staged for the run.
+        stdout (Path, optional): The file with the standard output of the run.
+        stderr (Path, optional): The file with the standard error of the run.
+    """
+
+    index: int
+    parameters: Dict[str, object] = field(default_factory=dict)
+    outputs: Dict[str, object] = field(default_factory=dict)
+    arrays: Dict[str, str] = field(default_factory=dict)
+    report_directory: Optional[Path] = None
+    working_directory: Optional[Path] = None
+    stdout: Optional[Path] = None
+    stderr: Optional[Path] = None
+
+    def get_raw_paths(self):
+        """Get the existing files and directories with the raw outputs of the run."""
+        paths = [self.stdout, self.stderr, self.report_directory, self.working_directory]
+        return [path for path in paths if path is not None and os.path.lexists(path)]
+
+
+def get_reducer(reducer):
+    """
+    Get a reducer from its specification.
+
+    Args:
+        reducer (callable or str): The reducer, or ``FILE.py:FUNCTION`` or
+            ``MODULE:FUNCTION``.
+
+    Returns:
+        callable: The reducer.
+
+    Raises:
+        ValueError: If the reducer cannot be loaded.
+    """
+    if callable(reducer):
+        return reducer
+    function = _loaded_reducers.get(reducer)
+    if function is not None:
+        return function
+    location, _, name = reducer.rpartition(":")
+    if not location or not name:
+        raise ValueError(f"A reducer must be FILE.py:FUNCTION or MODULE:FUNCTION: {reducer}")
+    try:
+        if location.endswith(".py"):
+            module = load_script(location)
+        else:
+            module = importlib.import_module(location)
+    except Exception as err:
+        raise ValueError(f"Cannot load the reducer {reducer}: {err}") from err
+    function = getattr(module, name, None)
+    if not callable(function):
+        raise ValueError(f"{location} has no function {name}")
+    _loaded_reducers[reducer] = function
+    return function
+
+
+def compress_path(path):
+    """
+    Compress a file with gzip, or pack a directory into a ``.tar.gz`` file.
+
+    Args:
+        path (Path): The file or directory, which is replaced by the compressed file.
+
+    Returns:
+        Path: The compressed file.
+    """
+    if path.is_dir() and not path.is_symlink():
+        compressed_path = path.with_name(path.name + ".tar.gz")
+        with tarfile.open(compressed_path, "w:gz") as archive:
+            archive.add(path, arcname=path.name)
+        shutil.rmtree(path)
+        return compressed_path
+    compressed_path = path.with_name(path.name + ".gz")
+    with open(path, "rb") as source, gzip.open(compressed_path, "wb") as destination:
+        shutil.copyfileobj(source, destination)
+    path.unlink()
+    return compressed_path
+
+
+def reduce_run(reducers, run_outputs, raw="keep"):
+    """
+    Reduce the outputs of a run, and clean up its raw outputs.
+
+    This function runs in the pool of the pipeline.
+
+    Args:
+        reducers (dict): The reducers by name, as callables or specifications.
+        run_outputs (RunOutputs): The outputs of the run.
+        raw (str): One of :data:`RAW_OUTPUTS`.
+
+    Returns:
+        tuple: The reduced values, or None if a reducer failed, and the file names of the
+        arrays of the run after the clean-up.
+    """
+    values = {}
+    try:
+        for name, reducer in reducers.items():
+            value = get_reducer(reducer)(run_outputs)
+            if isinstance(value, dict):
+                values.update(value)
+            elif value is not None:
+                values[name] = value
+    except Exception:
+        _logger.warning(
+            f"Could not reduce the outputs of run {run_outputs.index}:\n{traceback.format_exc()}"
+        )
+        return None, run_outputs.arrays
+
+    arrays = run_outputs.arrays
+    if raw != "keep":
+        try:
+            for path in run_outputs.get_raw_paths():
+                if raw == "compress":
+                    compress_path(Path(path))
+                elif os.path.isdir(path) and not os.path.islink(path):
+                    shutil.rmtree(path)
+                else:
+                    os.unlink(path)
+        except OSError as err:
+            _logger.warning(f"Could not clean up the outputs of run {run_outputs.index}: {err}")
+        # the arrays are packed with the report directory, or deleted
+        arrays = {}
+    return values, arrays
+
+
+class ReductionPipeline:
+    """
+    Reduce the outputs of the runs in a pool, overlapped with the execution of the sweep.
+
+    Args:
+        reducers (dict): The reducers by name, as callables or specifications, see
+            :func:`get_reducer`.
+        workers (int): Number of threads or processes which reduce runs.
+        kind (str): One of :data:`KINDS`.
+        queue_size (int, optional): Maximum number of runs which wait for their reduction.
+            Defaults to four times the number of workers.
+        raw (str): What to do with the raw outputs of a reduced run, one of
+            :data:`RAW_OUTPUTS`.
+        log_directory (str or Path, optional): Directory with the log files of the runs.
+        reports_directory (str or Path, optional): Directory with the report directories
+            of the runs.
+        stager (Stager, optional): Gives the working directories of the runs.
+        script (str or Path, optional): The script of the sweep, to update the cache.
+        cache (ResultCache, optional): The cache of previous results, which gets the
+            reduced values.
+        journal (RunJournal, optional): The journal of the sweep. The runs which already
+            finished according to the journal are skipped, so they are not tracked.
+
+    Raises:
+        ValueError: If the settings are invalid, or a reducer cannot be loaded.
+    """
+
+    def __init__(
+        self,
+        reducers,
+        workers=2,
+        kind="thread",
+        queue_size=None,
+        raw="keep",
+        log_directory=None,
+        reports_directory=None,
+        stager=None,
+        script=None,
+        cache=None,
+        journal=None,
+    ):
+        if kind not in KINDS:
+            raise ValueError(f"The kind of the reduction pool must be one of {KINDS}: {kind}")
+        if raw not in RAW_OUTPUTS:
+            raise ValueError(f"The raw outputs must be one of {RAW_OUTPUTS}: {raw}")
+        if not reducers:
+            raise ValueError("No reducers are given")
+        # load the reducers here, so errors are found before the sweep starts
+        for reducer in reducers.values():
+            get_reducer(reducer)
+        self.reducers = dict(reducers)
+        self.workers = workers
+        self.kind = kind
+        self.queue_size = max(queue_size or 4 * workers, 1)
+        self.raw = raw
+        self.log_directory = log_directory
+        self.reports_directory = reports_directory
+        self.stager = stager
+        self.script = script
+        self.cache = cache
+        self.journal = journal
+
+        # the arguments of the runs which were handed to the sweep, to update the cache
+        self.arguments = {}
+        self.executor = None
+        self.number_of_reduced_runs = 0
+
+    def get_run_outputs(self, result):
+        """Get the outputs of a run from its result."""
+        stdout, stderr = get_log_file_names(self.log_directory, result.index)
+        working_directory = None
+        if self.stager is not None:
+            working_directory = self.stager.get_run_directory(result.index)
+        return RunOutputs(
+            index=result.index,
+            parameters=result.parameters,
+            outputs=result.outputs,
+            arrays=result.arrays,
+            report_directory=get_report_directory(self.reports_directory, result.index),
+            working_directory=working_directory,
+            stdout=stdout,
+            stderr=stderr,
+        )
+
+    def submit(self, result):
+        """Start the reduction of a run in the pool."""
+        if self.executor is None:
+            if self.kind == "process":
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self.executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="reduction"
+                )
+        return self.executor.submit(
+            reduce_run, self.reducers, self.get_run_outputs(result), self.raw
+        )
+
+    def finish(self, result, future):
+        """
+        Add the reduced values to the result of a run.
+
+        Args:
+            result (RunResult): The result of the run.
+            future (Future): The reduction of the run.
+
+        Returns:
+            RunResult: The result with the reduced values added to its outputs.
+        """
+        arguments = self.arguments.pop(result.index, None)
+        try:
+            values, arrays = future.result()
+        except Exception as err:
+            _logger.warning(f"Could not reduce the outputs of run {result.index}: {err}")
+            return result
+        if values is None:
+            return result
+        self.number_of_reduced_runs += 1
+        result = dataclasses.replace(result, outputs={**result.outputs, **values}, arrays=arrays)
+        if self.cache is not None and arguments is not None:
+            self.cache.put(
+                self.cache.get_key(self.script, arguments),
+                {
+                    "returncode": result.returncode,
+                    "wall_time": result.wall_time,
+                    "outputs": result.outputs,
+                },
+            )
+        return result
+
+    def track(self, runs):
+        """Remember the arguments of the runs which the sweep will execute as it takes them."""
+        for run in runs:
+            if self.cache is not None and not self.is_done(run):
+                self.arguments[run.index] = run.arguments
+            yield run
+
+    def is_done(self, run):
+        """Check if a run is skipped, as it already finished according to the journal."""
+        if self.journal is None:
+            return False
+        return self.journal.is_done(get_run_hash(self.script, run.arguments))
+
+    def reduce(self, results):
+        """
+        Reduce the results of the executed runs.
+
+        Successful runs are reduced in the pool; all other results are passed on as they
+        are. While the runs are reduced, the next results are taken from ``results``, so
+        the reduction overlaps with the execution of the sweep.
+
+        Args:
+            results (iterable): The results of the runs.
+
+        Yields:
+            RunResult: The result of every run, with the reduced values in its outputs.
+        """
+        pending = deque()
+
+        def collect(block):
+            if block:
+                wait([pending[0][1]])
+            # yield the finished reductions, in the order in which the runs finished
+            while pending and pending[0][1].done():
+                yield self.finish(*pending.popleft())
+
+        for result in results:
+            if not result.success or result.cached or result.duplicate_of is not None:
+                self.arguments.pop(result.index, None)
+                yield result
+            else:
+                pending.append((result, self.submit(result)))
+            yield from collect(block=False)
+            # apply backpressure: take no new results while the queue is full
+            while len(pending) >= self.queue_size:
+                yield from collect(block=True)
+        while pending:
+            yield from collect(block=True)
+
+    def run(self, run_round, runs):
+        """
+        Execute the runs of a sweep and reduce their outputs.
+
+        Args:
+            run_round (callable): Executes a list of runs and yields their results, e.g.
+                :func:`~parametric_simulator.executor.run_sweep` with its arguments bound.
+            runs (iterable): The runs of the sweep.
+
+        Returns:
+            iterator: The result of every run, with the reduced values in its outputs.
+        """
+        return self.reduce(run_round(self.track(runs)))
+
+    def close(self):
+        """Wait for the reductions which are still running, and stop the pool."""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
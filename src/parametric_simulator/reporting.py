@@ -0,0 +1,193 @@
+"""
+Reporting of results from a script to the simulator.
+
+A script calls :func:`report` for every result it wants to pass back::
+
+    from parametric_simulator import report
+
+    report("energy", 1.5)
+    report("field", field_array)
+
+The simulator gives every run its own report directory in the environment variable
+``PARSIM_REPORT_DIR``. Scalars are appended as JSON lines to a file in that directory.
+Arrays are saved as ``.npy`` files, which are written straight from the array buffer and
+memory-mapped by the reader, so large arrays are never pickled or sent through a pipe.
+Put the report directory on a ``tmpfs`` such as ``/dev/shm`` to keep the arrays in shared
+memory.
+
+Outside the simulator, when ``PARSIM_REPORT_DIR`` is not set, :func:`report` does nothing,
+so scripts can still be run on their own.
+
+Intermediate results reported with a ``step`` can be used by the simulator to stop runs
+which are clearly worse than the others, see :mod:`~parametric_simulator.pruning`. The
+simulator then creates a stop file in the report directory, and the next call of
+:func:`report` ends the run with :data:`PRUNED_EXIT_CODE`. Every call also polls for a
+requested checkpoint, see :mod:`~parametric_simulator.checkpoint`.
+"""
+
+import json
+import logging
+import os
+import sys
+from pathlib import Path
+
+_logger = logging.getLogger(__name__)
+
+REPORT_DIRECTORY_VARIABLE = "PARSIM_REPORT_DIR"
+SCALARS_FILE_NAME = "scalars.jsonl"
+STOP_FILE_NAME = "stop"
+
+# exit code of a run which was stopped by the simulator
+PRUNED_EXIT_CODE = 75
+
+
+def get_report_directory(reports_directory, index):
+    """
+    Get the report directory of a run.
+
+    Args:
+        reports_directory (str or Path or None): Directory with the reports of all runs.
+        index (int): Sequence number of the run.
+
+    Returns:
+        Path or None: The report directory of the run, or None if no reports directory is
+        given.
+    """
+    if reports_directory is None:
+        return None
+    return Path(reports_directory) / f"run_{index:06d}"
+
+
+def is_scalar(value):
+    """
+    Check if a value is reported as a scalar.
+
+    Args:
+        value: The reported value.
+
+    Returns:
+        bool: True for None, booleans, numbers, strings and zero-dimensional arrays.
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return True
+    return getattr(value, "ndim", None) == 0
+
+
+def report(name, value, step=None):
+    """
+    Report a result of the current run to the simulator.
+
+    Args:
+        name (str): Name of the result. Scalars become a column of the results store.
+        value: A scalar, or an array or sequence of numbers.
+        step (int, optional): Step of an intermediate result, for results which are
+            reported repeatedly while the run progresses.
+
+    Raises:
+        SystemExit: With :data:`PRUNED_EXIT_CODE` if the simulator asked to stop the run,
+            or with :data:`~parametric_simulator.checkpoint.CHECKPOINTED_EXIT_CODE` after
+            saving a checkpoint which the simulator asked for.
+    """
+    from parametric_simulator.checkpoint import poll
+
+    directory = os.environ.get(REPORT_DIRECTORY_VARIABLE)
+    if directory is None:
+        _logger.debug(f"Not running in the simulator, ignoring the report of {name}")
+        return
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    if is_scalar(value):
+        if hasattr(value, "item"):
+            value = value.item()
+        record = {"name": name, "value": value}
+        if step is not None:
+            record["step"] = step
+        with open(directory / SCALARS_FILE_NAME, "a") as stream:
+            stream.write(json.dumps(record) + "\n")
+        if is_stop_requested(directory):
+            _logger.info(f"Stopping the run as requested by the simulator after {name}")
+            sys.exit(PRUNED_EXIT_CODE)
+        poll()
+        return
+
+    import numpy as np
+
+    file_name = directory / f"{name}.npy"
+    temporary_file_name = directory / f"{name}.tmp.npy"
+    np.save(temporary_file_name, np.asarray(value), allow_pickle=False)
+    os.replace(temporary_file_name, file_name)
+    poll()
+
+
+def is_stop_requested(directory):
+    """
+    Check if the simulator asked a run to stop.
+
+    Args:
+        directory (str or Path or None): The report directory of the run.
+
+    Returns:
+        bool: True if the stop file exists.
+    """
+    return directory is not None and os.path.exists(os.path.join(directory, STOP_FILE_NAME))
+
+
+def request_stop(directory):
+    """
+    Ask a run to stop at its next report.
+
+    Args:
+        directory (str or Path): The report directory of the run.
+    """
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    (Path(directory) / STOP_FILE_NAME).touch()
+
+
+def read_reports(directory):
+    """
+    Read the results reported by a run.
+
+    Args:
+        directory (str or Path or None): The report directory of the run.
+
+    Returns:
+        tuple: A dict with the last reported value of every scalar, and a dict with the
+        file name of every reported array.
+    """
+    scalars = {}
+    arrays = {}
+    if directory is None:
+        return scalars, arrays
+    directory = Path(directory)
+    try:
+        with open(directory / SCALARS_FILE_NAME) as stream:
+            for line in stream:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # the last line is incomplete if the run was killed while reporting
+                    continue
+                scalars[record["name"]] = record["value"]
+    except FileNotFoundError:
+        pass
+    if directory.is_dir():
+        for file_name in directory.glob("*.npy"):
+            if not file_name.name.endswith(".tmp.npy"):
+                arrays[file_name.stem] = str(file_name)
+    return scalars, arrays
+
+
+def load_array(file_name):
+    """
+    Load a reported array without copying it into memory.
+
+    Args:
+        file_name (str or Path): The ``.npy`` file of the array.
+
+    Returns:
+        numpy.ndarray: A read-only memory-mapped view of the array.
+    """
+    import numpy as np
+
+    return np.load(file_name, mmap_mode="r", allow_pickle=False)
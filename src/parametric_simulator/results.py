@@ -0,0 +1,321 @@
+"""
+Columnar store of the results of a sweep.
+
+The results of all the runs are gathered in one table with a column per parameter, plus
+the run index, exit code, wall time and any other scalar value of the results. Every
+column is a separate file of fixed-size little-endian values, which can be memory-mapped
+directly with :func:`numpy.memmap`:
+
+- numbers are stored as ``float64``, with NaN for missing values,
+- the run index and exit code are stored as ``int64``,
+- strings are stored as ``int32`` codes into a list of categories, with -1 for missing
+  values.
+
+A column gets its type from its first value. When a number column gets a string later,
+e.g. from an axis with the values ``[1, auto]``, it becomes a category column, and the
+numbers it already holds become categories. Other values which cannot be stored in their
+column are stored as missing values, with a warning.
+
+The names, types and categories of the columns and the number of complete rows are kept
+in ``columns.json``. Rows are buffered in memory and appended to the column files in
+batches, after which ``columns.json`` is replaced, so readers never see partial rows.
+"""
+
+import json
+import logging
+import math
+import os
+import sys
+from array import array
+from pathlib import Path
+
+_logger = logging.getLogger(__name__)
+
+METADATA_FILE_NAME = "columns.json"
+
+# typecode of the array module and the value used for missing entries of every column type
+COLUMN_TYPES = {
+    "float64": ("d", math.nan),
+    "int64": ("q", -(2**63)),
+    "category": ("i", -1),
+}
+
+# columns with a fixed type, all other columns get their type from their first value
+FIXED_COLUMN_TYPES = {"run_index": "int64", "returncode": "int64"}
+
+
+def get_column_type(name, value):
+    """
+    Get the type of a new column from its name and first value.
+
+    Args:
+        name (str): Name of the column.
+        value: First value of the column.
+
+    Returns:
+        str: One of the keys of :data:`COLUMN_TYPES`.
+    """
+    if name in FIXED_COLUMN_TYPES:
+        return FIXED_COLUMN_TYPES[name]
+    if isinstance(value, str):
+        return "category"
+    return "float64"
+
+
+def format_number(value):
+    """
+    Get the category of a number of a column which becomes a category column.
+
+    Args:
+        value (float): The number.
+
+    Returns:
+        str: The number, without a fraction if it is a whole number.
+    """
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class Column:
+    """
+    A column of the results store, with the values which have not yet been written.
+
+    Args:
+        file_name (Path): The file with the values of the column.
+        dtype (str): The type of the column, one of the keys of :data:`COLUMN_TYPES`.
+        categories (list, optional): The categories of a ``category`` column.
+    """
+
+    def __init__(self, file_name, dtype, categories=None):
+        self.file_name = file_name
+        self.dtype = dtype
+        self.typecode, self.missing = COLUMN_TYPES[dtype]
+        self.categories = list(categories or [])
+        self.codes = {category: code for code, category in enumerate(self.categories)}
+        self.buffer = array(self.typecode)
+        # whether the buffer holds all the rows, because the column changed its type
+        self.rewrite = False
+
+    def encode(self, value):
+        """Convert a value into the type stored in the column file."""
+        if value is None:
+            return self.missing
+        if self.dtype == "category":
+            value = str(value)
+            if value not in self.codes:
+                self.codes[value] = len(self.categories)
+                self.categories.append(value)
+            return self.codes[value]
+        if self.dtype == "int64":
+            return int(value)
+        return float(value)
+
+    def append(self, value):
+        """Append a value to the buffer of the column."""
+        self.buffer.append(self.encode(value))
+
+    def to_category(self, number_of_rows):
+        """
+        Turn a ``float64`` column into a ``category`` column, when it gets a string.
+
+        The numbers which are already in the column become categories, and the whole
+        column is written again at the next write.
+
+        Args:
+            number_of_rows (int): Number of rows already in the file.
+        """
+        values = array(self.typecode)
+        if number_of_rows:
+            with open(self.file_name, "rb") as stream:
+                values.fromfile(stream, number_of_rows)
+            if sys.byteorder != "little":  # pragma: no cover
+                values.byteswap()
+        values.extend(self.buffer)
+        self.dtype = "category"
+        self.typecode, self.missing = COLUMN_TYPES[self.dtype]
+        self.buffer = array(self.typecode)
+        for value in values:
+            self.append(None if math.isnan(value) else format_number(value))
+        self.rewrite = True
+
+    def write(self, number_of_rows):
+        """
+        Append the buffered values to the column file.
+
+        Args:
+            number_of_rows (int): Number of rows already in the file. If the file is longer,
+                for instance after a crash during a previous write, it is truncated first.
+        """
+        values = self.buffer
+        if sys.byteorder != "little":  # pragma: no cover
+            values = array(self.typecode, values)
+            values.byteswap()
+        if self.rewrite:
+            # replace the file with the values of the new type
+            temporary_file_name = self.file_name.with_suffix(".tmp")
+            with open(temporary_file_name, "wb") as stream:
+                values.tofile(stream)
+            os.replace(temporary_file_name, self.file_name)
+            self.rewrite = False
+        else:
+            with open(self.file_name, "ab") as stream:
+                stream.truncate(number_of_rows * self.buffer.itemsize)
+                values.tofile(stream)
+        self.buffer = array(self.typecode)
+
+    def to_metadata(self):
+        """Get the description of the column for the metadata file."""
+        metadata = {"dtype": self.dtype}
+        if self.dtype == "category":
+            metadata["categories"] = self.categories
+        return metadata
+
+
+class ResultsStore:
+    """
+    Writer of the columnar results store of a sweep.
+
+    Opening an existing store appends to it.
+
+    Args:
+        directory (str or Path): Directory of the store.
+        batch_size (int): Number of rows which are buffered before they are written.
+    """
+
+    def __init__(self, directory, batch_size=1024):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size
+        self.columns = {}
+        self.number_of_rows = 0
+        self.number_of_written_rows = 0
+
+        metadata_file_name = self.directory / METADATA_FILE_NAME
+        if metadata_file_name.exists():
+            with open(metadata_file_name) as stream:
+                metadata = json.load(stream)
+            self.number_of_rows = self.number_of_written_rows = metadata["number_of_rows"]
+            for name, column in metadata["columns"].items():
+                self.columns[name] = Column(
+                    self.get_column_file_name(name), column["dtype"], column.get("categories")
+                )
+
+    def get_column_file_name(self, name):
+        """
+        Get the file with the values of a column.
+
+        Args:
+            name (str): Name of the column.
+
+        Returns:
+            Path: The column file.
+        """
+        return self.directory / f"{name}.bin"
+
+    def append(self, row):
+        """
+        Append a row to the store. The row is written when the batch is full.
+
+        Columns which are not in the row get a missing value, and new columns get a
+        missing value for all the previous rows.
+
+        Args:
+            row (dict): Mapping of column name to scalar value.
+        """
+        for name, value in row.items():
+            if name not in self.columns:
+                column = Column(self.get_column_file_name(name), get_column_type(name, value))
+                for _ in range(self.number_of_written_rows):
+                    column.append(None)
+                column.write(0)
+                for _ in range(self.number_of_rows - self.number_of_written_rows):
+                    column.append(None)
+                self.columns[name] = column
+        for name, column in self.columns.items():
+            value = row.get(name)
+            try:
+                column.append(value)
+            except (TypeError, ValueError, OverflowError):
+                if column.dtype == "float64" and isinstance(value, str):
+                    _logger.info(f"Column {name} gets the string {value!r}, storing categories")
+                    column.to_category(self.number_of_written_rows)
+                    column.append(value)
+                else:
+                    _logger.warning(
+                        f"Cannot store {value!r} in the {column.dtype} column {name}, "
+                        "storing a missing value"
+                    )
+                    column.append(None)
+        self.number_of_rows += 1
+        if self.number_of_rows - self.number_of_written_rows >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered rows to the column files and update the metadata."""
+        if self.number_of_rows == self.number_of_written_rows:
+            return
+        for column in self.columns.values():
+            column.write(self.number_of_written_rows)
+        self.number_of_written_rows = self.number_of_rows
+
+        metadata = {
+            "number_of_rows": self.number_of_rows,
+            "columns": {name: column.to_metadata() for name, column in self.columns.items()},
+        }
+        metadata_file_name = self.directory / METADATA_FILE_NAME
+        temporary_file_name = metadata_file_name.with_suffix(".tmp")
+        with open(temporary_file_name, "w") as stream:
+            json.dump(metadata, stream)
+        os.replace(temporary_file_name, metadata_file_name)
+        _logger.debug(f"Wrote {self.number_of_rows} rows to {self.directory}")
+
+    def close(self):
+        """Write the remaining buffered rows."""
+        self.flush()
+
+
+def load_results(directory):
+    """
+    Load the columns of a results store.
+
+    The numeric columns are memory-mapped with NumPy if it is installed, and read into an
+    :class:`array.array` otherwise. The codes of the category columns are converted into
+    their strings.
+
+    Args:
+        directory (str or Path): Directory of the store.
+
+    Returns:
+        dict: Mapping of column name to the values of the column.
+    """
+    directory = Path(directory)
+    with open(directory / METADATA_FILE_NAME) as stream:
+        metadata = json.load(stream)
+    number_of_rows = metadata["number_of_rows"]
+
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+
+    columns = {}
+    for name, column in metadata["columns"].items():
+        file_name = directory / f"{name}.bin"
+        typecode = COLUMN_TYPES[column["dtype"]][0]
+        if np is not None:
+            dtype = np.dtype(typecode).newbyteorder("<")
+            if number_of_rows:
+                values = np.memmap(file_name, dtype=dtype, mode="r", shape=(number_of_rows,))
+            else:
+                # an empty file cannot be memory-mapped
+                values = np.empty(0, dtype=dtype)
+        else:
+            values = array(typecode)
+            with open(file_name, "rb") as stream:
+                values.fromfile(stream, number_of_rows)
+            if sys.byteorder != "little":  # pragma: no cover
+                values.byteswap()
+        if column["dtype"] == "category":
+            categories = column["categories"]
+            values = [categories[code] if code >= 0 else None for code in values]
+        columns[name] = values
+    return columns
@@ -0,0 +1,350 @@
+"""
+Adaptive sampling of the parameter space in rounds, instead of an exhaustive grid.
+
+The rules of the settings file then describe the domain of every parameter instead of
+the grid points:
+
+- a ``linspace`` gives a continuous range from ``start`` to ``stop``,
+- a ``logspace`` gives a continuous range which is sampled on a log scale,
+- ``values`` and ranges with ``start``, ``end`` and ``step`` give a discrete set of values.
+
+The first round is a Latin hypercube sample, which covers every parameter evenly. Every
+following round adds the points where a cheap nearest-neighbour surrogate of a reported
+output is most uncertain: far from the points which were already run, in regions where
+the output of the neighbouring points differs a lot. The sampling stops when the number
+of runs reaches the budget, or when the largest uncertainty drops below the tolerance.
+In the settings file::
+
+    sampling:
+      strategy: adaptive
+      output: energy
+      initial: 20
+      batch: 10
+      budget: 200
+      tolerance: 0.01
+
+The runs are executed with the usual engines; a round starts when the previous round has
+finished. Only runs which report the output inform the next rounds. When an adaptive
+sweep is resumed with the same seed, the rounds are chosen again, and the runs which the
+journal skips give the sampler their outputs from the result cache, so use a result cache
+to resume an adaptive sweep, e.g. with a larger budget.
+"""
+
+import logging
+import math
+import random
+from typing import Iterator
+
+from parametric_simulator.sweep import Run, count_axis_values, render_arguments
+
+_logger = logging.getLogger(__name__)
+
+STRATEGIES = ("grid", "adaptive")
+
+
+class Dimension:
+    """
+    The domain of a parameter, mapped to the unit interval.
+
+    Args:
+        key (str): Name of the parameter.
+        iterator (dict): The iterator settings of the rule of the parameter.
+    """
+
+    def __init__(self, key, iterator):
+        self.key = key
+        self.continuous = "linspace" in iterator or "logspace" in iterator
+        self.log = "logspace" in iterator
+        if self.continuous:
+            space = iterator.get("linspace") or iterator["logspace"]
+            self.lower, self.upper = space["start"], space["stop"]
+            if self.log:
+                base = space.get("base", 10.0)
+                self.lower, self.upper = base**self.lower, base**self.upper
+            return
+
+        self.count = count_axis_values(iterator)
+        if self.count == 0:
+            raise ValueError(f"Parameter {key} has no values to sample")
+        self.values = list(iterator["values"]) if "values" in iterator else None
+        self.start = iterator.get("start", 0)
+        self.step = iterator.get("step", 1)
+
+    def get_value(self, u):
+        """
+        Get the parameter value at a coordinate of the unit interval.
+
+        Args:
+            u (float): The coordinate, between 0 and 1.
+
+        Returns:
+            The parameter value.
+        """
+        if self.continuous:
+            if self.log:
+                return self.lower * (self.upper / self.lower) ** u
+            return self.lower + (self.upper - self.lower) * u
+        index = min(int(u * self.count), self.count - 1)
+        if self.values is not None:
+            return self.values[index]
+        return self.start + index * self.step
+
+    def snap(self, u):
+        """Move a coordinate to the centre of its value, for discrete parameters."""
+        if self.continuous:
+            return u
+        return (min(int(u * self.count), self.count - 1) + 0.5) / self.count
+
+
+def get_dimensions(rules):
+    """
+    Get the domains of the parameters of the rules.
+
+    Zipped rules are sampled independently.
+
+    Args:
+        rules (dict or None): The ``rules`` section of the settings file.
+
+    Returns:
+        list: A :class:`Dimension` for every rule.
+    """
+    dimensions = []
+    for name, rule in (rules or {}).items():
+        iterator = rule.get("iterator") or {}
+        dimensions.append(Dimension(iterator.get("key", name), iterator))
+    return dimensions
+
+
+def latin_hypercube(number_of_points, number_of_dimensions, rng):
+    """
+    Draw a Latin hypercube sample from the unit cube.
+
+    Every dimension is divided into ``number_of_points`` equal strata, and every stratum
+    of every dimension holds exactly one point.
+
+    Args:
+        number_of_points (int): Number of points.
+        number_of_dimensions (int): Number of dimensions.
+        rng (random.Random): The random number generator.
+
+    Returns:
+        list: The points, as lists of coordinates.
+    """
+    columns = []
+    for _ in range(number_of_dimensions):
+        strata = list(range(number_of_points))
+        rng.shuffle(strata)
+        columns.append([(stratum + rng.random()) / number_of_points for stratum in strata])
+    return [list(point) for point in zip(*columns)]
+
+
+class AdaptiveSampler:
+    """
+    Choose the runs of an adaptive sweep round by round.
+
+    Args:
+        rules (dict): The ``rules`` section of the settings file.
+        output (str): Name of the reported scalar which guides the sampling.
+        initial (int, optional): Number of runs of the first round. Defaults to twice the
+            number of parameters plus two, and at least ten.
+        batch (int): Number of runs of every following round.
+        budget (int): Maximum total number of runs.
+        tolerance (float): Stop when the largest uncertainty, relative to the range of the
+            output, is smaller.
+        candidates (int): Number of random candidate points scored in every round.
+        exploration (float): Weight of the distance to the nearest run, relative to the
+            variation of the output, so regions where the output seems constant are still
+            explored.
+        seed (int, optional): Seed of the random number generator.
+        default_args (list, optional): Arguments which are passed to every run.
+        strategy (str): Must be ``adaptive``; accepted so the settings section can be
+            passed on as it is.
+    """
+
+    def __init__(
+        self,
+        rules,
+        output,
+        initial=None,
+        batch=10,
+        budget=100,
+        tolerance=0.0,
+        candidates=1000,
+        exploration=0.05,
+        seed=None,
+        default_args=None,
+        strategy="adaptive",
+    ):
+        if strategy != "adaptive":
+            raise ValueError(f"Unknown sampling strategy: {strategy}")
+        self.dimensions = get_dimensions(rules)
+        if not self.dimensions:
+            raise ValueError("Adaptive sampling needs at least one rule")
+        self.output = output
+        self.initial = initial or max(10, 2 * len(self.dimensions) + 2)
+        self.batch = batch
+        self.budget = budget
+        self.tolerance = tolerance
+        self.candidates = candidates
+        self.exploration = exploration
+        self.rng = random.Random(seed)
+
+        self.templates = []
+        for rule in rules.values():
+            self.templates.extend(rule.get("arguments") or [])
+        self.base_arguments = render_arguments(default_args, {})
+
+        self.number_of_runs = 0
+        self.points = {}
+        self.evaluated = []
+
+    def make_run(self, point):
+        """Create the run at a point of the unit cube."""
+        point = [dimension.snap(u) for dimension, u in zip(self.dimensions, point)]
+        parameters = {
+            dimension.key: dimension.get_value(u) for dimension, u in zip(self.dimensions, point)
+        }
+        run = Run(
+            index=self.number_of_runs,
+            parameters=parameters,
+            arguments=self.base_arguments + render_arguments(self.templates, parameters),
+        )
+        self.points[run.index] = point
+        self.number_of_runs += 1
+        return run
+
+    def add_result(self, result):
+        """
+        Learn from the result of a run.
+
+        Args:
+            result (RunResult): The result of a run of this sampler.
+        """
+        point = self.points.pop(result.index, None)
+        value = result.outputs.get(self.output)
+        if point is None or not result.success or not isinstance(value, (int, float)):
+            return
+        if math.isfinite(value):
+            self.evaluated.append((point, float(value)))
+
+    def distance(self, first, second):
+        """Euclidean distance between two points, scaled so the unit cube has diagonal 1."""
+        total = sum((a - b) ** 2 for a, b in zip(first, second))
+        return math.sqrt(total / len(self.dimensions))
+
+    def get_variation(self, point, value_range):
+        """
+        Get the uncertainty of the surrogate at a point, without the distance.
+
+        This is the range of the outputs of the nearest runs, relative to the range of all
+        outputs.
+        """
+        neighbours = sorted(
+            self.evaluated, key=lambda evaluated: self.distance(point, evaluated[0])
+        )[: len(self.dimensions) + 1]
+        values = [value for _, value in neighbours]
+        variation = (max(values) - min(values)) / value_range if value_range > 0 else 0.0
+        return variation + self.exploration
+
+    def next_round(self):
+        """
+        Choose the runs of the next round.
+
+        Returns:
+            list: The runs, or an empty list if the sampling is finished.
+        """
+        remaining = self.budget - self.number_of_runs
+        if remaining <= 0:
+            return []
+        if self.number_of_runs == 0:
+            points = latin_hypercube(min(self.initial, remaining), len(self.dimensions), self.rng)
+            return [self.make_run(point) for point in points]
+        if len(self.evaluated) < 2:
+            _logger.warning(f"Too few runs reported {self.output} to continue the sampling")
+            return []
+
+        values = [value for _, value in self.evaluated]
+        value_range = max(values) - min(values)
+        candidates = [[self.rng.random() for _ in self.dimensions] for _ in range(self.candidates)]
+        variations = [self.get_variation(candidate, value_range) for candidate in candidates]
+        nearest = [
+            min(self.distance(candidate, point) for point, _ in self.evaluated)
+            for candidate in candidates
+        ]
+
+        runs = []
+        for _ in range(min(self.batch, remaining)):
+            scores = [variation * distance for variation, distance in zip(variations, nearest)]
+            best = max(range(len(candidates)), key=scores.__getitem__)
+            if scores[best] < self.tolerance or scores[best] <= 0:
+                break
+            runs.append(self.make_run(candidates[best]))
+            # the new point reduces the uncertainty around it in this round already
+            nearest = [
+                min(distance, self.distance(candidate, candidates[best]))
+                for candidate, distance in zip(candidates, nearest)
+            ]
+        if not runs:
+            _logger.info("The uncertainty of the output is below the tolerance")
+        return runs
+
+
+def recall_result(run, cache, script):
+    """
+    Get the result of a run which finished in a previous sweep from the result cache.
+
+    Args:
+        run (Run): The run.
+        cache (ResultCache): The cache of previous results.
+        script (str or Path): The script of the sweep.
+
+    Returns:
+        RunResult or None: The cached result, or None if the run is not in the cache.
+    """
+    from parametric_simulator.executor import RunResult
+
+    cached_result = cache.get(cache.get_key(script, run.arguments))
+    if cached_result is None:
+        return None
+    return RunResult(index=run.index, parameters=run.parameters, cached=True, **cached_result)
+
+
+def iter_rounds(sampler, run_round, cache=None, script=None) -> Iterator:
+    """
+    Execute the rounds of an adaptive sweep.
+
+    Args:
+        sampler (AdaptiveSampler): Chooses the runs of every round.
+        run_round (callable): Executes a list of runs and yields their results, e.g.
+            :func:`~parametric_simulator.executor.run_sweep` with its arguments bound.
+        cache (ResultCache, optional): The cache of previous results. The runs of a round
+            which yield no result, because the journal records them as done, give the
+            sampler their outputs from the cache.
+        script (str or Path, optional): The script of the sweep, to find the runs in the
+            cache.
+
+    Yields:
+        RunResult: The result of every run. Like the runs of a grid sweep, the runs which
+        the journal skips are not yielded.
+    """
+    round_number = 0
+    while True:
+        runs = sampler.next_round()
+        if not runs:
+            return
+        round_number += 1
+        _logger.info(f"Starting round {round_number} with {len(runs)} runs")
+        finished = set()
+        for result in run_round(runs):
+            finished.add(result.index)
+            sampler.add_result(result)
+            yield result
+        if cache is None:
+            continue
+        for run in runs:
+            if run.index in finished:
+                continue
+            result = recall_result(run, cache, script)
+            if result is not None:
+                _logger.debug(f"Run {run.index} finished before, taking its outputs from the cache")
+                sampler.add_result(result)
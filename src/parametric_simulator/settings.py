@@ -0,0 +1,395 @@
+"""
+Resolution of the settings file with Hydra, and a cache of the resolved settings.
+
+The settings file is composed with `Hydra <https://hydra.cc>`_, so it can use:
+
+- a ``defaults`` list, which merges other YAML files from the directory of the settings
+  file, or from config groups in its subdirectories,
+- overrides from the command line, such as ``general.max_workers=8``, where a key which is
+  not in the settings yet is added with a ``+``, as in ``+cache.directory=cache``,
+- interpolation of other settings, such as ``${paths.results}/logs``.
+
+Argument templates such as ``--seed ${seed}`` are left alone: an interpolation of a single
+name which is not a section of the settings is filled in by the sweep instead.
+
+Overrides with the sweep syntax of Hydra set the values of a rule, so a sweep can be
+changed without editing the settings file::
+
+    parametric_simulator --settings_file sweep.yaml seed=1,2,3 mesh_size=range(10,50,10)
+
+Composing a large hierarchy of settings takes a while, so the resolved and validated
+settings are stored in a cache, keyed by the hashes of the input files and the
+overrides. Later launches with the same input read the cached settings without importing
+Hydra. The input files are the settings file and the files which Hydra loaded for its
+defaults list, including the chosen options of the config groups. The cache is stored in
+``$XDG_CACHE_HOME/parametric_simulator/settings``, and keeps the settings of the
+:data:`MAX_CACHED_SETTINGS` most recently used launches; older entries are removed when
+new settings are stored.
+Settings which read environment variables, the time or the Hydra runtime, such as
+``${hydra.runtime.cwd}``, are resolved on every launch.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+from pathlib import Path
+
+from parametric_simulator.cache import get_file_hash
+
+_logger = logging.getLogger(__name__)
+
+# the package defaults, which also define the known sections and keys of a settings file
+SCHEMA_FILE_NAME = Path(__file__).parent / "conf" / "config.yaml"
+
+# increase when the resolution changes, to invalidate the cached settings
+CACHE_FORMAT = 1
+
+# maximum number of cached settings, the least recently used are removed first
+MAX_CACHED_SETTINGS = 100
+
+# name under which the settings file is stored in the config store of Hydra
+CONFIG_NAME = "_parametric_simulator_settings"
+
+# interpolations which make the resolved settings differ between launches
+VOLATILE_INTERPOLATIONS = ("${oc.env:", "${now:", "${hydra")
+
+# settings of an iterator which give the values of a rule
+ITERATOR_VALUE_KEYS = ("values", "start", "end", "step", "linspace", "logspace")
+
+TEMPLATE_PATTERN = re.compile(r"(?<!\\)\$\{([A-Za-z_][A-Za-z0-9_]*)\}")
+
+
+def get_default_cache_directory():
+    """
+    Get the directory of the settings cache.
+
+    Returns:
+        Path: ``parametric_simulator/settings`` in ``$XDG_CACHE_HOME``, which defaults to
+        ``~/.cache``.
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "parametric_simulator" / "settings"
+
+
+def escape_templates(value, section_names):
+    """
+    Escape the argument templates in the settings, so OmegaConf leaves them alone.
+
+    Args:
+        value: The settings, or a part of them.
+        section_names (set): Names of the top-level sections, which can be interpolated.
+
+    Returns:
+        The settings with ``${name}`` replaced by ``\\${name}`` for every name which is not
+        a section.
+    """
+    if isinstance(value, dict):
+        return {key: escape_templates(item, section_names) for key, item in value.items()}
+    if isinstance(value, list):
+        return [escape_templates(item, section_names) for item in value]
+    if isinstance(value, str):
+        return TEMPLATE_PATTERN.sub(
+            lambda match: (
+                match.group(0) if match.group(1) in section_names else "\\" + match.group(0)
+            ),
+            value,
+        )
+    return value
+
+
+def get_sweep_iterator(sweep):
+    """
+    Translate a sweep override of Hydra into the iterator settings of a rule.
+
+    Args:
+        sweep: The ``ChoiceSweep``, ``RangeSweep`` or ``IntervalSweep`` of the override.
+
+    Returns:
+        dict: The iterator settings.
+
+    Raises:
+        ValueError: If the sweep cannot be expressed as an iterator.
+    """
+    from hydra.core.override_parser.types import ChoiceSweep, IntervalSweep, RangeSweep
+
+    if isinstance(sweep, ChoiceSweep):
+        return {"values": list(sweep.list)}
+    if isinstance(sweep, RangeSweep):
+        return {"start": sweep.start, "end": sweep.stop, "step": sweep.step}
+    if isinstance(sweep, IntervalSweep):
+        # an interval is a continuous domain, as sampled by the adaptive strategy
+        return {"linspace": {"start": sweep.start, "stop": sweep.end}}
+    raise ValueError(f"Unsupported sweep: {sweep}")
+
+
+def get_config_files(config_loader, overrides):
+    """
+    Get the files of the configs which Hydra loads for the settings file.
+
+    Args:
+        config_loader: The config loader of the initialized Hydra.
+        overrides (list): The overrides, without the sweeps.
+
+    Returns:
+        list: The YAML files of the defaults list, in the order in which they are loaded.
+        Configs which do not come from a file, such as those of Hydra itself, are left out.
+    """
+    from hydra.types import RunMode
+
+    defaults_list = config_loader.compute_defaults_list(
+        config_name=CONFIG_NAME, overrides=overrides, run_mode=RunMode.RUN
+    )
+    config_files = []
+    for default in defaults_list.defaults:
+        if default.config_path is None:
+            continue
+        loaded = config_loader.repository.load_config(default.config_path)
+        if loaded is not None and loaded.path.startswith("file://"):
+            config_files.append(Path(loaded.path[len("file://") :]) / f"{default.config_path}.yaml")
+    return config_files
+
+
+def compose_settings(settings_file, overrides=()):
+    """
+    Compose and resolve the settings file with Hydra.
+
+    Args:
+        settings_file (str or Path): The settings file.
+        overrides (list): Overrides in the syntax of Hydra.
+
+    Returns:
+        tuple: The resolved settings, and the input files from which they are composed:
+        the settings file and the files of its defaults list.
+
+    Raises:
+        ValueError: If the settings or the overrides are invalid.
+    """
+    from hydra import compose, initialize_config_dir
+    from hydra.core.config_store import ConfigStore
+    from hydra.core.global_hydra import GlobalHydra
+    from hydra.core.override_parser.overrides_parser import OverridesParser
+    from hydra.errors import HydraException
+    from omegaconf import OmegaConf
+    from omegaconf.errors import OmegaConfBaseException
+
+    settings_file = Path(settings_file).resolve()
+    try:
+        parsed_overrides = OverridesParser.create().parse_overrides(list(overrides))
+        sweeps = [override for override in parsed_overrides if override.is_sweep_override()]
+        other_overrides = [
+            override.input_line for override in parsed_overrides if not override.is_sweep_override()
+        ]
+        # the settings file is put in the config store, so it may have any suffix
+        ConfigStore.instance().store(name=CONFIG_NAME, node=OmegaConf.load(settings_file))
+        with initialize_config_dir(config_dir=str(settings_file.parent), version_base=None):
+            composed = compose(
+                config_name=CONFIG_NAME, return_hydra_config=True, overrides=other_overrides
+            )
+            config_files = get_config_files(GlobalHydra.instance().config_loader(), other_overrides)
+        settings = OmegaConf.to_container(composed, resolve=False)
+        settings = OmegaConf.create(escape_templates(settings, set(settings)))
+        # the hydra section can be interpolated, e.g. ${hydra.runtime.cwd}, but is dropped
+        settings = {
+            name: (
+                OmegaConf.to_container(section, resolve=True)
+                if OmegaConf.is_config(section)
+                else section
+            )
+            for name, section in settings.items()
+            if name != "hydra"
+        }
+    except (HydraException, OmegaConfBaseException) as err:
+        raise ValueError(f"Cannot resolve {settings_file}: {err}") from err
+
+    rules = settings.get("rules") or {}
+    for sweep in sweeps:
+        name = sweep.key_or_group
+        if name.startswith("rules."):
+            name = name[len("rules.") :]
+        if name not in rules:
+            raise ValueError(f"Sweep override {sweep.input_line} does not name a rule")
+        # the sweep replaces the values of the rule, but keeps its key and zip name
+        iterator = {
+            key: value
+            for key, value in (rules[name].get("iterator") or {}).items()
+            if key not in ITERATOR_VALUE_KEYS
+        }
+        rules[name]["iterator"] = {**iterator, **get_sweep_iterator(sweep.value())}
+    return settings, [settings_file] + config_files
+
+
+def validate_settings(settings):
+    """
+    Check the structure of the resolved settings.
+
+    Keys which the package defaults do not know are reported as warnings, as they are
+    most likely misspelled.
+
+    Args:
+        settings (dict): The resolved settings.
+
+    Raises:
+        ValueError: If a section or a rule is not a mapping.
+    """
+    import yaml
+
+    with open(SCHEMA_FILE_NAME) as stream:
+        schema = yaml.safe_load(stream)
+
+    for section_name, section in settings.items():
+        if section_name not in schema:
+            _logger.warning(f"Unknown section in the settings: {section_name}")
+            continue
+        if section is None:
+            continue
+        if not isinstance(section, dict):
+            raise ValueError(f"The {section_name} section of the settings must be a mapping")
+        if section_name == "rules":
+            for rule_name, rule in section.items():
+                if not isinstance(rule, dict) or not isinstance(rule.get("iterator"), dict):
+                    raise ValueError(f"Rule {rule_name} must be a mapping with an iterator")
+                if not isinstance(rule.get("arguments") or [], list):
+                    raise ValueError(f"The arguments of rule {rule_name} must be a list")
+            continue
+        if schema[section_name] is None:
+            # a section of which the user chooses the names, such as the inputs
+            continue
+        for key in section:
+            if key not in schema[section_name]:
+                _logger.warning(f"Unknown setting: {section_name}.{key}")
+
+
+def get_cache_key(settings_file, overrides):
+    """
+    Get the key of the cached settings of a settings file and overrides.
+
+    Args:
+        settings_file (Path): The resolved path of the settings file.
+        overrides (list): The overrides.
+
+    Returns:
+        str: The hexadecimal key.
+    """
+    identity = {
+        "format": CACHE_FORMAT,
+        "settings_file": str(settings_file),
+        "hash": get_file_hash(settings_file),
+        "overrides": list(overrides),
+    }
+    return hashlib.sha256(json.dumps(identity, sort_keys=True).encode()).hexdigest()
+
+
+def read_cached_settings(cache_file_name):
+    """
+    Read cached settings if none of their input files changed.
+
+    Args:
+        cache_file_name (Path): The cache file.
+
+    Returns:
+        dict or None: The settings, or None if there are no valid cached settings.
+    """
+    try:
+        with open(cache_file_name) as stream:
+            entry = json.load(stream)
+    except (OSError, ValueError):
+        return None
+    for file_name, file_hash in entry["inputs"].items():
+        if get_file_hash(file_name) != file_hash:
+            _logger.debug(f"{file_name} changed since the settings were cached")
+            return None
+    try:
+        # mark the settings as recently used, so they are removed last
+        os.utime(cache_file_name)
+    except OSError:
+        pass
+    return entry["settings"]
+
+
+def remove_old_settings(cache_directory, max_entries=MAX_CACHED_SETTINGS):
+    """
+    Remove the least recently used cached settings beyond the maximum number.
+
+    Args:
+        cache_directory (Path): Directory of the settings cache.
+        max_entries (int): Maximum number of cached settings.
+    """
+    entries = []
+    for file_name in cache_directory.glob("*.json"):
+        try:
+            entries.append((file_name.stat().st_mtime, file_name))
+        except OSError:
+            continue
+    if len(entries) <= max_entries:
+        return
+    entries.sort(reverse=True)
+    for _, file_name in entries[max_entries:]:
+        _logger.debug(f"Removing the old cached settings {file_name}")
+        file_name.unlink(missing_ok=True)
+
+
+def write_cached_settings(cache_file_name, settings, input_files, max_entries=MAX_CACHED_SETTINGS):
+    """
+    Store resolved settings together with the hashes of their input files.
+
+    Args:
+        cache_file_name (Path): The cache file.
+        settings (dict): The resolved settings.
+        input_files (list): The files from which the settings were resolved.
+        max_entries (int): Maximum number of cached settings, see
+            :func:`remove_old_settings`.
+    """
+    entry = {
+        "inputs": {str(file_name): get_file_hash(file_name) for file_name in input_files},
+        "settings": settings,
+    }
+    temporary_file_name = cache_file_name.with_name(f"{cache_file_name.name}.{os.getpid()}.tmp")
+    try:
+        cache_file_name.parent.mkdir(parents=True, exist_ok=True)
+        with open(temporary_file_name, "w") as stream:
+            json.dump(entry, stream)
+        os.replace(temporary_file_name, cache_file_name)
+    except (OSError, TypeError, ValueError) as err:
+        # settings which JSON cannot store are simply not cached
+        _logger.debug(f"Could not cache the settings in {cache_file_name}: {err}")
+        temporary_file_name.unlink(missing_ok=True)
+        return
+    remove_old_settings(cache_file_name.parent, max_entries)
+
+
+def load_settings(settings_file, overrides=(), cache_directory=None):
+    """
+    Get the resolved and validated settings of a settings file.
+
+    Args:
+        settings_file (str or Path): The settings file.
+        overrides (list): Overrides in the syntax of Hydra.
+        cache_directory (str or Path, optional): Directory of the settings cache. Defaults
+            to :func:`get_default_cache_directory`.
+
+    Returns:
+        dict: The settings.
+
+    Raises:
+        ValueError: If the settings or the overrides are invalid.
+    """
+    settings_file = Path(settings_file).resolve()
+    overrides = list(overrides or [])
+    cache_directory = Path(cache_directory or get_default_cache_directory())
+    cache_file_name = cache_directory / f"{get_cache_key(settings_file, overrides)}.json"
+
+    settings = read_cached_settings(cache_file_name)
+    if settings is not None:
+        _logger.debug(f"Using the cached settings in {cache_file_name}")
+        return settings
+
+    settings, input_files = compose_settings(settings_file, overrides)
+    validate_settings(settings)
+    texts = [file_name.read_text() for file_name in input_files] + overrides
+    if any(interpolation in text for text in texts for interpolation in VOLATILE_INTERPOLATIONS):
+        _logger.debug("The settings depend on the environment, not caching them")
+    else:
+        write_cached_settings(cache_file_name, settings, input_files)
+    return settings
@@ -0,0 +1,224 @@
+"""
+A working directory for every run, staged from a template directory.
+
+Every run is executed in its own directory, which starts as a copy of a template with the
+input files of the script. In the settings file::
+
+    staging:
+      template: case_template
+      directory: runs
+      method: reflink
+      cleanup: archive
+      archive: runs_archive
+
+Copying the template for thousands of runs costs more I/O than many short runs compute,
+so the files are staged with the cheapest method the file system supports:
+
+- ``reflink``: the files are cloned copy-on-write, e.g. on Btrfs and XFS. A run which
+  writes to a file changes its own copy only. This is the default.
+- ``hardlink``: the files are hard links to the template. This is only safe when the runs
+  do not write to the template files, as the run directories share them with the
+  template.
+- ``copy``: the files are copied.
+
+Reflinks and hard links fall back to copying where the file system does not support
+them, e.g. when the run directories are on another file system than the template.
+
+After the results of a run are collected, its directory is kept, deleted, or packed into
+a ``.tar.gz`` file in the ``archive`` directory. Deleting and archiving happen in a
+background thread, so they do not hold up the sweep. A new attempt of a run, e.g. after a
+checkpoint, waits until the directory of the previous attempt is cleaned up. The
+directories of failed runs are kept for inspection unless ``keep_failed`` is false.
+"""
+
+import errno
+import logging
+import os
+import shutil
+import tarfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+_logger = logging.getLogger(__name__)
+
+METHODS = ("reflink", "hardlink", "copy")
+CLEANUPS = ("keep", "delete", "archive")
+
+# the ioctl which clones a file on Linux, from <linux/fs.h>
+FICLONE = 0x40049409
+
+# errors which mean the file system cannot link or clone the file
+UNSUPPORTED_ERRORS = (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.EPERM)
+
+
+def clone_file(source, destination):
+    """
+    Create a copy-on-write clone of a file.
+
+    Args:
+        source (str or Path): The file to clone.
+        destination (str or Path): The new file.
+
+    Raises:
+        OSError: If the file system cannot clone the file.
+    """
+    import fcntl
+
+    with open(source, "rb") as source_stream, open(destination, "wb") as destination_stream:
+        try:
+            fcntl.ioctl(destination_stream.fileno(), FICLONE, source_stream.fileno())
+        except OSError:
+            destination_stream.close()
+            os.unlink(destination)
+            raise
+    shutil.copystat(source, destination)
+
+
+class Stager:
+    """
+    Create and clean up the working directories of the runs.
+
+    Args:
+        template (str or Path): The template directory.
+        directory (str or Path): Directory in which the run directories are created.
+        method (str): One of :data:`METHODS`.
+        cleanup (str): One of :data:`CLEANUPS`.
+        archive (str or Path, optional): Directory of the archives, for ``cleanup:
+            archive``. Defaults to ``directory``.
+        keep_failed (bool): Keep the directories of failed runs regardless of ``cleanup``.
+    """
+
+    def __init__(
+        self,
+        template,
+        directory,
+        method="reflink",
+        cleanup="keep",
+        archive=None,
+        keep_failed=True,
+    ):
+        if method not in METHODS:
+            raise ValueError(f"The staging method must be one of {METHODS}: {method}")
+        if cleanup not in CLEANUPS:
+            raise ValueError(f"The staging cleanup must be one of {CLEANUPS}: {cleanup}")
+        self.template = Path(template)
+        if not self.template.is_dir():
+            raise ValueError(f"The staging template is not a directory: {template}")
+        self.directory = Path(directory)
+        self.method = method
+        self.cleanup = cleanup
+        self.archive = Path(archive) if archive is not None else self.directory
+        self.keep_failed = keep_failed
+
+        # the tree of the template is listed once, instead of for every run
+        self.directories = []
+        self.files = []
+        self.links = []
+        for root, directory_names, file_names in os.walk(self.template):
+            relative_root = Path(root).relative_to(self.template)
+            for name in directory_names:
+                if os.path.islink(os.path.join(root, name)):
+                    self.links.append(relative_root / name)
+                else:
+                    self.directories.append(relative_root / name)
+            for name in file_names:
+                if os.path.islink(os.path.join(root, name)):
+                    self.links.append(relative_root / name)
+                else:
+                    self.files.append(relative_root / name)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.executor = None
+        # the clean-up of every released run which has not finished yet
+        self.cleanups = {}
+
+    def get_run_directory(self, index):
+        """Get the working directory of a run."""
+        return self.directory / f"run_{index:06d}"
+
+    def stage_file(self, source, destination):
+        """
+        Stage a file of the template with the method of the stager.
+
+        When the file system does not support the method, the stager falls back to
+        copying for the rest of the sweep.
+        """
+        if self.method != "copy":
+            try:
+                if self.method == "reflink":
+                    clone_file(source, destination)
+                else:
+                    os.link(source, destination)
+                return
+            except OSError as err:
+                if err.errno not in UNSUPPORTED_ERRORS:
+                    raise
+                _logger.info(f"Cannot stage {source} with a {self.method}, copying the files")
+                self.method = "copy"
+        shutil.copy2(source, destination)
+
+    def stage(self, index):
+        """
+        Create the working directory of a run from the template.
+
+        The directory of a previous attempt of the run is removed first, after its clean-up
+        in the background thread finished.
+
+        Args:
+            index (int): The index of the run.
+
+        Returns:
+            Path: The working directory.
+        """
+        cleanup = self.cleanups.get(index)
+        if cleanup is not None:
+            cleanup.result()
+        run_directory = self.get_run_directory(index)
+        if run_directory.exists():
+            shutil.rmtree(run_directory)
+        run_directory.mkdir()
+        for path in self.directories:
+            (run_directory / path).mkdir()
+        for path in self.links:
+            os.symlink(os.readlink(self.template / path), run_directory / path)
+        for path in self.files:
+            self.stage_file(self.template / path, run_directory / path)
+        return run_directory
+
+    def release(self, index, success):
+        """
+        Clean up the working directory of a run of which the results are collected.
+
+        Args:
+            index (int): The index of the run.
+            success (bool): Whether the run succeeded.
+        """
+        if self.cleanup == "keep" or (self.keep_failed and not success):
+            return
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1)
+        cleanup = self.executor.submit(self.clean_up, self.get_run_directory(index))
+        self.cleanups[index] = cleanup
+        cleanup.add_done_callback(lambda cleanup: self.forget_cleanup(index, cleanup))
+
+    def forget_cleanup(self, index, cleanup):
+        """Remove a finished clean-up, unless a later attempt of the run was released."""
+        if self.cleanups.get(index) is cleanup:
+            del self.cleanups[index]
+
+    def clean_up(self, run_directory):
+        """Delete or archive the working directory of a run, in the background thread."""
+        try:
+            if self.cleanup == "archive":
+                self.archive.mkdir(parents=True, exist_ok=True)
+                archive_file_name = self.archive / f"{run_directory.name}.tar.gz"
+                with tarfile.open(archive_file_name, "w:gz") as archive:
+                    archive.add(run_directory, arcname=run_directory.name)
+            shutil.rmtree(run_directory)
+        except OSError as err:
+            _logger.warning(f"Could not clean up {run_directory}: {err}")
+
+    def close(self):
+        """Wait until the directories of all released runs are cleaned up."""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
@@ -0,0 +1,321 @@
+"""
+Expansion of the ``rules`` section of a settings file into individual runs.
+
+Each rule describes one axis of the parameter sweep. A rule has an ``iterator`` that
+yields the values of its ``key`` and a list of ``arguments`` templates in which
+``${key}`` is replaced by the current value, e.g.::
+
+    rules:
+      seed:
+        arguments:
+          - --seed ${seed}
+        iterator:
+          key: seed
+          start: 0
+          end: 20
+          step: 1
+
+The values of a rule are given either as a list with ``values``, as a range with ``start``,
+``end`` and ``step``, or with ``linspace`` or ``logspace`` (taking ``start``, ``stop``,
+``num`` and, for ``logspace``, ``base``), as in NumPy.
+
+The runs of a sweep are the cartesian product of all the rules. Rules sharing the same
+``zip`` name are not crossed but advance together, like the builtin :func:`zip`.
+
+The expansion is lazy: runs are generated one at a time while the sweep is executed, so
+the memory use does not depend on the size of the sweep.
+"""
+
+import logging
+import math
+import shlex
+from dataclasses import dataclass, field
+from string import Template
+from typing import Dict, Iterator, List
+
+_logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Run:
+    """
+    A single run of the script with one combination of the sweep parameters.
+
+    Attributes:
+        index (int): Sequence number of the run within the sweep.
+        parameters (dict): Mapping of parameter name to its value for this run.
+        arguments (list): Command-line arguments passed to the script.
+    """
+
+    index: int
+    parameters: Dict[str, object] = field(default_factory=dict)
+    arguments: List[str] = field(default_factory=list)
+
+
+def iter_range(start, end, step):
+    """
+    Iterate over a range of (possibly floating point) numbers, excluding ``end``.
+
+    The values are computed as ``start + i * step`` so rounding errors do not accumulate.
+
+    Args:
+        start (float): First value.
+        end (float): End of the range, which is not included.
+        step (float): Increment between the values. May be negative.
+
+    Yields:
+        float: The values of the range.
+
+    Raises:
+        ValueError: If the step is zero.
+    """
+    if step == 0:
+        raise ValueError("The step of a range may not be zero")
+    count = 0
+    value = start
+    while (step > 0 and value < end) or (step < 0 and value > end):
+        yield value
+        count += 1
+        value = start + count * step
+
+
+def iter_linspace(start, stop, num=50, endpoint=True):
+    """
+    Iterate over evenly spaced numbers over an interval, as :func:`numpy.linspace`.
+
+    Args:
+        start (float): First value.
+        stop (float): Last value, if ``endpoint`` is True.
+        num (int): Number of values.
+        endpoint (bool): Whether ``stop`` is included.
+
+    Yields:
+        float: The values of the interval.
+    """
+    if num <= 0:
+        return
+    divisor = num - 1 if endpoint else num
+    if divisor == 0:
+        yield start
+        return
+    step = (stop - start) / divisor
+    for count in range(num):
+        yield stop if endpoint and count == num - 1 else start + count * step
+
+
+def iter_logspace(start, stop, num=50, endpoint=True, base=10.0):
+    """
+    Iterate over numbers evenly spaced on a log scale, as :func:`numpy.logspace`.
+
+    Args:
+        start (float): ``base ** start`` is the first value.
+        stop (float): ``base ** stop`` is the last value, if ``endpoint`` is True.
+        num (int): Number of values.
+        endpoint (bool): Whether ``base ** stop`` is included.
+        base (float): Base of the log space.
+
+    Yields:
+        float: The values of the interval.
+    """
+    for exponent in iter_linspace(start, stop, num=num, endpoint=endpoint):
+        yield base**exponent
+
+
+def iter_axis_values(iterator) -> Iterator:
+    """
+    Iterate over the values described by the ``iterator`` section of a rule.
+
+    Args:
+        iterator (dict): The iterator settings of a rule.
+
+    Yields:
+        The values of the iterator.
+
+    Raises:
+        ValueError: If the iterator does not describe any values.
+    """
+    if "values" in iterator:
+        yield from iterator["values"]
+    elif "linspace" in iterator:
+        yield from iter_linspace(**iterator["linspace"])
+    elif "logspace" in iterator:
+        yield from iter_logspace(**iterator["logspace"])
+    elif "end" in iterator:
+        yield from iter_range(iterator.get("start", 0), iterator["end"], iterator.get("step", 1))
+    else:
+        raise ValueError(
+            f"Iterator {iterator} needs one of 'values', 'linspace', 'logspace' or 'end'"
+        )
+
+
+def count_axis_values(iterator):
+    """
+    Count the values of the ``iterator`` section of a rule without storing them.
+
+    Args:
+        iterator (dict): The iterator settings of a rule.
+
+    Returns:
+        int: The number of values.
+    """
+    if "values" in iterator:
+        return len(iterator["values"])
+    for name in ("linspace", "logspace"):
+        if name in iterator:
+            return max(iterator[name].get("num", 50), 0)
+    if "end" not in iterator:
+        raise ValueError(
+            f"Iterator {iterator} needs one of 'values', 'linspace', 'logspace' or 'end'"
+        )
+    start = iterator.get("start", 0)
+    step = iterator.get("step", 1)
+    count = max(math.ceil((iterator["end"] - start) / step), 0)
+    # guard against rounding of the division for floating point ranges
+    while count > 0 and not _in_range(start + (count - 1) * step, iterator["end"], step):
+        count -= 1
+    return count
+
+
+def _in_range(value, end, step):
+    return value < end if step > 0 else value > end
+
+
+def render_arguments(templates, parameters):
+    """
+    Fill in the parameters in a list of argument templates.
+
+    Every template may contain multiple whitespace separated arguments, which are split
+    with shell-like syntax after the substitution.
+
+    Args:
+        templates (list): Argument templates, e.g. ``["--seed ${seed}"]``.
+        parameters (dict): Values to substitute into the templates.
+
+    Returns:
+        list: The rendered command-line arguments.
+    """
+    arguments = []
+    for template in templates or []:
+        rendered = Template(str(template)).safe_substitute(parameters)
+        arguments.extend(shlex.split(rendered))
+    return arguments
+
+
+def get_axes(rules):
+    """
+    Group the rules of a settings file into the axes of the sweep.
+
+    Every rule is an axis of its own, except for rules with the same ``zip`` name, which
+    are combined into a single axis.
+
+    Args:
+        rules (dict or None): The ``rules`` section of the settings file.
+
+    Returns:
+        list: For every axis a list of ``(key, iterator)`` tuples.
+    """
+    axes = []
+    zipped = {}
+    for name, rule in (rules or {}).items():
+        iterator = rule.get("iterator") or {}
+        entry = (iterator.get("key", name), iterator)
+        group = rule.get("zip")
+        if group is None:
+            axes.append([entry])
+        elif group in zipped:
+            zipped[group].append(entry)
+        else:
+            zipped[group] = [entry]
+            axes.append(zipped[group])
+    return axes
+
+
+def get_parameter_names(rules):
+    """
+    Get the names of the parameters of the sweep.
+
+    Args:
+        rules (dict or None): The ``rules`` section of the settings file.
+
+    Returns:
+        list: The keys of all the rules.
+    """
+    return [key for axis in get_axes(rules) for key, _ in axis]
+
+
+def _iter_axis(axis):
+    """Yield the parameters of one axis as dicts, zipping the iterators of the axis."""
+    keys = [key for key, _ in axis]
+    iterators = [iter_axis_values(iterator) for _, iterator in axis]
+    sentinel = object()
+    while True:
+        values = [next(iterator, sentinel) for iterator in iterators]
+        exhausted = [value is sentinel for value in values]
+        if all(exhausted):
+            return
+        if any(exhausted):
+            raise ValueError(f"Zipped parameters {keys} have different numbers of values")
+        yield dict(zip(keys, values))
+
+
+def iter_parameter_sets(rules) -> Iterator[Dict[str, object]]:
+    """
+    Iterate lazily over all the parameter combinations of the sweep.
+
+    Unlike :func:`itertools.product`, the values of an axis are not stored but generated
+    again for every combination of the preceding axes.
+
+    Args:
+        rules (dict or None): The ``rules`` section of the settings file.
+
+    Yields:
+        dict: Mapping of parameter name to value for one combination.
+    """
+
+    def product(axes, parameters):
+        if not axes:
+            yield dict(parameters)
+            return
+        for axis_parameters in _iter_axis(axes[0]):
+            yield from product(axes[1:], {**parameters, **axis_parameters})
+
+    yield from product(get_axes(rules), {})
+
+
+def count_runs(rules):
+    """
+    Count the number of runs of the sweep without expanding it.
+
+    Args:
+        rules (dict or None): The ``rules`` section of the settings file.
+
+    Returns:
+        int: The number of runs.
+    """
+    number_of_runs = 1
+    for axis in get_axes(rules):
+        number_of_runs *= min(count_axis_values(iterator) for _, iterator in axis)
+    return number_of_runs
+
+
+def iter_runs(rules, default_args=None) -> Iterator[Run]:
+    """
+    Expand the rules of a settings file lazily into the runs of the sweep.
+
+    Args:
+        rules (dict or None): The ``rules`` section of the settings file.
+        default_args (list, optional): Arguments which are passed to every run.
+
+    Yields:
+        Run: A run for every combination of the rule values. Without any rules, a single
+        run with only the default arguments is generated.
+    """
+    templates = []
+    for rule in (rules or {}).values():
+        templates.extend(rule.get("arguments") or [])
+
+    base_arguments = render_arguments(default_args, {})
+
+    for index, parameters in enumerate(iter_parameter_sets(rules)):
+        arguments = base_arguments + render_arguments(templates, parameters)
+        yield Run(index=index, parameters=parameters, arguments=arguments)
@@ -0,0 +1,276 @@
+"""
+Execution of blocks of runs with a single call of a vectorized script.
+
+Models which are cheap closed-form or NumPy code can evaluate thousands of parameter
+points in one call. Such a script defines a ``main_batch(parameters)`` function, which is
+given a dict with a NumPy array of the values of every parameter, and returns a dict with
+an array of the values of every output::
+
+    def main_batch(parameters):
+        seconds = parameters["sleep"] * np.vectorize(UNITS.get)(parameters["units"])
+        return {"number_of_seconds": seconds}
+
+The runs of the sweep are taken in blocks of ``block_size`` runs, and every block is
+evaluated with one call in a pool of worker processes, which are forked from the simulator
+after it imported the script. An output may also be a scalar, which is the same for all
+runs of the block. The outputs of every run are stored as if the run reported them.
+
+The batch function only gets the parameters of the sweep, not the command-line arguments
+of the runs, so the default arguments of the settings are not used. Runs are still
+recorded in the journal and the result cache by their arguments. If the call fails, or
+kills its worker process, all runs of the block fail. In the settings file::
+
+    general:
+      execution_mode: vectorized
+      block_size: 1024
+"""
+
+import logging
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterator
+
+from parametric_simulator.executor import (
+    BATCH_FUNCTION_NAME,
+    RunResult,
+    check_run,
+    finish_run,
+    get_default_max_workers,
+    get_fork_context,
+    get_script_main,
+)
+from parametric_simulator.instrumentation import InProcessUsage
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_BLOCK_SIZE = 1024
+
+# resource usage which is divided over the runs of a block
+SHARED_USAGE_FIELDS = ("wall_time", "user_time", "system_time", "read_bytes", "write_bytes")
+
+# the batch function of the script of the workers
+_batch_function = None
+
+
+def initialize_worker(script):
+    """
+    Prepare a worker process for the vectorized execution of the script.
+
+    Args:
+        script (str or Path): The Python script with a ``main_batch(parameters)`` function.
+    """
+    global _batch_function
+    _batch_function = get_script_main(script, BATCH_FUNCTION_NAME)
+
+
+def get_columns(runs):
+    """
+    Get the parameters of a block of runs as columns.
+
+    Args:
+        runs (list): The :class:`~parametric_simulator.sweep.Run` objects of the block.
+
+    Returns:
+        dict: An array with the values of every parameter, in the order of the runs.
+    """
+    import numpy as np
+
+    names = dict.fromkeys(name for run in runs for name in run.parameters)
+    return {name: np.asarray([run.parameters.get(name) for run in runs]) for name in names}
+
+
+def get_output_columns(outputs, number_of_runs):
+    """
+    Check the outputs of a block of runs, and convert them to lists.
+
+    Args:
+        outputs (dict): The outputs returned by the batch function.
+        number_of_runs (int): The number of runs of the block.
+
+    Returns:
+        dict: A list with the value of every output for every run of the block.
+
+    Raises:
+        ValueError: If an output is not a scalar or an array with a value for every run.
+    """
+    import numpy as np
+
+    columns = {}
+    for name, value in outputs.items():
+        column = np.asarray(value)
+        if column.ndim == 0:
+            columns[name] = [column.item()] * number_of_runs
+        elif column.shape == (number_of_runs,):
+            columns[name] = column.tolist()
+        else:
+            raise ValueError(
+                f"Output {name} has shape {column.shape} instead of ({number_of_runs},)"
+            )
+    return columns
+
+
+def execute_block(columns, number_of_runs):
+    """
+    Call the batch function of the script for a block of runs in the current worker.
+
+    Args:
+        columns (dict): The parameters of the runs, as returned by :func:`get_columns`.
+        number_of_runs (int): The number of runs of the block.
+
+    Returns:
+        tuple: The exit code of the call, a dict with its resource usage, see
+        :data:`~parametric_simulator.instrumentation.USAGE_FIELDS`, and the outputs of the
+        runs, as returned by :func:`get_output_columns`.
+    """
+    outputs = {}
+    with InProcessUsage() as measurement:
+        try:
+            outputs = get_output_columns(_batch_function(columns) or {}, number_of_runs)
+            returncode = 0
+        except Exception:
+            _logger.error(f"Block of {number_of_runs} runs failed:\n{traceback.format_exc()}")
+            returncode = 1
+    return returncode, measurement.usage, outputs
+
+
+def get_usage_share(usage, number_of_runs):
+    """
+    Divide the resource usage of a block over its runs.
+
+    Args:
+        usage (dict): The resource usage of the block.
+        number_of_runs (int): The number of runs of the block.
+
+    Returns:
+        dict: The resource usage of every run. The peak memory is that of the block.
+    """
+    share = dict(usage)
+    for name in SHARED_USAGE_FIELDS:
+        if share.get(name) is not None:
+            share[name] = share[name] / number_of_runs
+    return share
+
+
+def run_sweep_vectorized(
+    script,
+    runs,
+    max_workers=None,
+    block_size=None,
+    queue_size=None,
+    cache=None,
+    journal=None,
+    monitor=None,
+) -> Iterator[RunResult]:
+    """
+    Run the sweep in blocks, with one call of the batch function of the script per block.
+
+    Like :func:`~parametric_simulator.executor.run_sweep`, the runs are consumed lazily:
+    at most ``queue_size`` blocks are submitted to the pool at any time.
+
+    Args:
+        script (str or Path): The Python script with a ``main_batch(parameters)`` function.
+        runs (iterable): The :class:`~parametric_simulator.sweep.Run` objects to execute.
+        max_workers (int, optional): Number of blocks to execute at the same time.
+            Defaults to the number of CPU cores.
+        block_size (int, optional): Number of runs of a block. Defaults to
+            :data:`DEFAULT_BLOCK_SIZE`.
+        queue_size (int, optional): Maximum number of submitted blocks which have not yet
+            finished. Defaults to twice the number of workers.
+        cache (ResultCache, optional): The cache of previous results.
+        journal (RunJournal, optional): The journal of the sweep.
+        monitor (SweepMonitor, optional): Is informed of every submitted and finished run.
+
+    Yields:
+        RunResult: The result of every run, by block in order of completion.
+    """
+    max_workers = max_workers or get_default_max_workers()
+    block_size = max(block_size or DEFAULT_BLOCK_SIZE, 1)
+    queue_size = max(queue_size or 2 * max_workers, max_workers)
+    _logger.info(f"Running {script} vectorized in blocks of {block_size} runs")
+
+    # import the script once in the parent, so forked workers start warmed up
+    get_script_main(script, BATCH_FUNCTION_NAME)
+    pool_arguments = {"initializer": initialize_worker, "initargs": (str(script),)}
+    pool_arguments["mp_context"] = get_fork_context()
+
+    runs = iter(runs)
+    pending = {}
+    # the time at which every block was submitted, for the runs lost with a broken pool
+    submitted = {}
+    exhausted = False
+    executor = ProcessPoolExecutor(max_workers=max_workers, **pool_arguments)
+    try:
+
+        def submit(block):
+            columns = get_columns([pending_run.run for pending_run in block])
+            future = executor.submit(execute_block, columns, len(block))
+            pending[future] = block
+            submitted[future] = time.perf_counter()
+            if monitor is not None:
+                for pending_run in block:
+                    monitor.run_submitted(pending_run.run)
+
+        # finish the runs of a block, and return whether the pool is broken
+        def collect(future):
+            block = pending.pop(future)
+            start = submitted.pop(future)
+            broken = False
+            try:
+                returncode, usage, columns = future.result()
+            except BrokenProcessPool:
+                # a worker died, e.g. by a crash of the batch function, and took its block
+                broken = True
+                returncode, usage, columns = 1, {"wall_time": time.perf_counter() - start}, {}
+                _logger.error(f"Block of {len(block)} runs was lost with a worker process")
+            usage = get_usage_share(usage, len(block))
+            for position, pending_run in enumerate(block):
+                outputs = {name: column[position] for name, column in columns.items()}
+                result = finish_run(
+                    pending_run, returncode, usage, cache, journal, reports=(outputs, {})
+                )
+                if monitor is not None:
+                    monitor.run_finished(result)
+                yield result
+            return broken
+
+        while True:
+            block = []
+            while not exhausted and len(pending) < queue_size:
+                run = next(runs, None)
+                if run is None:
+                    exhausted = True
+                    break
+                pending_run = check_run(script, run, cache, journal)
+                if pending_run is None:
+                    continue
+                if isinstance(pending_run, RunResult):
+                    if monitor is not None:
+                        monitor.run_finished(pending_run)
+                    yield pending_run
+                    continue
+                block.append(pending_run)
+                if len(block) >= block_size:
+                    submit(block)
+                    block = []
+            if block:
+                submit(block)
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                broken = (yield from collect(future)) or broken
+            if broken:
+                # all blocks in the pool are lost with it; start a new pool for the other runs
+                done, _ = wait(pending)
+                for future in done:
+                    yield from collect(future)
+                executor.shutdown(wait=True)
+                _logger.error("A worker process died unexpectedly, starting a new pool")
+                pool_arguments["mp_context"] = get_fork_context()
+                executor = ProcessPoolExecutor(max_workers=max_workers, **pool_arguments)
+    finally:
+        executor.shutdown(wait=True)
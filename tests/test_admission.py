@@ -0,0 +1,88 @@
+from pathlib import Path
+
+import pytest
+
+from parametric_simulator.admission import MemoryAdmission, parse_size
+from parametric_simulator.async_executor import run_sweep_async
+from parametric_simulator.executor import RunResult, run_sweep
+from parametric_simulator.expressions import evaluate_expression
+from parametric_simulator.sweep import Run
+
+__author__ = "Eelco van Vliet"
+__copyright__ = "Eelco van Vliet"
+__license__ = "MIT"
+
+SLEEPING = Path(__file__).parents[1] / "examples" / "sleeping.py"
+
+
+class RecordingAdmission(MemoryAdmission):
+    """Memory admission which records the largest number of runs admitted at once."""
+
+    max_admitted = 0
+
+    def try_admit(self, run):
+        admitted = super().try_admit(run)
+        self.max_admitted = max(self.max_admitted, len(self.admitted))
+        return admitted
+
+
+def test_parse_size():
+    assert parse_size(1000) == 1000
+    assert parse_size("512MiB") == 512 * 1024**2
+    assert parse_size("1.5 GB") == 1_500_000_000
+    with pytest.raises(ValueError):
+        parse_size("many")
+
+
+def test_evaluate_expression():
+    variables = {"mesh_size": 10, "solver": "direct"}
+    assert evaluate_expression("100 + 8 * mesh_size ** 3", variables) == 8100
+    assert evaluate_expression("max(mesh_size, 20) if solver == 'direct' else 0", variables) == 20
+    for expression in ("__import__('os')", "mesh_size.real", "unknown + 1", "1 +"):
+        with pytest.raises(ValueError):
+            evaluate_expression(expression, variables)
+
+
+def test_memory_admission():
+    admission = MemoryAdmission("1KB", estimate="size", group_by=["size"], margin=1.0)
+    small = Run(index=0, parameters={"size": 300})
+    large = Run(index=1, parameters={"size": 900})
+    assert admission.try_admit(small)
+    assert not admission.try_admit(large)
+    assert admission.try_admit(Run(index=2, parameters={"size": 600}))
+
+    # the learned peak memory of a group replaces the declared estimate
+    admission.release(RunResult(index=0, parameters={"size": 300}, peak_rss=100))
+    assert admission.estimate(small) == 100
+    assert admission.estimate(large) == 900
+
+    # a run larger than the budget is admitted on its own
+    admission.release(RunResult(index=2, parameters={"size": 600}, peak_rss=600))
+    assert admission.try_admit(Run(index=3, parameters={"size": 5000}))
+    assert not admission.try_admit(small)
+
+
+def test_memory_admission_default():
+    admission = MemoryAdmission("1GB", max_workers=4)
+    run = Run(index=0, parameters={"size": 1})
+    assert admission.estimate(run) == 250_000_000
+    admission.release(RunResult(index=0, peak_rss=1000))
+    assert admission.estimate(run) == 1200
+
+
+@pytest.mark.parametrize("engine", ["subprocess", "asyncio"])
+def test_run_sweep_with_admission(engine):
+    runs = [
+        Run(index=index, parameters={"size": size}, arguments=["--sleep", "0.05"])
+        for index, size in enumerate([600, 600, 300, 300, 300])
+    ]
+    admission = RecordingAdmission(1000, estimate="size", group_by=["size"], margin=1.0)
+    if engine == "asyncio":
+        results = list(run_sweep_async(SLEEPING, runs, max_workers=4, admission=admission))
+    else:
+        results = list(run_sweep(SLEEPING, runs, max_workers=4, admission=admission))
+    assert sorted(result.index for result in results) == [0, 1, 2, 3, 4]
+    assert all(result.success for result in results)
+    # the 600 byte runs cannot run together, and never more than three 300 byte runs
+    assert admission.max_admitted <= 3
+    assert not admission.admitted
@@ -0,0 +1,36 @@
+import itertools
+
+from parametric_simulator.async_executor import run_sweep_async
+from parametric_simulator.sweep import Run
+
+__author__ = "Eelco van Vliet"
+__copyright__ = "Eelco van Vliet"
+__license__ = "MIT"
+
+
+def test_run_sweep_async(tmp_path):
+    script = tmp_path / "script.sh"
+    script.write_text('#!/bin/sh\necho "out $1"\necho "err $1" >&2\nexit $2\n')
+    script.chmod(0o755)
+    runs = [Run(index=index, arguments=[index, index % 2]) for index in range(6)]
+    log_directory = tmp_path / "logs"
+
+    results = sorted(
+        run_sweep_async(script, runs, max_workers=2, log_directory=log_directory),
+        key=lambda r: r.index,
+    )
+    assert [result.returncode for result in results] == [0, 1, 0, 1, 0, 1]
+    assert (log_directory / "run_000003.out").read_text() == "out 3\n"
+    assert (log_directory / "run_000003.err").read_text() == "err 3\n"
+
+
+def test_run_sweep_async_aborted(tmp_path):
+    script = tmp_path / "script.sh"
+    script.write_text("#!/bin/sh\nsleep $1\n")
+    script.chmod(0o755)
+    runs = [Run(index=0, arguments=[0])] + [Run(index=1, arguments=[60])] * 10
+
+    results = run_sweep_async(script, runs, max_workers=4)
+    assert [result.index for result in itertools.islice(results, 1)] == [0]
+    # closing the sweep kills the sleeping subprocesses instead of waiting for them
+    results.close()
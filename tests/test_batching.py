@@ -0,0 +1,42 @@
+from pathlib import Path
+
+import pytest
+
+from parametric_simulator.batching import BatchSizer
+from parametric_simulator.executor import run_sweep
+from parametric_simulator.sweep import Run
+
+__author__ = "Eelco van Vliet"
+__copyright__ = "Eelco van Vliet"
+__license__ = "MIT"
+
+SLEEPING = Path(__file__).parents[1] / "examples" / "sleeping.py"
+
+
+def test_batch_sizer():
+    sizer = BatchSizer(target_duration=1.0, max_batch_size=500, smoothing=0.5)
+    assert sizer.batch_size == 1
+    sizer.update([0.01])
+    assert sizer.batch_size == 100
+    sizer.update([0.03, 0.03])
+    assert sizer.batch_size == 50
+    sizer.update([0.0] * 10)
+    assert sizer.batch_size == 100
+    sizer.update([10.0])
+    assert sizer.batch_size == 1
+    sizer.update([])
+    assert sizer.batch_size == 1
+
+
+@pytest.mark.parametrize("in_process", [False, True])
+def test_run_sweep_in_batches(in_process):
+    runs = [Run(index=index, arguments=["--sleep", "0"]) for index in range(30)]
+    runs.append(Run(index=30, arguments=["--units", "invalid"]))
+    sizer = BatchSizer(target_duration=0.5)
+    results = sorted(
+        run_sweep(SLEEPING, runs, max_workers=2, in_process=in_process, batch_sizer=sizer),
+        key=lambda r: r.index,
+    )
+    assert [result.index for result in results] == list(range(31))
+    assert [result.success for result in results] == [True] * 30 + [False]
+    assert sizer.batch_size > 1
@@ -0,0 +1,33 @@
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+__author__ = "Eelco van Vliet"
+__copyright__ = "Eelco van Vliet"
+__license__ = "MIT"
+
+BENCHMARKS = Path(__file__).parents[1] / "benchmarks" / "run_benchmarks.py"
+
+
+@pytest.fixture(scope="module")
+def benchmarks():
+    spec = importlib.util.spec_from_file_location("run_benchmarks", BENCHMARKS)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_run_sleeping_sweep(benchmarks):
+    timing = benchmarks.run_sleeping_sweep(4, 2, "in_process", sleep=0.01)
+    assert timing["total_run_time"] >= 0.04
+    assert 0 <= timing["time_to_first_run"] <= timing["total_time"]
+
+
+def test_find_regressions(benchmarks):
+    baseline = {"runs_per_second.subprocess.workers_1": 100, "overhead_per_run.asyncio": 0.01}
+    results = {"runs_per_second.subprocess.workers_1": 70, "overhead_per_run.asyncio": 0.011}
+    regressions = benchmarks.find_regressions(results, baseline, tolerance=0.2)
+    assert len(regressions) == 1
+    assert regressions[0].startswith("runs_per_second.subprocess.workers_1")
+    assert benchmarks.find_regressions(results, {}, tolerance=0.2) == []
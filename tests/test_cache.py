@@ -0,0 +1,49 @@
+from parametric_simulator.cache import ResultCache, get_file_hash
+from parametric_simulator.executor import run_sweep
+from parametric_simulator.sweep import Run
+
+__author__ = "Eelco van Vliet"
+__copyright__ = "Eelco van Vliet"
+__license__ = "MIT"
+
+
+def test_get_key(tmp_path):
+    script = tmp_path / "script.py"
+    script.write_text("print('hello')\n")
+    cache = ResultCache(tmp_path / "cache")
+    key = cache.get_key(script, ["--seed", "1"])
+    assert key == cache.get_key(script, ["--seed", 1])
+    assert key != cache.get_key(script, ["--seed", "2"])
+
+    script.write_text("print('changed')\n")
+    assert ResultCache(tmp_path / "cache").get_key(script, ["--seed", "1"]) != key
+    assert get_file_hash(tmp_path / "missing.py") == ""
+
+
+def test_eviction(tmp_path):
+    cache = ResultCache(tmp_path, max_size=100)
+    for index in range(10):
+        cache.put(f"key{index}", {"returncode": 0, "wall_time": 1.0})
+    assert cache.total_size <= 100
+    assert 0 < len(cache) < 10
+    assert cache.get("key0") is None
+    assert cache.get("key9") == {"returncode": 0, "wall_time": 1.0}
+
+    # the cache is persistent
+    cache.close()
+    assert ResultCache(tmp_path, max_size=100).get("key9") is not None
+
+
+def test_run_sweep_with_cache(tmp_path):
+    script = tmp_path / "script.py"
+    script.write_text("import sys\nsys.exit(sys.argv[1] == 'fail')\n")
+    cache = ResultCache(tmp_path / "cache")
+
+    runs = [Run(index=0, arguments=["ok"]), Run(index=1, arguments=["fail"])]
+    results = sorted(run_sweep(script, runs, max_workers=1, cache=cache), key=lambda r: r.index)
+    assert [result.cached for result in results] == [False, False]
+    assert [result.success for result in results] == [True, False]
+
+    results = sorted(run_sweep(script, runs, max_workers=1, cache=cache), key=lambda r: r.index)
+    assert [result.cached for result in results] == [True, False]
+    assert results[0].wall_time > 0
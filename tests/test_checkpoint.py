@@ -0,0 +1,158 @@
+import time
+
+import pytest
+
+from parametric_simulator import checkpoint
+from parametric_simulator.async_executor import run_sweep_async
+from parametric_simulator.checkpoint import (
+    CHECKPOINT_VARIABLE,
+    CHECKPOINTED_EXIT_CODE,
+    PREEMPT_FILE_NAME,
+    Checkpointer,
+    is_checkpoint_requested,
+    mark_started,
+)
+from parametric_simulator.executor import PendingRun, run_sweep
+from parametric_simulator.instrumentation import SweepMonitor
+from parametric_simulator.journal import RunJournal
+from parametric_simulator.sweep import Run
+
+__author__ = "Eelco van Vliet"
+__copyright__ = "Eelco van Vliet"
+__license__ = "MIT"
+
+SCRIPT = """
+import sys
+import time
+from pathlib import Path
+
+from parametric_simulator import checkpoint, report
+
+def main(argv):
+    number_of_steps = int(argv[0])
+    state = {"step": 0}
+
+    def save(path):
+        Path(path).write_text(str(state["step"]))
+
+    def restore(path):
+        return int(Path(path).read_text())
+
+    state["step"] = first_step = checkpoint.register(save, restore) or 0
+    while state["step"] < number_of_steps:
+        state["step"] += 1
+        time.sleep(0.02)
+        report("step", state["step"], step=state["step"])
+    report("first_step", first_step)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
+"""
+
+
+@pytest.fixture
+def script(tmp_path):
+    script = tmp_path / "steps.py"
+    script.write_text(SCRIPT)
+    return script
+
+
+def test_register(tmp_path, monkeypatch):
+    def save(path):
+        with open(path, "w") as stream:
+            stream.write("saved")
+
+    # outside the simulator the hooks are ignored
+    monkeypatch.delenv(CHECKPOINT_VARIABLE, raising=False)
+    assert checkpoint.register(save, lambda path: "restored") is None
+    checkpoint.poll()
+
+    path = tmp_path / "checkpoint"
+    monkeypatch.setenv(CHECKPOINT_VARIABLE, str(path))
+    try:
+        assert checkpoint.register(save, lambda path: "restored") is None
+        checkpoint.poll()
+        checkpoint.save_checkpoint()
+        assert path.read_text() == "saved"
+        assert checkpoint.register(save, lambda path: "restored") == "restored"
+
+        # a signal asks for a checkpoint at the next poll
+        checkpoint._handle_signal(None, None)
+        with pytest.raises(SystemExit) as exit_info:
+            checkpoint.poll()
+        assert exit_info.value.code == CHECKPOINTED_EXIT_CODE
+    finally:
+        checkpoint.reset_hooks()
+
+
+def test_max_duration(tmp_path):
+    checkpointer = Checkpointer(tmp_path / "checkpoints", max_duration=0.1)
+    report_directory = tmp_path / "reports" / "run_000000"
+    checkpoint_path = checkpointer.get_checkpoint_path(b"run")
+    pending_run = PendingRun(
+        Run(index=0), report_directory=report_directory, checkpoint_path=checkpoint_path
+    )
+    # the time in the queue of a worker does not count
+    checkpointer.check([pending_run], force=True)
+    time.sleep(0.2)
+    checkpointer.check([pending_run], force=True)
+    assert not is_checkpoint_requested(report_directory)
+
+    mark_started(report_directory, checkpoint_path)
+    checkpointer.check([pending_run], force=True)
+    assert not is_checkpoint_requested(report_directory)
+    time.sleep(0.2)
+    checkpointer.check([pending_run], force=True)
+    assert is_checkpoint_requested(report_directory)
+
+
+@pytest.mark.parametrize("engine", ["subprocess", "in_process", "asyncio"])
+def test_preempt_long_runs(tmp_path, script, engine):
+    runs = [Run(index=0, arguments=[40])] + [
+        Run(index=index, arguments=[1]) for index in range(1, 9)
+    ]
+    checkpointer = Checkpointer(tmp_path / "checkpoints", max_duration=0.3, interval=0.05)
+    monitor = SweepMonitor(2, len(runs))
+    arguments = dict(
+        max_workers=2,
+        reports_directory=tmp_path / "reports",
+        monitor=monitor,
+        checkpointer=checkpointer,
+    )
+    if engine == "asyncio":
+        results = list(run_sweep_async(script, runs, **arguments))
+    else:
+        results = list(run_sweep(script, runs, in_process=engine == "in_process", **arguments))
+
+    assert sorted(result.index for result in results) == list(range(9))
+    assert all(result.success for result in results)
+    (long_run,) = [result for result in results if result.index == 0]
+    assert long_run.outputs["step"] == 40
+    # the long run resumed from its checkpoint instead of starting from zero
+    assert long_run.outputs["first_step"] > 0
+    assert checkpointer.number_of_checkpoints >= 1
+    assert monitor.summary()["checkpointed"] == checkpointer.number_of_checkpoints
+    assert monitor.in_flight == 0
+    # the checkpoint of a finished run is removed
+    assert list((tmp_path / "checkpoints").iterdir()) == []
+
+
+def test_preempt_sweep(tmp_path, script):
+    runs = [Run(index=index, arguments=[30]) for index in range(2)]
+    journal = RunJournal(tmp_path / "journal")
+    checkpointer = Checkpointer(tmp_path / "checkpoints", interval=0.05)
+    (tmp_path / "checkpoints" / PREEMPT_FILE_NAME).touch()
+    arguments = dict(max_workers=2, reports_directory=tmp_path / "reports", journal=journal)
+
+    # a preempted sweep checkpoints its runs and ends without their results
+    assert list(run_sweep(script, runs, checkpointer=checkpointer, **arguments)) == []
+    assert checkpointer.draining
+    assert checkpointer.number_of_checkpoints == 2
+
+    # the next sweep resumes the runs from their checkpoints
+    (tmp_path / "checkpoints" / PREEMPT_FILE_NAME).unlink()
+    checkpointer = Checkpointer(tmp_path / "checkpoints", interval=0.05)
+    results = list(run_sweep(script, runs, checkpointer=checkpointer, **arguments))
+    journal.close()
+    assert sorted(result.index for result in results) == [0, 1]
+    assert all(result.outputs["first_step"] > 0 for result in results)
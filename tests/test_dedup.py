@@ -0,0 +1,94 @@
+import math
+
+import pytest
+
+from parametric_simulator.cache import ResultCache
+from parametric_simulator.dedup import Deduplicator
+from parametric_simulator.executor import RunResult
+from parametric_simulator.instrumentation import SweepMonitor
+from parametric_simulator.sweep import Run, iter_runs
+
+__author__ = "Eelco van Vliet"
+__copyright__ = "Eelco van Vliet"
+__license__ = "MIT"
+
+UNITS = {"s": 1, "m": 60, "h": 3600}
+RULES = {
+    "sleep": {"arguments": ["--sleep ${sleep}"], "iterator": {"values": [1, 60]}},
+    "units": {"arguments": ["--units ${units}"], "iterator": {"values": ["s", "m"]}},
+}
+
+
+def run_in_reverse(runs):
+    """Execute the runs in the reverse order, so duplicates come before their results."""
+    runs = list(runs)
+    for run in reversed(runs):
+        yield RunResult(index=run.index, parameters=run.parameters, outputs={"index": run.index})
+
+
+def test_canonical_form():
+    deduplicator = Deduplicator({"seconds": "sleep * UNITS[units]"}, {"UNITS": UNITS})
+    assert deduplicator.get_key({"sleep": 60, "units": "s"}) == deduplicator.get_key(
+        {"sleep": 1, "units": "m"}
+    )
+    assert deduplicator.get_key({"sleep": 60, "units": "s"}) != deduplicator.get_key(
+        {"sleep": 60, "units": "m"}
+    )
+    # runs which cannot be normalized are only equal to themselves
+    assert deduplicator.get_key({"sleep": 1, "units": "d"}) != deduplicator.get_key(
+        {"sleep": 2, "units": "d"}
+    )
+
+    deduplicator = Deduplicator(tolerance={"x": 1e-6})
+    assert deduplicator.get_key({"x": 0.1 + 0.2, "y": 1}) == deduplicator.get_key(
+        {"x": 0.3, "y": 1.0}
+    )
+    assert deduplicator.get_key({"x": 0.3, "y": 1}) != deduplicator.get_key({"x": 0.3, "y": 1.1})
+    assert deduplicator.get_key({"x": math.nan}) == deduplicator.get_key({"x": math.nan})
+
+    with pytest.raises(ValueError):
+        Deduplicator({"seconds": "sleep *"})
+
+
+def test_deduplicator():
+    monitor = SweepMonitor(1, 4)
+    deduplicator = Deduplicator(
+        {"seconds": "sleep * UNITS[units]"}, {"UNITS": UNITS}, monitor=monitor
+    )
+    results = list(deduplicator.run(run_in_reverse, iter_runs(RULES)))
+
+    assert deduplicator.number_of_duplicates == 1
+    assert sorted(result.index for result in results) == [0, 1, 2, 3]
+    (duplicate,) = [result for result in results if result.duplicate_of is not None]
+    assert duplicate.parameters == {"sleep": 60, "units": "s"}
+    assert duplicate.duplicate_of == 1
+    assert duplicate.outputs == {"index": 1}
+    assert duplicate.to_row()["duplicate_of"] == 1
+    assert monitor.summary()["duplicates"] == 1
+
+    # the result of a finished run is not kept, so a later duplicate is executed itself
+    runs = [Run(index=4, parameters={"sleep": 3600, "units": "s"})]
+    (result,) = deduplicator.run(run_in_reverse, runs)
+    assert result.duplicate_of is None and result.outputs == {"index": 4}
+
+
+def test_deduplicator_cache(tmp_path):
+    script = tmp_path / "model.py"
+    script.write_text("def main(argv):\n    pass\n")
+    cache = ResultCache(tmp_path / "cache")
+    deduplicator = Deduplicator(
+        {"seconds": "sleep * UNITS[units]"}, {"UNITS": UNITS}, script=script, cache=cache
+    )
+    runs = list(iter_runs(RULES))
+    assert len(list(deduplicator.run(run_in_reverse, runs[:2]))) == 2
+    cache.put(
+        cache.get_key(script, runs[1].arguments),
+        {"returncode": 0, "wall_time": 1.0, "outputs": {"index": 1}},
+    )
+
+    # a duplicate of a run which already finished gets its result from the cache
+    (result,) = deduplicator.run(run_in_reverse, runs[2:3])
+    cache.close()
+    assert result.index == 2 and result.duplicate_of == 1
+    assert result.cached and result.outputs == {"index": 1}
+    assert deduplicator.number_of_duplicates == 1
@@ -0,0 +1,129 @@
+import socket
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+from parametric_simulator.distributed import (
+    HELLO,
+    REQUEST_RUNS,
+    RUN,
+    RUN_COUNT,
+    Coordinator,
+    FrameReader,
+    decode_result,
+    decode_run,
+    encode_frame,
+    encode_result,
+    encode_run,
+    parse_address,
+)
+from parametric_simulator.sweep import Run
+
+__author__ = "Eelco van Vliet"
+__copyright__ = "Eelco van Vliet"
+__license__ = "MIT"
+
+SLEEPING = Path(__file__).parents[1] / "examples" / "sleeping.py"
+
+
+def start_worker(address, max_workers=2):
+    command = [sys.executable, "-m", "parametric_simulator.parsim"]
+    command += [
+        "--worker",
+        f"{address[0]}:{address[1]}",
+        "--max_workers",
+        str(max_workers),
+    ]
+    return subprocess.Popen(command)
+
+
+def test_parse_address():
+    assert parse_address("node1:6000") == ("node1", 6000)
+    assert parse_address(":6000") == ("0.0.0.0", 6000)
+    assert parse_address("node1", "127.0.0.1") == ("node1", 5555)
+
+
+def test_frames():
+    reader = FrameReader()
+    data = encode_frame(RUN, encode_run(7, ["--sleep", "0"], "reports/run_000007"))
+    data += encode_frame(RUN, encode_run(8, []))
+    assert reader.feed(data[:5]) == []
+    (kind, payload), (_, second) = reader.feed(data[5:])
+    assert kind == RUN
+    assert decode_run(payload) == (7, ["--sleep", "0"], "reports/run_000007", None)
+    assert decode_run(second) == (8, [], None, None)
+
+    usage = {"wall_time": 1.5, "peak_rss": 1024}
+    payload = encode_result(7, -9, usage, ({"energy": 2.0}, {}))
+    index, returncode, decoded, reports = decode_result(payload)
+    assert (index, returncode, reports) == (7, -9, ({"energy": 2.0}, {}))
+    assert decoded["peak_rss"] == 1024 and decoded["user_time"] is None
+    assert len(encode_result(7, 0, usage, ({}, {}))) < 64
+
+
+def test_coordinator(tmp_path):
+    runs = [Run(index=index, arguments=["--sleep", "0"]) for index in range(10)]
+    runs.append(Run(index=10, arguments=["--units", "invalid"]))
+    coordinator = Coordinator(("127.0.0.1", 0))
+    workers = [start_worker(coordinator.address) for _ in range(2)]
+    try:
+        results = list(
+            coordinator.run_sweep(SLEEPING, runs, reports_directory=tmp_path / "reports")
+        )
+    finally:
+        coordinator.close()
+    assert [worker.wait(timeout=30) for worker in workers] == [0, 0]
+    results.sort(key=lambda result: result.index)
+    assert [result.index for result in results] == list(range(11))
+    assert [result.success for result in results] == [True] * 10 + [False]
+    assert results[0].outputs == {"number_of_seconds": 0.0}
+    assert results[0].user_time is not None
+
+
+def test_coordinator_requeues_runs_of_lost_workers():
+    runs = [Run(index=index, arguments=["--sleep", "0"]) for index in range(4)]
+    coordinator = Coordinator(("127.0.0.1", 0), heartbeat_interval=0.2)
+    results = []
+    sweep = threading.Thread(target=lambda: results.extend(coordinator.run_sweep(SLEEPING, runs)))
+    sweep.start()
+
+    # a worker which takes a run and disappears
+    with socket.create_connection(coordinator.address) as connection:
+        connection.sendall(
+            encode_frame(HELLO, b"{}") + encode_frame(REQUEST_RUNS, RUN_COUNT.pack(1))
+        )
+        reader = FrameReader()
+        frames = []
+        while not any(kind == RUN for kind, _ in frames):
+            frames += reader.feed(connection.recv(1024))
+
+    worker = start_worker(coordinator.address)
+    sweep.join(timeout=60)
+    coordinator.close()
+    assert worker.wait(timeout=30) == 0
+    assert sorted(result.index for result in results) == [0, 1, 2, 3]
+
+
+def test_worker_survives_crashing_runs(tmp_path):
+    script = tmp_path / "crashing.py"
+    script.write_text(
+        "import os\ndef main(argv):\n    if argv[0] == 'crash':\n        os._exit(9)\n"
+    )
+    runs = [Run(index=index, arguments=[argument]) for index, argument in enumerate("a-bcd")]
+    runs[1] = Run(index=1, arguments=["crash"])
+    coordinator = Coordinator(("127.0.0.1", 0))
+    results = []
+    sweep = threading.Thread(
+        target=lambda: results.extend(coordinator.run_sweep(script, runs, in_process=True))
+    )
+    sweep.start()
+    worker = start_worker(coordinator.address, max_workers=1)
+    sweep.join(timeout=60)
+    coordinator.close()
+    assert worker.wait(timeout=30) == 0
+    results.sort(key=lambda result: result.index)
+    assert [result.index for result in results] == list(range(5))
+    # the crashed run fails, and the worker continues the sweep in a new pool
+    assert not results[1].success
+    assert all(result.success for result in results[3:])
@@ -0,0 +1,113 @@
+import threading
+from pathlib import Path
+
+import pytest
+
+from parametric_simulator.executor import (
+    RunResult,
+    build_command,
+    get_fork_context,
+    run_sweep,
+    use_in_process,
+)
+from parametric_simulator.journal import RunJournal
+from parametric_simulator.sweep import Run
+
+__author__ = "Eelco van Vliet"
+__copyright__ = "Eelco van Vliet"
+__license__ = "MIT"
+
+SLEEPING = Path(__file__).parents[1] / "examples" / "sleeping.py"
+
+
+def test_build_command():
+    command = build_command(SLEEPING, ["--sleep", 0])
+    assert command[1:] == [str(SLEEPING), "--sleep", "0"]
+    assert build_command("simulate.sh") == ["simulate.sh"]
+
+
+def test_to_row():
+    result = RunResult(
+        index=3, parameters={"x": 1.0}, outputs={"x": 2.0, "returncode": 5, "energy": 1.5}
+    )
+    row = result.to_row()
+    # the reported scalars do not overwrite the parameters and the columns of the run
+    assert (row["x"], row["returncode"], row["run_index"]) == (1.0, 0, 3)
+    assert (row["output_x"], row["output_returncode"], row["energy"]) == (2.0, 5, 1.5)
+
+
+def test_run_sweep():
+    runs = [Run(index=index, arguments=["--sleep", "0"]) for index in range(4)]
+    runs.append(Run(index=4, arguments=["--units", "invalid"]))
+    results = sorted(run_sweep(SLEEPING, runs, max_workers=2, queue_size=3), key=lambda r: r.index)
+    assert [result.index for result in results] == [0, 1, 2, 3, 4]
+    assert [result.success for result in results] == [True] * 4 + [False]
+    assert all(result.wall_time > 0 for result in results)
+
+
+def test_use_in_process(tmp_path):
+    shell_script = tmp_path / "simulate.sh"
+    assert not use_in_process(SLEEPING, "subprocess")
+    assert use_in_process(SLEEPING, "auto")
+    assert not use_in_process(shell_script, "auto")
+    with pytest.raises(ValueError):
+        use_in_process(shell_script, "in_process")
+    with pytest.raises(ValueError):
+        use_in_process(SLEEPING, "threads")
+
+
+def test_run_sweep_in_process(tmp_path):
+    script = tmp_path / "in_process.py"
+    script.write_text(
+        "import os, sys\n"
+        "def main(argv):\n"
+        "    if argv[0] == 'raise':\n"
+        "        raise RuntimeError(argv)\n"
+        "    if argv[0] == 'exit':\n"
+        "        sys.exit(3)\n"
+        "    print(os.getpid())\n"
+    )
+    runs = [Run(index=index, arguments=[argument]) for index, argument in enumerate("abc")]
+    runs += [Run(index=3, arguments=["raise"]), Run(index=4, arguments=["exit"])]
+    results = sorted(
+        run_sweep(script, runs, max_workers=2, cwd=tmp_path, in_process=True),
+        key=lambda r: r.index,
+    )
+    assert [result.returncode for result in results] == [0, 0, 0, 1, 3]
+
+
+def test_run_sweep_with_crashing_worker(tmp_path):
+    script = tmp_path / "crashing.py"
+    script.write_text(
+        "import os\n" "def main(argv):\n" "    if argv[0] == 'crash':\n" "        os._exit(9)\n"
+    )
+    runs = [Run(index=index, arguments=[argument]) for index, argument in enumerate("ab")]
+    runs += [Run(index=2, arguments=["crash"]), Run(index=3, arguments=["c"])]
+    journal = RunJournal(tmp_path / "journal")
+    results = sorted(
+        run_sweep(script, runs, max_workers=1, queue_size=1, journal=journal, in_process=True),
+        key=lambda r: r.index,
+    )
+    journal.close()
+    # the crashed run fails, and the sweep continues in a new pool
+    assert [result.success for result in results] == [True, True, False, True]
+    # the crashed run is recorded as failed, so it is executed again
+    journal = RunJournal(tmp_path / "journal")
+    results = list(run_sweep(script, runs, max_workers=1, journal=journal, in_process=True))
+    journal.close()
+    assert [result.index for result in results] == [2]
+
+
+def test_run_sweep_in_process_with_threads():
+    stopped = threading.Event()
+    thread = threading.Thread(target=stopped.wait)
+    thread.start()
+    try:
+        # the workers are not forked while other threads run
+        assert get_fork_context().get_start_method() == "forkserver"
+        runs = [Run(index=index, arguments=["--sleep", "0"]) for index in range(2)]
+        results = list(run_sweep(SLEEPING, runs, max_workers=2, in_process=True))
+    finally:
+        stopped.set()
+        thread.join()
+    assert [result.success for result in results] == [True, True]
@@ -0,0 +1,84 @@
+import pytest
+
+from parametric_simulator import load_input
+from parametric_simulator.executor import run_sweep
+from parametric_simulator.inputs import (
+    convert_input,
+    get_input_variable,
+    prepare_inputs,
+)
+from parametric_simulator.sweep import Run
+
+__author__ = "Eelco van Vliet"
+__copyright__ = "Eelco van Vliet"
+__license__ = "MIT"
+
+np = pytest.importorskip("numpy")
+
+SCRIPT = """
+from parametric_simulator import load_input, report
+
+def main(argv):
+    table = load_input("table")
+    report("total", float(table[int(argv[0])].sum()))
+    report("address", table.__array_interface__["data"][0])
+"""
+
+
+def test_convert_input(tmp_path):
+    table = tmp_path / "table.csv"
+    table.write_text("a,b\n1,2\n3,4\n")
+    directory = tmp_path / "inputs"
+
+    file_name = convert_input("table", {"file": table, "delimiter": ",", "skiprows": 1}, directory)
+    assert np.load(file_name).tolist() == [[1, 2], [3, 4]]
+    # the converted file is reused
+    modified = file_name.stat().st_mtime_ns
+    convert_input("table", {"file": table, "delimiter": ",", "skiprows": 1}, directory)
+    assert file_name.stat().st_mtime_ns == modified
+
+    np.save(tmp_path / "mesh.npy", np.arange(3))
+    assert convert_input("mesh", str(tmp_path / "mesh.npy"), directory) == tmp_path / "mesh.npy"
+
+    np.savez(tmp_path / "arrays.npz", x=np.arange(2), y=np.arange(4))
+    file_name = convert_input("y", {"file": tmp_path / "arrays.npz", "key": "y"}, directory)
+    assert np.load(file_name).tolist() == [0, 1, 2, 3]
+    with pytest.raises(ValueError):
+        convert_input("arrays", tmp_path / "arrays.npz", directory)
+
+
+def test_load_input(tmp_path, monkeypatch):
+    np.save(tmp_path / "mesh.npy", np.arange(3.0))
+    with pytest.raises(KeyError):
+        load_input("mesh")
+    with pytest.raises(ValueError):
+        prepare_inputs({"my-mesh": str(tmp_path / "mesh.npy")})
+
+    environment = prepare_inputs({"mesh": str(tmp_path / "mesh.npy")}, tmp_path / "inputs")
+    assert environment == {get_input_variable("mesh"): str(tmp_path / "mesh.npy")}
+    monkeypatch.setenv(get_input_variable("mesh"), str(tmp_path / "mesh.npy"))
+    mesh = load_input("mesh")
+    assert mesh.tolist() == [0.0, 1.0, 2.0]
+    assert not mesh.flags.writeable
+    assert load_input("mesh") is mesh
+
+
+def test_run_sweep_with_inputs(tmp_path, monkeypatch):
+    np.save(tmp_path / "table.npy", np.arange(6.0).reshape(3, 2))
+    monkeypatch.setenv(get_input_variable("table"), str(tmp_path / "table.npy"))
+    script = tmp_path / "lookup.py"
+    script.write_text(SCRIPT)
+    runs = [Run(index=index, arguments=[index % 3]) for index in range(6)]
+
+    results = list(
+        run_sweep(
+            script,
+            runs,
+            max_workers=1,
+            in_process=True,
+            reports_directory=tmp_path / "reports",
+        )
+    )
+    assert sorted(result.outputs["total"] for result in results) == [1, 1, 5, 5, 9, 9]
+    # the single worker maps the input once and reuses the view for every run
+    assert len({result.outputs["address"] for result in results}) == 1
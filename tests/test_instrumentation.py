@@ -0,0 +1,99 @@
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from parametric_simulator.async_executor import run_sweep_async
+from parametric_simulator.executor import RunResult, run_sweep
+from parametric_simulator.instrumentation import (
+    USAGE_FIELDS,
+    DurationHistogram,
+    InProcessUsage,
+    SweepMonitor,
+    wait_for_process,
+)
+from parametric_simulator.sweep import Run
+
+__author__ = "Eelco van Vliet"
+__copyright__ = "Eelco van Vliet"
+__license__ = "MIT"
+
+SLEEPING = Path(__file__).parents[1] / "examples" / "sleeping.py"
+
+
+def test_duration_histogram():
+    histogram = DurationHistogram(ratio=1.01)
+    assert histogram.percentile(50) is None
+    for duration in range(1, 101):
+        histogram.add(duration / 100)
+    assert histogram.percentile(50) == pytest.approx(0.5, rel=0.01)
+    assert histogram.percentile(99) == pytest.approx(0.99, rel=0.01)
+    histogram.add(0)
+    assert histogram.percentile(0) == pytest.approx(histogram.minimum)
+
+
+def test_wait_for_process():
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-c", "import sys; sys.stdout.write('x' * 1000); sys.exit(2)"],
+        stdout=subprocess.DEVNULL,
+    )
+    returncode, usage = wait_for_process(process, start)
+    assert returncode == process.returncode == 2
+    assert set(usage) == set(USAGE_FIELDS)
+    assert usage["wall_time"] > 0
+    assert usage["user_time"] + usage["system_time"] > 0
+    assert usage["peak_rss"] > 1024 * 1024
+    if sys.platform.startswith("linux"):
+        assert usage["write_bytes"] >= 1000
+
+
+def test_in_process_usage():
+    with InProcessUsage() as measurement:
+        sum(range(100000))
+    assert set(measurement.usage) == set(USAGE_FIELDS)
+    assert measurement.usage["wall_time"] > 0
+    assert measurement.usage["user_time"] >= 0
+
+
+@pytest.mark.parametrize("engine", ["subprocess", "in_process", "asyncio"])
+def test_sweep_usage(engine):
+    runs = [Run(index=index, arguments=["--sleep", "0"]) for index in range(3)]
+    monitor = SweepMonitor(max_workers=2, number_of_runs=3)
+    if engine == "asyncio":
+        results = list(run_sweep_async(SLEEPING, runs, max_workers=2, monitor=monitor))
+    else:
+        results = list(
+            run_sweep(
+                SLEEPING, runs, max_workers=2, in_process=engine == "in_process", monitor=monitor
+            )
+        )
+    assert all(result.user_time is not None for result in results)
+    row = results[0].to_row()
+    assert all(field in row for field in USAGE_FIELDS)
+
+    summary = monitor.summary()
+    assert summary["completed"] == 3
+    assert summary["running"] == summary["queue_depth"] == 0
+    assert summary["p50"] > 0
+    assert monitor.format_summary().startswith("3/3 runs done (0 failed, 0 cached, 0 pruned)")
+
+
+def test_sweep_monitor_queue():
+    monitor = SweepMonitor(max_workers=2)
+    started = []
+    monitor.call_when_started(lambda: started.append(monitor.submitted))
+    for _ in range(5):
+        monitor.run_submitted()
+    # the callback is called once, when the first run is handed out
+    assert started == [0]
+    assert (monitor.running, monitor.queue_depth) == (2, 3)
+    monitor.run_finished(RunResult(index=0, parameters={}, returncode=1, wall_time=0.5))
+    monitor.run_finished(
+        RunResult(index=1, parameters={}, returncode=0, wall_time=0.0, cached=True)
+    )
+    assert (monitor.running, monitor.queue_depth) == (2, 2)
+    summary = monitor.summary()
+    assert (summary["completed"], summary["failed"], summary["cached"]) == (2, 1, 1)
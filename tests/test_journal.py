@@ -0,0 +1,65 @@
+import time
+
+from parametric_simulator.executor import run_sweep
+from parametric_simulator.journal import RECORD, RunJournal, get_run_hash
+from parametric_simulator.sweep import Run
+
+__author__ = "Eelco van Vliet"
+__copyright__ = "Eelco van Vliet"
+__license__ = "MIT"
+
+
+def test_journal(tmp_path):
+    file_name = tmp_path / "sweep.journal"
+    journal = RunJournal(file_name, sync_every=2)
+    hashes = [get_run_hash("script.py", ["--seed", seed]) for seed in range(4)]
+    journal.record(hashes[0], 0, 1.0)
+    journal.record(hashes[1], 1, 1.0)
+    journal.record(hashes[2], 0, 1.0)
+    journal.close()
+
+    # the index covers the first journal
+    journal = RunJournal(file_name)
+    assert [journal.is_done(run_hash) for run_hash in hashes] == [True, False, True, False]
+    journal.record(hashes[1], 0, 1.0)
+    journal.record(hashes[2], 1, 1.0)
+    journal.sync()
+
+    # simulate a crash: no index update and an incomplete record at the end
+    with open(file_name, "ab") as stream:
+        stream.write(b"partial")
+    journal = RunJournal(file_name)
+    assert [journal.is_done(run_hash) for run_hash in hashes] == [True, True, False, False]
+    assert journal.number_of_records == 5
+    assert file_name.stat().st_size == 4 + 5 * RECORD.size
+    journal.close()
+
+
+def test_open_large_journal(tmp_path):
+    file_name = tmp_path / "sweep.journal"
+    journal = RunJournal(file_name, sync_every=100000)
+    for seed in range(100000):
+        journal.record(get_run_hash("script.py", [seed]), 0, 1.0)
+    journal.close()
+
+    start = time.perf_counter()
+    journal = RunJournal(file_name)
+    assert time.perf_counter() - start < 0.1
+    assert journal.is_done(get_run_hash("script.py", [99999]))
+    assert not journal.is_done(get_run_hash("script.py", [100000]))
+    journal.close()
+
+
+def test_run_sweep_with_journal(tmp_path):
+    script = tmp_path / "script.py"
+    script.write_text("import sys\nsys.exit(sys.argv[1] == 'fail')\n")
+    runs = [Run(index=0, arguments=["ok"]), Run(index=1, arguments=["fail"])]
+
+    journal = RunJournal(tmp_path / "sweep.journal")
+    assert len(list(run_sweep(script, runs, max_workers=1, journal=journal))) == 2
+    journal.close()
+
+    journal = RunJournal(tmp_path / "sweep.journal")
+    results = list(run_sweep(script, runs, max_workers=1, journal=journal))
+    assert [result.index for result in results] == [1]
+    journal.close()
@@ -0,0 +1,95 @@
+import pytest
+
+from parametric_simulator.ordering import (
+    WINDOW_PER_WORKER,
+    DurationModel,
+    ExpressionCost,
+    fit_duration_model,
+    order_runs,
+)
+from parametric_simulator.parsim import order_sweep
+from parametric_simulator.results import ResultsStore, load_results
+from parametric_simulator.sweep import Run, iter_runs
+
+__author__ = "Eelco van Vliet"
+__copyright__ = "Eelco van Vliet"
+__license__ = "MIT"
+
+UNITS = {"s": 1, "m": 60, "h": 3600}
+RULES = {
+    "sleep": {"arguments": ["--sleep ${sleep}"], "iterator": {"values": [1, 2]}},
+    "units": {"arguments": ["--units ${units}"], "iterator": {"values": ["s", "m", "h"]}},
+}
+
+
+def test_expression_cost():
+    cost = ExpressionCost("sleep * UNITS[units]", {"UNITS": UNITS})
+    assert cost({"sleep": 2, "units": "m"}) == 120
+    assert cost({"sleep": 2, "units": "d"}) is None
+
+
+def test_order_runs():
+    runs = [Run(index=index, parameters={"cost": cost}) for index, cost in enumerate([1, 5, 3, 5])]
+    ordered = order_runs(runs, lambda parameters: parameters["cost"])
+    assert [run.index for run in ordered] == [1, 3, 2, 0]
+
+    # within a window of two runs, only neighbouring runs are reordered
+    ordered = order_runs(runs, lambda parameters: parameters["cost"], window=2)
+    assert [run.index for run in ordered] == [1, 2, 3, 0]
+    ordered = order_runs(reversed(runs), lambda parameters: parameters["cost"], window=1)
+    assert [run.index for run in ordered] == [3, 2, 1, 0]
+
+
+def test_duration_model():
+    parameter_sets = [{"n": n, "solver": solver} for n in (1, 2, 4, 8) for solver in "ab"]
+    durations = [0.01 * p["n"] ** 3 * (10 if p["solver"] == "b" else 1) for p in parameter_sets]
+    model = DurationModel(["n", "solver"])
+    assert model.fit(parameter_sets, durations)
+    assert model({"n": 16, "solver": "a"}) == pytest.approx(0.01 * 16**3, rel=1e-3)
+    assert model({"n": 2, "solver": "b"}) == pytest.approx(0.8, rel=1e-3)
+    assert model({"n": "large", "solver": "a"}) is None
+    assert not DurationModel(["n"]).fit([{"n": 1}], [1.0])
+
+
+def test_fit_duration_model(tmp_path):
+    store = ResultsStore(tmp_path)
+    for index, run in enumerate(iter_runs(RULES)):
+        wall_time = run.parameters["sleep"] * UNITS[run.parameters["units"]]
+        store.append(
+            {**run.parameters, "run_index": index, "returncode": 0, "wall_time": wall_time}
+        )
+    store.append({"sleep": 1, "units": "s", "run_index": 6, "returncode": 1, "wall_time": 1e6})
+    store.close()
+
+    model = fit_duration_model(load_results(tmp_path), ["sleep", "units"])
+    assert model({"sleep": 2, "units": "h"}) == pytest.approx(7200, rel=1e-3)
+    assert fit_duration_model(load_results(tmp_path), ["seed"]) is None
+
+
+def test_order_sweep(tmp_path):
+    schedule = {"order": "longest_first", "cost": "sleep * UNITS[units]"}
+    schedule["constants"] = {"UNITS": UNITS}
+    runs = list(order_sweep(iter_runs(RULES), RULES, schedule))
+    assert [(run.parameters["sleep"], run.parameters["units"]) for run in runs[:3]] == [
+        (2, "h"),
+        (1, "h"),
+        (2, "m"),
+    ]
+
+    # without an expression and without previous results the order is kept
+    runs = list(order_sweep(iter_runs(RULES), RULES, {"order": "longest_first"}, tmp_path))
+    assert [run.index for run in runs] == list(range(6))
+
+    # the first run only waits for a window of runs per worker, not for the whole sweep
+    taken = []
+
+    def generate_runs():
+        for index in range(10 * WINDOW_PER_WORKER):
+            taken.append(index)
+            yield Run(index=index, parameters={"sleep": index, "units": "s"})
+
+    next(iter(order_sweep(generate_runs(), RULES, schedule, max_workers=2)))
+    assert len(taken) == 2 * WINDOW_PER_WORKER
+
+    with pytest.raises(ValueError):
+        order_sweep(iter_runs(RULES), RULES, {"order": "random"})
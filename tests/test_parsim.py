@@ -0,0 +1,150 @@
+from pathlib import Path
+
+import pytest
+import yaml
+
+from parametric_simulator.parsim import main
+from parametric_simulator.results import load_results
+
+__author__ = "Eelco van Vliet"
+__copyright__ = "Eelco van Vliet"
+__license__ = "MIT"
+
+SLEEPING = Path(__file__).parents[1] / "examples" / "sleeping.py"
+
+
+def write_settings(tmp_path, units):
+    settings = {
+        "general": {"script_name": str(SLEEPING), "default_args": ["--sleep 0"]},
+        "paths": {"results": str(tmp_path / "results"), "reports": str(tmp_path / "reports")},
+        "rules": {
+            "units": {"arguments": ["--units ${units}"], "iterator": {"values": units}},
+        },
+    }
+    settings_file = tmp_path / "settings.yml"
+    settings_file.write_text(yaml.safe_dump(settings))
+    return settings_file
+
+
+def test_version(capsys):
+    with pytest.raises(SystemExit):
+        main(["--version"])
+    assert "ParametricSimulator" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("execution_mode", ["subprocess", "in_process", "asyncio"])
+def test_main(tmp_path, execution_mode):
+    settings_file = write_settings(tmp_path, ["s", "m", "h"])
+    main(["--settings_file", str(settings_file), "--execution_mode", execution_mode])
+
+    results = load_results(tmp_path / "results")
+    assert sorted(results["units"]) == ["h", "m", "s"]
+    assert list(results["returncode"]) == [0, 0, 0]
+    assert list(results["number_of_seconds"]) == [0, 0, 0]
+    assert settings_file.with_suffix(".journal").exists()
+
+
+def test_main_resume(tmp_path):
+    settings_file = write_settings(tmp_path, ["s", "invalid"])
+    with pytest.raises(SystemExit):
+        main(["--settings_file", str(settings_file)])
+
+    # only the failed run is executed again
+    settings_file = write_settings(tmp_path, ["s", "m"])
+    main(["--settings_file", str(settings_file)])
+    assert list(load_results(tmp_path / "results")["units"]) == ["s", "invalid", "m"]
+
+
+def test_main_without_script(tmp_path):
+    settings_file = tmp_path / "settings.yml"
+    settings_file.write_text("general:\n  max_workers: 2\n")
+    with pytest.raises(SystemExit):
+        main(["--settings_file", str(settings_file)])
+
+
+def test_main_memory_budget(tmp_path):
+    settings_file = write_settings(tmp_path, ["s", "m"])
+    settings = yaml.safe_load(settings_file.read_text())
+    settings["memory"] = {"budget": "1GiB", "estimate": "600e6 if units == 's' else 300e6"}
+    settings_file.write_text(yaml.safe_dump(settings))
+    main(["--settings_file", str(settings_file)])
+    assert sorted(load_results(tmp_path / "results")["units"]) == ["m", "s"]
+
+    settings["memory"]["budget"] = "lots"
+    settings_file.write_text(yaml.safe_dump(settings))
+    with pytest.raises(SystemExit):
+        main(["--settings_file", str(settings_file), "--restart"])
+
+
+def test_main_adaptive(tmp_path):
+    settings_file = write_settings(tmp_path, ["s"])
+    settings = yaml.safe_load(settings_file.read_text())
+    settings["general"]["default_args"] = []
+    settings["rules"]["sleep"] = {
+        "arguments": ["--sleep ${sleep}"],
+        "iterator": {"linspace": {"start": 0, "stop": 0.01}},
+    }
+    settings["sampling"] = {"strategy": "adaptive", "output": "number_of_seconds", "budget": 14}
+    settings_file.write_text(yaml.safe_dump(settings))
+    main(["--settings_file", str(settings_file), "--max_workers", "2"])
+    results = load_results(tmp_path / "results")
+    assert len(results["run_index"]) == 14
+    assert max(results["sleep"]) <= 0.01
+
+
+def test_main_overrides(tmp_path):
+    settings_file = write_settings(tmp_path, ["s"])
+    main(["--settings_file", str(settings_file), "units=m,h", "+general.max_workers=1"])
+    assert sorted(load_results(tmp_path / "results")["units"]) == ["h", "m"]
+
+    with pytest.raises(SystemExit):
+        main(["--settings_file", str(settings_file), "general.unknown=1"])
+
+
+def test_main_dedup(tmp_path):
+    settings_file = write_settings(tmp_path, ["s", "m"])
+    settings = yaml.safe_load(settings_file.read_text())
+    settings["general"]["default_args"] = []
+    settings["rules"]["sleep"] = {
+        "arguments": ["--sleep ${sleep}"],
+        "iterator": {"values": [0, 0.0]},
+    }
+    settings["dedup"] = {
+        "normalize": {"seconds": "sleep * UNITS[units]"},
+        "constants": {"UNITS": {"s": 1, "m": 60}},
+    }
+    settings_file.write_text(yaml.safe_dump(settings))
+    main(["--settings_file", str(settings_file)])
+    results = load_results(tmp_path / "results")
+    # all four runs sleep for zero seconds, so only the first one is executed
+    assert sorted(results["run_index"]) == [0, 1, 2, 3]
+    assert sum(results["duplicate_of"] == 0) == 3
+
+
+def test_main_reduce(tmp_path):
+    reducers_file = tmp_path / "reducers.py"
+    reducers_file.write_text(
+        "def get_minutes(run_outputs):\n    return run_outputs.outputs['number_of_seconds'] / 60\n"
+    )
+    settings_file = write_settings(tmp_path, ["s", "m"])
+    settings = yaml.safe_load(settings_file.read_text())
+    settings["reduce"] = {"reducers": {"minutes": f"{reducers_file}:get_minutes"}, "raw": "delete"}
+    settings_file.write_text(yaml.safe_dump(settings))
+    main(["--settings_file", str(settings_file)])
+    results = load_results(tmp_path / "results")
+    assert list(results["minutes"]) == [0, 0]
+    assert list((tmp_path / "reports").iterdir()) == []
+
+
+def test_main_vectorized(tmp_path):
+    settings_file = write_settings(tmp_path, ["s", "m"])
+    settings = yaml.safe_load(settings_file.read_text())
+    settings["general"]["block_size"] = 3
+    settings["rules"]["sleep"] = {
+        "arguments": ["--sleep ${sleep}"],
+        "iterator": {"values": [0, 0.5]},
+    }
+    settings_file.write_text(yaml.safe_dump(settings))
+    main(["--settings_file", str(settings_file), "--execution_mode", "vectorized"])
+    results = load_results(tmp_path / "results")
+    assert sorted(results["number_of_seconds"]) == [0, 0, 0.5, 30]
@@ -0,0 +1,83 @@
+import io
+import json
+import socket
+import urllib.request
+
+import pytest
+
+from parametric_simulator.executor import RunResult
+from parametric_simulator.instrumentation import SweepMonitor
+from parametric_simulator.progress import (
+    ProgressServer,
+    TerminalProgress,
+    format_progress,
+    get_progress,
+)
+from parametric_simulator.sweep import Run
+
+__author__ = "Eelco van Vliet"
+__copyright__ = "Eelco van Vliet"
+__license__ = "MIT"
+
+
+@pytest.fixture
+def monitor():
+    monitor = SweepMonitor(max_workers=2, number_of_runs=10)
+    for index in range(4):
+        monitor.run_submitted(Run(index=index, parameters={"seed": index}))
+    monitor.run_finished(RunResult(index=0, parameters={"seed": 0}, wall_time=0.5))
+    monitor.run_finished(RunResult(index=2, parameters={"seed": 2}, returncode=1))
+    return monitor
+
+
+def test_get_progress(monitor):
+    progress = get_progress(monitor)
+    assert (progress["completed"], progress["failed"], progress["total"]) == (2, 1, 10)
+    assert progress["eta"] > 0
+    assert [(run["index"], run["state"]) for run in progress["runs"]] == [
+        (1, "running"),
+        (3, "running"),
+    ]
+
+    lines = format_progress(progress)
+    assert "2/10 done, 1 failed" in lines[0]
+    assert "ETA" in lines[0]
+    assert len(lines) == 3
+    assert lines[1].split()[:2] == ["run", "1"]
+
+
+def test_progress_server(monitor):
+    server = ProgressServer(monitor, "127.0.0.1:0")
+    server.start()
+    try:
+        with urllib.request.urlopen(f"http://{server.address}/") as response:
+            progress = json.load(response)
+        assert progress["completed"] == 2
+        assert progress["runs"][0]["parameters"] == {"seed": 1}
+        with urllib.request.urlopen(f"http://{server.address}/metrics") as response:
+            assert "parsim_completed 2" in response.read().decode()
+    finally:
+        server.close()
+
+
+def test_progress_server_unix_socket(tmp_path, monitor):
+    socket_path = tmp_path / "progress.sock"
+    server = ProgressServer(monitor, f"unix:{socket_path}")
+    server.start()
+    try:
+        with socket.socket(socket.AF_UNIX) as client:
+            client.connect(str(socket_path))
+            client.sendall(b"GET /metrics HTTP/1.0\r\n\r\n")
+            response = b"".join(iter(lambda: client.recv(4096), b""))
+        assert b"parsim_failed 1" in response
+    finally:
+        server.close()
+    assert not socket_path.exists()
+
+
+def test_terminal_progress(monitor):
+    stream = io.StringIO()
+    view = TerminalProgress(monitor, stream, interval=0.01)
+    view.start()
+    view.close()
+    assert stream.getvalue().count("2/10 done") >= 1
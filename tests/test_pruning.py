@@ -0,0 +1,82 @@
+import pytest
+
+from parametric_simulator.executor import PendingRun, run_sweep
+from parametric_simulator.pruning import Pruner
+from parametric_simulator.reporting import (
+    PRUNED_EXIT_CODE,
+    REPORT_DIRECTORY_VARIABLE,
+    report,
+    request_stop,
+)
+from parametric_simulator.sweep import Run
+
+__author__ = "Eelco van Vliet"
+__copyright__ = "Eelco van Vliet"
+__license__ = "MIT"
+
+
+def test_median_rule():
+    pruner = Pruner("loss", min_runs=3, warmup_steps=1)
+    for index, value in enumerate([1.0, 2.0, 3.0]):
+        assert not pruner.should_stop(index, 0, value)
+        assert not pruner.should_stop(index, 1, value)
+    assert not pruner.should_stop(3, 0, 10.0)
+    assert pruner.should_stop(3, 1, 10.0)
+    assert not pruner.should_stop(4, 1, 1.5)
+
+
+def test_successive_halving():
+    pruner = Pruner("loss", rule="successive_halving", reduction_factor=2, min_step=1)
+    assert not pruner.should_stop(0, 1, 5.0)
+    assert pruner.should_stop(1, 1, 6.0)
+    assert not pruner.should_stop(2, 1, 1.0)
+    # run 0 reaches the second rung, with only itself there
+    assert not pruner.should_stop(0, 2, 5.0)
+    assert pruner.should_stop(2, 3, 7.0)
+
+    with pytest.raises(ValueError):
+        Pruner("loss", rule="random")
+
+
+def test_report_stops(tmp_path, monkeypatch):
+    monkeypatch.setenv(REPORT_DIRECTORY_VARIABLE, str(tmp_path))
+    report("loss", 1.0, step=0)
+    request_stop(tmp_path)
+    with pytest.raises(SystemExit) as exc_info:
+        report("loss", 0.5, step=1)
+    assert exc_info.value.code == PRUNED_EXIT_CODE
+
+
+def test_read_new_values(tmp_path, monkeypatch):
+    monkeypatch.setenv(REPORT_DIRECTORY_VARIABLE, str(tmp_path))
+    pruner = Pruner("accuracy", mode="max")
+    pending_run = PendingRun(run=Run(index=0), report_directory=tmp_path)
+    assert pruner.read_new_values(pending_run) == []
+    report("accuracy", 0.5, step=0)
+    report("loss", 0.5, step=0)
+    report("accuracy", 0.75)
+    assert pruner.read_new_values(pending_run) == [(0, -0.5)]
+    report("accuracy", 0.8, step=1)
+    assert pruner.read_new_values(pending_run) == [(1, -0.8)]
+
+
+def test_run_sweep_with_pruning(tmp_path):
+    script = tmp_path / "training.py"
+    script.write_text(
+        "import sys, time\n"
+        "from parametric_simulator import report\n"
+        "for step in range(50):\n"
+        "    report('loss', float(sys.argv[1]), step=step)\n"
+        "    time.sleep(0.02)\n"
+    )
+    runs = [Run(index=index, arguments=[index]) for index in range(6)]
+    pruner = Pruner("loss", min_runs=2, warmup_steps=2, interval=0.05)
+    results = sorted(
+        run_sweep(
+            script, runs, max_workers=6, reports_directory=tmp_path / "reports", pruner=pruner
+        ),
+        key=lambda r: r.index,
+    )
+    assert not results[0].pruned and results[0].success
+    assert results[5].pruned and results[5].returncode == PRUNED_EXIT_CODE
+    assert results[5].wall_time < results[0].wall_time
@@ -0,0 +1,150 @@
+import tarfile
+
+import pytest
+
+from parametric_simulator.cache import ResultCache
+from parametric_simulator.executor import run_sweep
+from parametric_simulator.journal import RunJournal
+from parametric_simulator.reduction import ReductionPipeline, RunOutputs, reduce_run
+from parametric_simulator.sweep import Run
+
+__author__ = "Eelco van Vliet"
+__copyright__ = "Eelco van Vliet"
+__license__ = "MIT"
+
+SCRIPT = """
+import sys
+
+from parametric_simulator import report
+
+value = float(sys.argv[1])
+for step in range(100):
+    print(step, value * step)
+report("value", value)
+sys.exit(1 if value < 0 else 0)
+"""
+
+REDUCERS = """
+def get_maximum(run_outputs):
+    with open(run_outputs.stdout) as stream:
+        return max(float(line.split()[1]) for line in stream)
+
+
+def get_statistics(run_outputs):
+    with open(run_outputs.stdout) as stream:
+        values = [float(line.split()[1]) for line in stream]
+    return {"number_of_lines": len(values), "total": sum(values)}
+"""
+
+
+@pytest.fixture
+def reducers(tmp_path):
+    file_name = tmp_path / "reducers.py"
+    file_name.write_text(REDUCERS)
+    return {
+        "maximum": f"{file_name}:get_maximum",
+        "statistics": f"{file_name}:get_statistics",
+    }
+
+
+def test_reduce_run(tmp_path, reducers):
+    stdout = tmp_path / "run.out"
+    stdout.write_text("0 1\n1 3\n")
+    report_directory = tmp_path / "report"
+    report_directory.mkdir()
+    (report_directory / "field.npy").write_bytes(b"")
+    run_outputs = RunOutputs(
+        index=0,
+        stdout=stdout,
+        report_directory=report_directory,
+        arrays={"field": str(report_directory / "field.npy")},
+    )
+    values, arrays = reduce_run(reducers, run_outputs, raw="compress")
+    assert values == {"maximum": 3.0, "number_of_lines": 2, "total": 4.0}
+    assert arrays == {}
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "reducers.py",
+        "report.tar.gz",
+        "run.out.gz",
+    ]
+    with tarfile.open(tmp_path / "report.tar.gz") as archive:
+        assert "report/field.npy" in archive.getnames()
+
+    # the raw outputs of a run which cannot be reduced are kept
+    run_outputs = RunOutputs(index=1, stdout=tmp_path / "missing.out")
+    assert reduce_run(reducers, run_outputs, raw="delete") == (None, {})
+
+    with pytest.raises(ValueError):
+        ReductionPipeline({"maximum": "get_maximum"})
+    with pytest.raises(ValueError):
+        ReductionPipeline(reducers, raw="shred")
+
+
+@pytest.mark.parametrize("kind", ["thread", "process"])
+def test_pipeline(tmp_path, reducers, kind):
+    script = tmp_path / "count.py"
+    script.write_text(SCRIPT)
+    runs = [Run(index=index, arguments=[value]) for index, value in enumerate([1, 2, 3, -1])]
+    cache = ResultCache(tmp_path / "cache")
+    pipeline = ReductionPipeline(
+        reducers,
+        kind=kind,
+        queue_size=1,
+        raw="delete",
+        log_directory=tmp_path / "logs",
+        reports_directory=tmp_path / "reports",
+        script=script,
+        cache=cache,
+    )
+    arguments = dict(
+        max_workers=2,
+        cache=cache,
+        log_directory=tmp_path / "logs",
+        reports_directory=tmp_path / "reports",
+    )
+
+    def run_round(runs):
+        return run_sweep(script, runs, **arguments)
+
+    results = {result.index: result for result in pipeline.run(run_round, runs)}
+    assert sorted(results) == [0, 1, 2, 3]
+    assert results[2].outputs == {
+        "value": 3.0,
+        "maximum": 297.0,
+        "number_of_lines": 100,
+        "total": 14850.0,
+    }
+    assert pipeline.number_of_reduced_runs == 3
+    # the raw outputs of the reduced runs are deleted, those of the failed run are kept
+    assert sorted(path.name for path in (tmp_path / "logs").iterdir()) == [
+        "run_000003.err",
+        "run_000003.out",
+    ]
+    assert [path.name for path in (tmp_path / "reports").iterdir()] == ["run_000003"]
+
+    # the cached runs keep their reduced values
+    results = list(pipeline.run(run_round, runs[:3]))
+    pipeline.close()
+    cache.close()
+    assert all(result.cached for result in results)
+    assert sorted(result.outputs["maximum"] for result in results) == [99.0, 198.0, 297.0]
+
+
+def test_pipeline_resume(tmp_path, reducers):
+    script = tmp_path / "count.py"
+    script.write_text(SCRIPT)
+    runs = [Run(index=index, arguments=[value]) for index, value in enumerate([1, 2, 3])]
+    cache = ResultCache(tmp_path / "cache")
+    journal = RunJournal(tmp_path / "journal")
+    pipeline = ReductionPipeline(reducers, script=script, cache=cache, journal=journal)
+
+    def run_round(runs):
+        return run_sweep(script, runs, max_workers=2, cache=cache, journal=journal)
+
+    assert len(list(pipeline.run(run_round, runs))) == 3
+    # the runs which the journal skips are not tracked
+    assert list(pipeline.run(run_round, runs)) == []
+    pipeline.close()
+    journal.close()
+    cache.close()
+    assert pipeline.arguments == {}
@@ -0,0 +1,81 @@
+import importlib
+
+import pytest
+
+from parametric_simulator import report
+from parametric_simulator.executor import run_sweep
+from parametric_simulator.reporting import (
+    REPORT_DIRECTORY_VARIABLE,
+    get_report_directory,
+    load_array,
+    read_reports,
+)
+from parametric_simulator.sweep import Run
+
+__author__ = "Eelco van Vliet"
+__copyright__ = "Eelco van Vliet"
+__license__ = "MIT"
+
+np = pytest.importorskip("numpy")
+
+SCRIPT = """
+import numpy as np
+from parametric_simulator import report
+
+def main(argv):
+    size = int(argv[0])
+    report("size", size)
+    report("total", np.float64(size * (size - 1) / 2))
+    report("values", np.arange(size))
+
+if __name__ == "__main__":
+    import sys
+    main(sys.argv[1:])
+"""
+
+
+def test_report(tmp_path, monkeypatch):
+    # the function of the package does not hide the module
+    assert importlib.import_module("parametric_simulator.reporting").report is report
+
+    # without a report directory nothing happens
+    report("ignored", 1)
+
+    monkeypatch.setenv(REPORT_DIRECTORY_VARIABLE, str(tmp_path))
+    report("energy", 1.0, step=1)
+    report("energy", 2.0, step=2)
+    report("field", [[1, 2], [3, 4]])
+    with open(tmp_path / "scalars.jsonl", "a") as stream:
+        stream.write('{"name": "incomplete')
+
+    scalars, arrays = read_reports(tmp_path)
+    assert scalars == {"energy": 2.0}
+    field = load_array(arrays["field"])
+    assert field.tolist() == [[1, 2], [3, 4]]
+    assert not field.flags.writeable
+    assert read_reports(None) == ({}, {})
+
+
+@pytest.mark.parametrize("in_process", [False, True])
+def test_run_sweep_with_reports(tmp_path, in_process):
+    script = tmp_path / "reporting.py"
+    script.write_text(SCRIPT)
+    runs = [Run(index=index, arguments=[size]) for index, size in enumerate([3, 1000])]
+    reports_directory = tmp_path / "reports"
+
+    results = sorted(
+        run_sweep(
+            script,
+            runs,
+            max_workers=2,
+            in_process=in_process,
+            reports_directory=reports_directory,
+        ),
+        key=lambda r: r.index,
+    )
+    assert results[0].outputs == {"size": 3, "total": 3.0}
+    assert results[1].to_row()["total"] == 499500.0
+    assert results[1].arrays["values"] == str(
+        get_report_directory(reports_directory, 1) / "values.npy"
+    )
+    np.testing.assert_array_equal(load_array(results[1].arrays["values"]), np.arange(1000))
@@ -0,0 +1,56 @@
+import math
+
+import pytest
+
+from parametric_simulator.results import ResultsStore, load_results
+
+__author__ = "Eelco van Vliet"
+__copyright__ = "Eelco van Vliet"
+__license__ = "MIT"
+
+
+def test_results_store(tmp_path):
+    store = ResultsStore(tmp_path, batch_size=2)
+    store.append({"run_index": 0, "sleep": 0, "units": "s", "returncode": 0})
+    store.append({"run_index": 1, "sleep": 0.5, "units": "m", "returncode": 1})
+    store.append({"run_index": 2, "sleep": 1.0, "units": "s", "returncode": 0, "energy": 3.0})
+
+    # only complete batches are visible before the store is closed
+    assert len(load_results(tmp_path)["run_index"]) == 2
+    store.close()
+
+    columns = load_results(tmp_path)
+    assert list(columns["run_index"]) == [0, 1, 2]
+    assert list(columns["sleep"]) == pytest.approx([0, 0.5, 1.0])
+    assert columns["units"] == ["s", "m", "s"]
+    assert math.isnan(columns["energy"][0]) and columns["energy"][2] == 3.0
+
+    # reopening the store appends to it
+    store = ResultsStore(tmp_path)
+    store.append({"run_index": 3, "units": "h"})
+    store.close()
+    columns = load_results(tmp_path)
+    assert list(columns["run_index"]) == [0, 1, 2, 3]
+    assert columns["units"] == ["s", "m", "s", "h"]
+    assert math.isnan(columns["sleep"][3])
+
+
+def test_mixed_column_types(tmp_path):
+    store = ResultsStore(tmp_path, batch_size=2)
+    store.append({"run_index": 0, "mesh": 1, "status": None, "size": 1.5})
+    store.append({"run_index": 1, "mesh": 2.5, "status": None, "size": [1, 2]})
+    store.append({"run_index": 2, "mesh": "auto", "status": "ok"})
+    store.close()
+
+    # a number column which gets a string becomes a category column
+    columns = load_results(tmp_path)
+    assert columns["mesh"] == ["1", "2.5", "auto"]
+    assert columns["status"] == [None, None, "ok"]
+    # other values which cannot be stored are missing
+    assert columns["size"][0] == 1.5 and math.isnan(columns["size"][1])
+
+    # the numbers which are already written become categories too
+    store = ResultsStore(tmp_path)
+    store.append({"run_index": 3, "size": "large"})
+    store.close()
+    assert load_results(tmp_path)["size"] == ["1.5", None, None, "large"]
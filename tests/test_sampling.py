@@ -0,0 +1,114 @@
+import functools
+
+import pytest
+
+from parametric_simulator.cache import ResultCache
+from parametric_simulator.executor import RunResult, run_sweep
+from parametric_simulator.journal import RunJournal
+from parametric_simulator.sampling import (
+    AdaptiveSampler,
+    Dimension,
+    iter_rounds,
+    latin_hypercube,
+)
+
+__author__ = "Eelco van Vliet"
+__copyright__ = "Eelco van Vliet"
+__license__ = "MIT"
+
+RULES = {
+    "x": {"arguments": ["--x ${x}"], "iterator": {"linspace": {"start": 0, "stop": 1}}},
+    "mesh": {"arguments": ["--mesh ${mesh}"], "iterator": {"values": ["coarse", "fine"]}},
+}
+
+SCRIPT = """
+from parametric_simulator import report
+
+def main(argv):
+    report("y", 1.0 if float(argv[1]) > 0.5 else 0.0)
+"""
+
+
+def step_function(parameters):
+    return 1.0 if parameters["x"] > 0.5 else 0.0
+
+
+def run_round(runs):
+    for run in runs:
+        yield RunResult(
+            index=run.index, parameters=run.parameters, outputs={"y": step_function(run.parameters)}
+        )
+
+
+def test_dimension():
+    logspace = Dimension("rate", {"logspace": {"start": -2, "stop": 2}})
+    assert logspace.get_value(0) == pytest.approx(0.01)
+    assert logspace.get_value(0.5) == pytest.approx(1)
+    steps = Dimension("n", {"start": 10, "end": 50, "step": 10})
+    assert [steps.get_value(u) for u in (0, 0.3, 0.99, 1)] == [10, 20, 40, 40]
+    assert steps.snap(0.3) == pytest.approx(0.375)
+    with pytest.raises(ValueError):
+        Dimension("n", {"values": []})
+
+
+def test_latin_hypercube():
+    import random
+
+    points = latin_hypercube(8, 3, random.Random(1))
+    assert len(points) == 8
+    for dimension in range(3):
+        strata = sorted(int(point[dimension] * 8) for point in points)
+        assert strata == list(range(8))
+
+
+def test_adaptive_sampler():
+    sampler = AdaptiveSampler(RULES, "y", initial=10, batch=10, budget=60, seed=3)
+    results = list(iter_rounds(sampler, run_round))
+    assert len(results) == 60
+    assert [result.index for result in results] == list(range(60))
+    assert {result.parameters["mesh"] for result in results} == {"coarse", "fine"}
+    assert results[0].parameters["x"] != results[1].parameters["x"]
+
+    # the refinement concentrates the points around the step
+    refined = [result.parameters["x"] for result in results[10:]]
+    near_step = sum(abs(x - 0.5) < 0.15 for x in refined)
+    assert near_step > len(refined) * 0.3
+
+
+def test_adaptive_sampler_tolerance():
+    sampler = AdaptiveSampler(RULES, "y", initial=10, budget=100, tolerance=0.2, seed=3)
+    assert len(list(iter_rounds(sampler, run_round))) < 100
+
+    sampler = AdaptiveSampler(RULES, "missing", initial=10, budget=100)
+    assert len(list(iter_rounds(sampler, run_round))) == 10
+
+
+def test_resume_adaptive_sweep(tmp_path):
+    script = tmp_path / "step.py"
+    script.write_text(SCRIPT)
+    rules = {"x": RULES["x"]}
+
+    def run_sampler(budget):
+        cache = ResultCache(tmp_path / "cache")
+        journal = RunJournal(tmp_path / "journal")
+        run_round = functools.partial(
+            run_sweep,
+            script,
+            max_workers=2,
+            cache=cache,
+            journal=journal,
+            in_process=True,
+            reports_directory=tmp_path / "reports",
+        )
+        sampler = AdaptiveSampler(rules, "y", initial=10, batch=5, budget=budget, seed=3)
+        results = list(iter_rounds(sampler, run_round, cache=cache, script=script))
+        journal.close()
+        cache.close()
+        return results
+
+    assert len(run_sampler(20)) == 20
+    # the resumed sweep gets the outputs of the finished runs from the cache, and only
+    # executes the runs beyond the first budget
+    results = run_sampler(30)
+    assert sorted(result.index for result in results) == list(range(20, 30))
+    assert not any(result.cached for result in results)
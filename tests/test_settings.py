@@ -0,0 +1,132 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from parametric_simulator.settings import load_settings, write_cached_settings
+
+__author__ = "Eelco van Vliet"
+__copyright__ = "Eelco van Vliet"
+__license__ = "MIT"
+
+SETTINGS = """\
+defaults:
+  - base
+  - _self_
+paths:
+  results: ${general.name}/results
+rules:
+  seed:
+    arguments:
+      - --seed ${seed} --out ${paths.results}
+    iterator:
+      key: seed
+      values: [1, 2]
+"""
+
+
+@pytest.fixture
+def settings_file(tmp_path):
+    (tmp_path / "base.yaml").write_text("general:\n  name: base\n  max_workers: 2\n")
+    settings_file = tmp_path / "sweep.yml"
+    settings_file.write_text(SETTINGS)
+    return settings_file
+
+
+def test_load_settings(tmp_path, settings_file):
+    settings = load_settings(settings_file, cache_directory=tmp_path / "cache")
+    assert settings["general"] == {"name": "base", "max_workers": 2}
+    assert settings["paths"]["results"] == "base/results"
+    # the argument template of the rule is left for the sweep
+    assert settings["rules"]["seed"]["arguments"] == ["--seed ${seed} --out base/results"]
+
+
+def test_load_settings_overrides(tmp_path, settings_file):
+    settings = load_settings(
+        settings_file,
+        ["general.name=other", "seed=range(0,6,2)"],
+        cache_directory=tmp_path / "cache",
+    )
+    assert settings["paths"]["results"] == "other/results"
+    assert settings["rules"]["seed"]["iterator"] == {"key": "seed", "start": 0, "end": 6, "step": 2}
+
+    settings = load_settings(settings_file, ["rules.seed=3,4"], cache_directory=tmp_path / "cache")
+    assert settings["rules"]["seed"]["iterator"] == {"key": "seed", "values": [3, 4]}
+
+    with pytest.raises(ValueError):
+        load_settings(settings_file, ["mesh=1,2"], cache_directory=tmp_path / "cache")
+    with pytest.raises(ValueError):
+        load_settings(settings_file, ["general.unknown=1"], cache_directory=tmp_path / "cache")
+
+
+def test_load_settings_cache(tmp_path, settings_file):
+    cache_directory = tmp_path / "cache"
+    load_settings(settings_file, cache_directory=cache_directory)
+    assert len(list(cache_directory.iterdir())) == 1
+
+    # the cached settings are used until an input file changes
+    (cache_file_name,) = cache_directory.iterdir()
+    cache_file_name.write_text(cache_file_name.read_text().replace("base/results", "cached"))
+    settings = load_settings(settings_file, cache_directory=cache_directory)
+    assert settings["paths"]["results"] == "cached"
+
+    (tmp_path / "base.yaml").write_text("general:\n  name: changed\n")
+    settings = load_settings(settings_file, cache_directory=cache_directory)
+    assert settings["paths"]["results"] == "changed/results"
+
+
+def test_load_settings_environment(tmp_path, monkeypatch):
+    monkeypatch.setenv("RESULTS", "first")
+    settings_file = tmp_path / "settings.yml"
+    settings_file.write_text("paths:\n  results: ${oc.env:RESULTS}\n")
+    assert load_settings(settings_file, cache_directory=tmp_path / "cache")["paths"] == {
+        "results": "first"
+    }
+    assert not (tmp_path / "cache").exists()
+
+
+def test_load_settings_invalid(tmp_path):
+    settings_file = tmp_path / "settings.yml"
+    settings_file.write_text("rules:\n  seed: 1\n")
+    with pytest.raises(ValueError):
+        load_settings(settings_file, cache_directory=tmp_path / "cache")
+
+
+def test_load_example_settings(tmp_path):
+    example = Path(__file__).parents[1] / "examples" / "parametetric_simulator_settings.yml"
+    settings = load_settings(example, cache_directory=tmp_path / "cache")
+    assert settings["paths"]["logs"] == str(Path.cwd() / "logs")
+    assert settings["rules"]["seed"]["arguments"][0] == "--seed ${seed}"
+    # the settings depend on the working directory, so they are not cached
+    assert not (tmp_path / "cache").exists()
+
+
+def test_load_settings_input_files(tmp_path, settings_file):
+    cache_directory = tmp_path / "cache"
+    (tmp_path / "mesh").mkdir()
+    (tmp_path / "mesh" / "coarse.yaml").write_text("size: 10\n")
+    (tmp_path / "mesh" / "fine.yaml").write_text("size: 1\n")
+    settings_file.write_text(SETTINGS.replace("  - base\n", "  - base\n  - mesh: coarse\n"))
+    settings = load_settings(settings_file, ["mesh=fine"], cache_directory=cache_directory)
+    assert settings["mesh"] == {"size": 1}
+    (cache_file_name,) = cache_directory.iterdir()
+    inputs = json.loads(cache_file_name.read_text())["inputs"]
+    # only the files which Hydra loaded are inputs, not every file in the directory
+    assert sorted(Path(file_name).name for file_name in inputs) == [
+        "base.yaml",
+        "fine.yaml",
+        "sweep.yml",
+    ]
+
+
+def test_load_settings_cache_limit(tmp_path, settings_file):
+    cache_directory = tmp_path / "cache"
+    for seed in range(4):
+        load_settings(
+            settings_file, [f"rules.seed.iterator.values=[{seed}]"], cache_directory=cache_directory
+        )
+    assert len(list(cache_directory.iterdir())) == 4
+
+    write_cached_settings(cache_directory / "new.json", {}, [settings_file], max_entries=2)
+    names = sorted(file_name.name for file_name in cache_directory.iterdir())
+    assert len(names) == 2 and "new.json" in names
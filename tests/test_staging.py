@@ -0,0 +1,157 @@
+import os
+import tarfile
+import time
+from pathlib import Path
+
+import pytest
+
+from parametric_simulator.executor import run_sweep
+from parametric_simulator.inputs import prepare_inputs
+from parametric_simulator.staging import Stager
+from parametric_simulator.sweep import Run
+
+__author__ = "Eelco van Vliet"
+__copyright__ = "Eelco van Vliet"
+__license__ = "MIT"
+
+SCRIPT = """
+import sys
+from pathlib import Path
+
+def main(argv):
+    factor = float(Path("input", "factor.txt").read_text())
+    Path("output.txt").write_text(str(factor * float(argv[0])))
+    if float(argv[0]) < 0:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
+"""
+
+RELATIVE_SCRIPT = """
+import sys
+from pathlib import Path
+
+from parametric_simulator import load_input, report
+
+def main(argv):
+    factor = float(Path("input", "factor.txt").read_text())
+    report("value", factor * float(argv[0]) + 0 * load_input("offsets").sum())
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
+"""
+
+
+@pytest.fixture
+def template(tmp_path):
+    template = tmp_path / "template"
+    (template / "input").mkdir(parents=True)
+    (template / "input" / "factor.txt").write_text("2.5")
+    (template / "mesh.dat").write_text("0 1 2\n")
+    os.symlink("mesh.dat", template / "mesh_link.dat")
+    return template
+
+
+@pytest.mark.parametrize("method", ["reflink", "hardlink", "copy"])
+def test_stage(tmp_path, template, method):
+    stager = Stager(template, tmp_path / "runs", method=method)
+    run_directory = stager.stage(3)
+    assert run_directory == tmp_path / "runs" / "run_000003"
+    assert (run_directory / "input" / "factor.txt").read_text() == "2.5"
+    assert os.readlink(run_directory / "mesh_link.dat") == "mesh.dat"
+    linked = (run_directory / "mesh.dat").stat().st_ino == (template / "mesh.dat").stat().st_ino
+    assert linked == (stager.method == "hardlink")
+
+    # a new attempt starts from the template again
+    (run_directory / "output.txt").write_text("old")
+    assert not (stager.stage(3) / "output.txt").exists()
+
+
+def test_release(tmp_path, template):
+    with pytest.raises(ValueError):
+        Stager(template, tmp_path / "runs", cleanup="shred")
+    with pytest.raises(ValueError):
+        Stager(tmp_path / "missing", tmp_path / "runs")
+
+    stager = Stager(template, tmp_path / "runs", cleanup="archive", archive=tmp_path / "archive")
+    for index in range(3):
+        stager.stage(index)
+    stager.release(0, True)
+    stager.release(1, False)
+    stager.close()
+    assert sorted(path.name for path in (tmp_path / "runs").iterdir()) == [
+        "run_000001",
+        "run_000002",
+    ]
+    with tarfile.open(tmp_path / "archive" / "run_000000.tar.gz") as archive:
+        assert "run_000000/input/factor.txt" in archive.getnames()
+
+    stager = Stager(template, tmp_path / "runs", cleanup="delete", keep_failed=False)
+    stager.release(1, False)
+    stager.close()
+    assert [path.name for path in (tmp_path / "runs").iterdir()] == ["run_000002"]
+
+
+def test_stage_after_release(tmp_path, template, monkeypatch):
+    stager = Stager(template, tmp_path / "runs", cleanup="delete")
+    clean_up = stager.clean_up
+
+    def slow_clean_up(run_directory):
+        time.sleep(0.2)
+        clean_up(run_directory)
+
+    monkeypatch.setattr(stager, "clean_up", slow_clean_up)
+    stager.stage(0)
+    stager.release(0, True)
+    # a new attempt of the run waits for the clean-up of the previous attempt
+    run_directory = stager.stage(0)
+    stager.close()
+    assert (run_directory / "input" / "factor.txt").read_text() == "2.5"
+    assert stager.cleanups == {}
+
+
+@pytest.mark.parametrize("in_process", [False, True])
+def test_run_sweep_with_staging(tmp_path, template, in_process):
+    script = tmp_path / "scale.py"
+    script.write_text(SCRIPT)
+    runs = [Run(index=index, arguments=[value]) for index, value in enumerate([1, 2, -1])]
+    stager = Stager(template, tmp_path / "runs", method="hardlink", cleanup="delete")
+
+    results = list(run_sweep(script, runs, max_workers=2, in_process=in_process, stager=stager))
+    stager.close()
+    assert sorted(result.returncode for result in results) == [0, 0, 1]
+    # only the directory of the failed run is kept
+    (run_directory,) = (tmp_path / "runs").iterdir()
+    assert (run_directory / "output.txt").read_text() == "-2.5"
+
+
+@pytest.mark.parametrize("in_process", [False, True])
+def test_run_sweep_with_relative_paths(tmp_path, template, monkeypatch, in_process):
+    np = pytest.importorskip("numpy")
+    monkeypatch.chdir(tmp_path)
+    Path("relative.py").write_text(RELATIVE_SCRIPT)
+    np.savetxt("offsets.txt", [10.0, 20.0])
+    for name, value in prepare_inputs({"offsets": "offsets.txt"}, "inputs").items():
+        monkeypatch.setenv(name, value)
+    runs = [Run(index=index, arguments=[value]) for index, value in enumerate([1, 2])]
+    stager = Stager(template, "runs")
+
+    results = list(
+        run_sweep(
+            "relative.py",
+            runs,
+            max_workers=2,
+            in_process=in_process,
+            reports_directory="reports",
+            stager=stager,
+        )
+    )
+    stager.close()
+    assert all(result.success for result in results)
+    # the reports are written to the reports directory, not in the run directories
+    assert sorted(result.outputs["value"] for result in results) == [2.5, 5.0]
+    assert sorted(path.name for path in Path("reports").iterdir()) == [
+        "run_000000",
+        "run_000001",
+    ]
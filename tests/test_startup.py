@@ -0,0 +1,105 @@
+"""
+Start-up time benchmark of the command-line tool.
+
+The tool is started thousands of times from shell loops, so the modules imported for
+``--version`` and ``--help`` are kept to a minimum. The import times are measured with
+``python -X importtime`` in a fresh interpreter for every test.
+"""
+
+import subprocess
+import sys
+
+__author__ = "Eelco van Vliet"
+__copyright__ = "Eelco van Vliet"
+__license__ = "MIT"
+
+# budgets in microseconds for the imports of a cold start, including the interpreter's own
+# imports. Asking for the version needs importlib.metadata, which takes most of its budget,
+# and asking for help needs the argument parser, which also imports yaml.
+IMPORT_TIME_BUDGET = 80_000
+VERSION_IMPORT_TIME_BUDGET = 200_000
+HELP_IMPORT_TIME_BUDGET = 300_000
+
+HEAVY_MODULES = (
+    "asyncio",
+    "hydra",
+    "importlib.metadata",
+    "jsonargparse",
+    "multiprocessing",
+    "omegaconf",
+    "sqlite3",
+    "yaml",
+)
+
+
+def get_import_times(code):
+    """
+    Run code in a fresh interpreter and return the cumulative import time per module.
+
+    Nested imports keep the indentation of the importtime output, two spaces per level.
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+    )
+    import_times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            import_times[name[1:].rstrip()] = int(cumulative)
+    return import_times
+
+
+def get_imported_modules(import_times):
+    """Get the names of all the imported modules."""
+    return {name.strip() for name in import_times}
+
+
+def get_cold_start_time(import_times):
+    """Sum the cumulative import times of the top-level imports."""
+    return sum(time for name, time in import_times.items() if not name.startswith(" "))
+
+
+def test_import_budget():
+    import_times = get_import_times("import parametric_simulator.parsim")
+    modules = get_imported_modules(import_times)
+    assert "parametric_simulator.parsim" in modules
+    assert modules.isdisjoint(HEAVY_MODULES)
+    assert get_cold_start_time(import_times) < IMPORT_TIME_BUDGET
+
+
+def test_version_import_budget():
+    code = (
+        "import sys\n"
+        "sys.argv = ['parametric_simulator', '--version']\n"
+        "from parametric_simulator.parsim import run\n"
+        "try:\n"
+        "    run()\n"
+        "except SystemExit:\n"
+        "    pass\n"
+    )
+    import_times = get_import_times(code)
+    assert "jsonargparse" not in get_imported_modules(import_times)
+    assert get_cold_start_time(import_times) < VERSION_IMPORT_TIME_BUDGET
+
+
+def test_help_import_budget():
+    code = (
+        "import sys\n"
+        "sys.argv = ['parametric_simulator', '--help']\n"
+        "from parametric_simulator.parsim import run\n"
+        "try:\n"
+        "    run()\n"
+        "except SystemExit:\n"
+        "    pass\n"
+    )
+    import_times = get_import_times(code)
+    modules = get_imported_modules(import_times)
+    # the execution engines are not imported to list the execution modes
+    assert "jsonargparse" in modules
+    assert "parametric_simulator.executor" not in modules
+    assert modules.isdisjoint(("asyncio", "hydra", "multiprocessing", "omegaconf", "sqlite3"))
+    assert get_cold_start_time(import_times) < HELP_IMPORT_TIME_BUDGET
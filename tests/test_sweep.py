@@ -0,0 +1,78 @@
+import itertools
+
+import pytest
+
+from parametric_simulator.sweep import (
+    count_runs,
+    iter_axis_values,
+    iter_runs,
+    render_arguments,
+)
+
+__author__ = "Eelco van Vliet"
+__copyright__ = "Eelco van Vliet"
+__license__ = "MIT"
+
+
+def test_iter_axis_values():
+    assert list(iter_axis_values({"start": 0, "end": 3})) == [0, 1, 2]
+    assert list(iter_axis_values({"start": 1, "end": 0, "step": -0.5})) == [1, 0.5]
+    assert list(iter_axis_values({"values": ["s", "m"]})) == ["s", "m"]
+    assert list(iter_axis_values({"linspace": {"start": 0, "stop": 1, "num": 3}})) == [0, 0.5, 1]
+    assert list(iter_axis_values({"logspace": {"start": 0, "stop": 2, "num": 3}})) == [1, 10, 100]
+    with pytest.raises(ValueError):
+        list(iter_axis_values({"start": 0}))
+
+
+def test_render_arguments():
+    arguments = render_arguments(["--seed ${seed}", "--log_file log_${seed}.log"], {"seed": 3})
+    assert arguments == ["--seed", "3", "--log_file", "log_3.log"]
+
+
+def test_iter_runs():
+    rules = {
+        "sleep": {"arguments": ["--sleep ${sleep}"], "iterator": {"key": "sleep", "end": 2}},
+        "units": {"arguments": ["--units ${units}"], "iterator": {"values": ["s", "m"]}},
+    }
+    assert count_runs(rules) == 4
+    runs = list(iter_runs(rules, default_args=["--debug"]))
+    assert len(runs) == 4
+    assert [run.index for run in runs] == [0, 1, 2, 3]
+    assert runs[1].parameters == {"sleep": 0, "units": "m"}
+    assert runs[1].arguments == ["--debug", "--sleep", "0", "--units", "m"]
+
+
+def test_iter_runs_without_rules():
+    runs = list(iter_runs(None))
+    assert len(runs) == 1
+    assert runs[0].arguments == []
+
+
+def test_iter_runs_zipped():
+    rules = {
+        "x": {"zip": "xy", "iterator": {"key": "x", "end": 3}},
+        "y": {"zip": "xy", "iterator": {"key": "y", "values": [10, 20, 30]}},
+        "z": {"iterator": {"key": "z", "linspace": {"start": 0.1, "stop": 0.2, "num": 0}}},
+    }
+    assert count_runs(rules) == 0
+    del rules["z"]
+    assert count_runs(rules) == 3
+    assert [run.parameters for run in iter_runs(rules)] == [
+        {"x": 0, "y": 10},
+        {"x": 1, "y": 20},
+        {"x": 2, "y": 30},
+    ]
+    rules["y"]["iterator"]["values"].append(40)
+    with pytest.raises(ValueError):
+        list(iter_runs(rules))
+
+
+def test_iter_runs_is_lazy():
+    rules = {
+        name: {"iterator": {"key": name, "linspace": {"start": 0, "stop": 1, "num": 20}}}
+        for name in "abcdef"
+    }
+    assert count_runs(rules) == 20**6
+    first = list(itertools.islice(iter_runs(rules), 3))
+    assert [run.parameters["f"] for run in first] == pytest.approx([0, 1 / 19, 2 / 19])
+    assert first[-1].index == 2
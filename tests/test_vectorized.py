@@ -0,0 +1,96 @@
+import pytest
+
+from parametric_simulator.cache import ResultCache
+from parametric_simulator.executor import use_in_process
+from parametric_simulator.instrumentation import SweepMonitor
+from parametric_simulator.journal import RunJournal
+from parametric_simulator.sweep import iter_runs
+from parametric_simulator.vectorized import get_output_columns, run_sweep_vectorized
+
+__author__ = "Eelco van Vliet"
+__copyright__ = "Eelco van Vliet"
+__license__ = "MIT"
+
+SCRIPT = """
+import numpy as np
+
+def main_batch(parameters):
+    x = parameters["x"]
+    if np.any(x < 0):
+        raise ValueError("negative x")
+    return {"square": x**2, "label": parameters["label"], "block": len(x)}
+"""
+
+RULES = {
+    "x": {"arguments": ["--x ${x}"], "iterator": {"start": 0, "end": 10, "step": 1}},
+    "label": {"arguments": ["--label ${label}"], "iterator": {"values": ["a", "b"]}},
+}
+
+
+@pytest.fixture
+def script(tmp_path):
+    script = tmp_path / "model.py"
+    script.write_text(SCRIPT)
+    return script
+
+
+def test_get_output_columns():
+    assert get_output_columns({"a": [1.0, 2.0], "b": 3}, 2) == {"a": [1.0, 2.0], "b": [3, 3]}
+    with pytest.raises(ValueError):
+        get_output_columns({"a": [1.0, 2.0, 3.0]}, 2)
+
+
+def test_run_sweep_vectorized(tmp_path, script):
+    assert use_in_process(script, "vectorized") is False
+    with pytest.raises(ValueError):
+        use_in_process(tmp_path / "missing.py", "vectorized")
+
+    monitor = SweepMonitor(2, 20)
+    cache = ResultCache(tmp_path / "cache")
+    journal = RunJournal(tmp_path / "journal")
+    results = list(
+        run_sweep_vectorized(
+            script,
+            iter_runs(RULES),
+            max_workers=2,
+            block_size=8,
+            cache=cache,
+            journal=journal,
+            monitor=monitor,
+        )
+    )
+    assert sorted(result.index for result in results) == list(range(20))
+    for result in results:
+        assert result.success
+        assert result.outputs["square"] == result.parameters["x"] ** 2
+        assert result.outputs["label"] == result.parameters["label"]
+    assert sorted(result.outputs["block"] for result in results) == [4] * 4 + [8] * 16
+    assert monitor.summary()["completed"] == 20
+
+    # the runs are in the cache, and a failing block fails all of its runs
+    journal.close()
+    rules = {**RULES, "x": {"arguments": ["--x ${x}"], "iterator": {"values": [1, -1]}}}
+    results = list(run_sweep_vectorized(script, iter_runs(rules), max_workers=1, cache=cache))
+    cache.close()
+    assert sorted((result.cached, result.success) for result in results) == [
+        (False, False),
+        (False, False),
+        (True, True),
+        (True, True),
+    ]
+
+
+def test_run_sweep_vectorized_crash(tmp_path):
+    script = tmp_path / "crashing.py"
+    script.write_text(
+        "import os\ndef main_batch(parameters):\n"
+        "    if 3 in parameters['x']:\n        os._exit(9)\n"
+        "    return {'square': parameters['x'] ** 2}\n"
+    )
+    rules = {"x": {"arguments": ["--x ${x}"], "iterator": {"start": 0, "end": 6, "step": 1}}}
+    results = list(
+        run_sweep_vectorized(script, iter_runs(rules), max_workers=1, block_size=2, queue_size=1)
+    )
+    # the block of the crash fails, and the other blocks run in a new pool
+    results.sort(key=lambda result: result.index)
+    assert [result.success for result in results] == [True, True, False, False, True, True]